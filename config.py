@@ -16,25 +16,3055 @@ This scripts are derived from the default config.py in [keyhac](https://sites.go
 
 import sys
 import os
+import re
 import time
+import math
+import array
+import bisect
+import fnmatch
+import hashlib
+import heapq
+import itertools
+import json
+import mmap
+import struct
+import traceback
+import types
+import unicodedata
+import weakref
+import zlib
 import threading
+from collections import deque, OrderedDict
 from enum import Enum
-from typing import Tuple, Dict, Any, Optional, Callable
+from typing import Tuple, List, Dict, Any, Optional, Callable
 
 import pyauto
 from keyhac import *
 import ckit
 
 
+# print the timings measured for debugging, and the startup report even when the startup is fast
+DEBUG_TIMING=False
 
 
+class WorkerRegistry:
+    """
+    Registry of the background workers, which survives reloads of config.py.
+
+    keyhac executes config.py again on reload, so class attributes such as singleton instances are reset
+    while the workers of the previous load keep running.
+    The registry is therefore kept in a module object in `sys.modules`, and `shutdownAll()` at the beginning of
+    `KeymapConfig.configureKeymap(...)` stops the workers left by the previous load.
+    A dry load by `ConfigReloader` does not call `shutdownAll()`: the handlers it leaves unchanged still use the live workers,
+    so a new load looks its workers up by name and reuses them.
+    A registered worker provides `shutdown()` and `is_alive()`.
+    This class is static class.
+    """
+
+    _MODULE_NAME="_keyhac_config_workers"
+
+    @classmethod
+    def _module(cls)->types.ModuleType:
+        module=sys.modules.get(cls._MODULE_NAME)
+        if module is None:
+            module=types.ModuleType(cls._MODULE_NAME)
+            module.lock=threading.Lock()
+            module.workers={}
+            sys.modules[cls._MODULE_NAME]=module
+        return module
+
+    @classmethod
+    def register(cls,name:str,worker:Any):
+        """Register `worker` as `name`. A worker already registered as `name` is shut down.
+        """
+        module=cls._module()
+        with module.lock:
+            old=module.workers.get(name)
+            module.workers[name]=worker
+        if old is not None and old is not worker:
+            old.shutdown()
+
+    @classmethod
+    def unregister(cls,name:str,worker:Any):
+        """Unregister `worker` if it is registered as `name`. The worker is not shut down.
+        """
+        module=cls._module()
+        with module.lock:
+            if module.workers.get(name) is worker:
+                del module.workers[name]
+
+    @classmethod
+    def get(cls,name:str)->Any:
+        """Return the worker registered as `name`, or `None`.
+        """
+        module=cls._module()
+        with module.lock:
+            return module.workers.get(name)
+
+    @classmethod
+    def shutdownAll(cls):
+        """Shut down and unregister all workers.
+        """
+        module=cls._module()
+        with module.lock:
+            workers=list(module.workers.values())
+            module.workers.clear()
+        for worker in reversed(workers):
+            worker.shutdown()
+
+    @classmethod
+    def liveCount(cls)->int:
+        """Return the number of registered workers which are alive.
+        """
+        module=cls._module()
+        with module.lock:
+            return sum(1 for worker in module.workers.values() if worker.is_alive())
+
+    @classmethod
+    def persistentState(cls,name:str)->Dict[str,Any]:
+        """Return the dict named `name` which survives reloads, such as the state of `ConfigReloader`.
+        """
+        module=cls._module()
+        with module.lock:
+            states=module.__dict__.setdefault("states",{})
+            return states.setdefault(name,{})
+
+
+class BackgroundTask:
+    """
+    Task registered to `BackgroundScheduler`.
+    """
+
+    def __init__(self,func:Callable[[],Optional[float]],priority:int):
+        self.func=func
+        self.priority=priority
+        self.cancelled=False
+
+    def cancel(self):
+        """Cancel the task. The task is not called any more.
+        """
+        self.cancelled=True
+
+
+class BackgroundScheduler(threading.Thread):
+    """
+    One thread which runs the periodic and state-driven tasks of all background controllers.
+
+    Tasks are kept in one timer heap ordered by due time and then by priority (smaller is earlier),
+    and the thread sleeps on one `threading.Condition` until the earliest due time or a new task.
+    A task function returns the delay in seconds until its next call, or `None` to finish.
+    Task functions run on this thread one by one, so they must return quickly.
+    Basically this class is used through `BackgroundScheduler.defaultScheduler()`.
+    """
+
+    PRIORITY_HIGH=0
+    PRIORITY_NORMAL=10
+    PRIORITY_LOW=20
+
+    _WORKER_NAME="BackgroundScheduler"
+
+    _instance_lock=threading.Lock()
+
+    @classmethod
+    def defaultScheduler(cls)->"BackgroundScheduler":
+        """Return the shared scheduler. The thread is started on the first call.
+        The scheduler is kept in `WorkerRegistry`, so the loads of config.py applied by `ConfigReloader` share the thread.
+        """
+        with cls._instance_lock:
+            scheduler=WorkerRegistry.get(cls._WORKER_NAME)
+            if scheduler is None or not scheduler.is_alive() or scheduler._quit:
+                scheduler=cls()
+                scheduler.start()
+                WorkerRegistry.register(cls._WORKER_NAME,scheduler)
+            return scheduler
+
+    @classmethod
+    def shutdownIfIdle(cls)->bool:
+        """Stop the shared scheduler if it has no live task. The thread is started again by the next `defaultScheduler()`.
+
+        Returns:
+            bool: `True` if the scheduler is stopped.
+        """
+        with cls._instance_lock:
+            scheduler=WorkerRegistry.get(cls._WORKER_NAME)
+            if scheduler is None:
+                return False
+            with scheduler._cond:
+                if scheduler._running is not None or any(not entry[3].cancelled for entry in scheduler._heap):
+                    return False
+                scheduler._quit=True
+                scheduler._cond.notify()
+            WorkerRegistry.unregister(cls._WORKER_NAME,scheduler)
+        return True
+
+
+    def __init__(self,clock:Callable[[],float]=time.monotonic):
+        super(self.__class__,self).__init__()
+        self.daemon=True
+
+        self.clock=clock
+
+        self._cond=threading.Condition()
+        self._heap=[]
+        self._seq=itertools.count()
+        self._quit=False
+        self._running:Optional[BackgroundTask]=None
+
+
+    def callLater(
+        self,
+        delay:float,
+        func:Callable[[],Optional[float]],
+        priority:int=PRIORITY_NORMAL,
+    )->BackgroundTask:
+        """Register `func` to be called after `delay` seconds.
+
+        Args:
+            delay (float): delay of the first call in seconds.
+            func (Callable[[],Optional[float]]): task function. It returns the delay until the next call, or `None` to finish.
+            priority (int, optional): priority among the tasks due at the same time. Smaller is earlier.
+
+        Returns:
+            BackgroundTask: registered task, which can be cancelled.
+        """
+        task=BackgroundTask(func,priority)
+        self._push(self.clock()+delay,task)
+        return task
+
+    def _push(self,t:float,task:BackgroundTask):
+        with self._cond:
+            heapq.heappush(self._heap,(t,task.priority,next(self._seq),task))
+            self._cond.notify()
+
+    def pendingCount(self)->int:
+        """Return the number of tasks waiting for their next call.
+        """
+        with self._cond:
+            return len(self._heap)
+
+    def stop(self):
+        """Stop the thread. Remaining tasks are discarded.
+        """
+        with self._cond:
+            self._quit=True
+            self._cond.notify()
+
+    def shutdown(self,timeout:float=1.0):
+        """Stop the thread and wait for it.
+        """
+        self.stop()
+        if self is not threading.current_thread():
+            self.join(timeout)
+
+
+    def run(self):
+        while True:
+            with self._cond:
+                while True:
+                    if self._quit:
+                        return
+                    wait=None
+                    if self._heap:
+                        wait=self._heap[0][0]-self.clock()
+                        if wait <= 0:
+                            _,_,_,task=heapq.heappop(self._heap)
+                            self._running=task
+                            break
+                    self._cond.wait(wait)
+
+            delay=None
+            if not task.cancelled:
+                try:
+                    delay=task.func()
+                except Exception:
+                    traceback.print_exc()
+            with self._cond:
+                self._running=None
+                if delay is not None and not task.cancelled:
+                    self._push(self.clock()+max(delay,0.0),task)
+
+
+class MotionProfile:
+    """
+    Speed factor of the keyboard mouse motion as a function of the key hold time.
+    This base class gives the constant factor `1.0`.
+    """
+
+    def factor(self,hold_time:float)->float:
+        """Return the factor multiplied to the speed after the motion key has been held for `hold_time` seconds.
+        """
+        return 1.0
+
+
+class LinearRampProfile(MotionProfile):
+    """
+    Speed factor which increases linearly from `start_factor` to `end_factor` in `ramp_time` seconds.
+    """
+
+    def __init__(self,ramp_time:float=0.5,start_factor:float=0.25,end_factor:float=1.0):
+        self.ramp_time=ramp_time
+        self.start_factor=start_factor
+        self.end_factor=end_factor
+
+    def factor(self,hold_time:float)->float:
+        if hold_time >= self.ramp_time:
+            return self.end_factor
+        return self.start_factor+(self.end_factor-self.start_factor)*max(hold_time,0.0)/self.ramp_time
+
+
+class ExponentialProfile(MotionProfile):
+    """
+    Speed factor which approaches `end_factor` from `start_factor` exponentially with the time constant `time_constant` seconds.
+    """
+
+    def __init__(self,time_constant:float=0.3,start_factor:float=0.25,end_factor:float=1.0):
+        self.time_constant=time_constant
+        self.start_factor=start_factor
+        self.end_factor=end_factor
+
+    def factor(self,hold_time:float)->float:
+        return self.end_factor-(self.end_factor-self.start_factor)*math.exp(-max(hold_time,0.0)/self.time_constant)
+
+
+class PiecewiseProfile(MotionProfile):
+    """
+    Speed factor given by points `(hold_time, factor)`, interpolated linearly between the points
+    and constant before the first point and after the last point.
+    """
+
+    def __init__(self,points:List[Tuple[float,float]]):
+        if not points:
+            raise ValueError("points must not be empty")
+        points=sorted(points)
+        self.times=[t for t,_ in points]
+        self.factors=[f for _,f in points]
+
+    def factor(self,hold_time:float)->float:
+        i=bisect.bisect_right(self.times,hold_time)
+        if i == 0:
+            return self.factors[0]
+        if i == len(self.times):
+            return self.factors[-1]
+        t0,t1=self.times[i-1],self.times[i]
+        f0,f1=self.factors[i-1],self.factors[i]
+        return f0+(f1-f0)*(hold_time-t0)/(t1-t0)
+
+
+class CursorPositionTracker:
+    """
+    Local estimate of the mouse cursor position.
+
+    While a motion is active, moves are applied to the local estimate and `getCursorPos()` does not ask the OS.
+    The estimate is resynchronized from the OS at the start of a motion
+    (the first access after `idle_timeout` seconds without access) and every `resync_interval` seconds.
+    Positions are clamped to the monitor bounds, which are cached at the start of a motion.
+    """
+
+    DEFAULT_RESYNC_INTERVAL=1.0
+    DEFAULT_IDLE_TIMEOUT=0.2
+
+    def __init__(
+        self,
+        get_mouse_pos:Callable[[],Tuple[int,int]],
+        get_monitor_bounds:Optional[Callable[[],List[Tuple[int,int,int,int]]]]=None,
+        resync_interval:float=DEFAULT_RESYNC_INTERVAL,
+        idle_timeout:float=DEFAULT_IDLE_TIMEOUT,
+        clock:Callable[[],float]=time.monotonic,
+    ):
+        """Constructor
+
+        Args:
+            get_mouse_pos (Callable[[],Tuple[int,int]]): function to get the mouse cursor position from the OS.
+            get_monitor_bounds (Optional[Callable[[],List[Tuple[int,int,int,int]]]], optional): function to get `(left, top, right, bottom)` of the monitors. If `None`, positions are not clamped.
+            resync_interval (float, optional): interval of resynchronization during a motion in seconds.
+            idle_timeout (float, optional): period without access after which the next access is regarded as the start of a motion.
+            clock (Callable[[],float], optional): monotonic clock.
+        """
+        self.get_mouse_pos=get_mouse_pos
+        self.get_monitor_bounds=get_monitor_bounds
+        self.resync_interval=resync_interval
+        self.idle_timeout=idle_timeout
+        self.clock=clock
+
+        self.resync_count=0
+
+        self._lock=threading.Lock()
+        self._pos=(0,0)
+        self._monitor_bounds:List[Tuple[int,int,int,int]]=[]
+        self._last_access_t=None
+        self._next_resync_t=0.0
+
+
+    def _access(self)->Tuple[int,int]:
+        # must be called with `self._lock`
+        t=self.clock()
+        motion_start=self._last_access_t is None or t-self._last_access_t > self.idle_timeout
+        if motion_start or t >= self._next_resync_t:
+            if motion_start and self.get_monitor_bounds is not None:
+                self._monitor_bounds=list(self.get_monitor_bounds())
+            x,y=self.get_mouse_pos()
+            self._pos=(int(x),int(y))
+            self._next_resync_t=t+self.resync_interval
+            self.resync_count+=1
+        self._last_access_t=t
+        return self._pos
+
+    def clamp(self,x:float,y:float)->Tuple[int,int]:
+        """Clamp `(x, y)` to the nearest cached monitor bounds.
+        """
+        x,y=int(x),int(y)
+        if not self._monitor_bounds:
+            return x,y
+        best=None
+        for left,top,right,bottom in self._monitor_bounds:
+            cx=min(max(x,left),right-1)
+            cy=min(max(y,top),bottom-1)
+            d=(cx-x)**2+(cy-y)**2
+            if d == 0:
+                return cx,cy
+            if best is None or d < best[0]:
+                best=(d,cx,cy)
+        return best[1],best[2]
+
+
+    def getCursorPos(self)->Tuple[int,int]:
+        """Return the estimated position of the mouse cursor.
+        """
+        with self._lock:
+            return self._access()
+
+    def setCursorPos(self,x:float,y:float)->Tuple[int,int]:
+        """Set the estimated position of the mouse cursor and return the clamped position.
+        """
+        with self._lock:
+            self._access()
+            self._pos=self.clamp(x,y)
+            return self._pos
+
+    def moveRel(self,dx:float,dy:float)->Tuple[int,int]:
+        """Move the estimated position of the mouse cursor and return the clamped position.
+        """
+        with self._lock:
+            x,y=self._access()
+            self._pos=self.clamp(x+dx,y+dy)
+            return self._pos
+
+
+class BatchedMouseInput:
+    """
+    Sink which coalesces mouse moves queued within a frame into one input sequence.
+
+    `.move(x, y)` only queues the absolute position, and the queued positions are sent by a task of `BackgroundScheduler`
+    with a single `pyauto.Input.send(...)` at most once per `frame` seconds.
+    The flush does not touch `keymap.input_seq` nor the modifier state of keymap, which belong to the key hook thread.
+    When a flush is later than one frame, only the latest position is sent since the intermediate ones are already superseded.
+    """
+
+    DEFAULT_FRAME=1.0/60
+
+    def __init__(
+        self,
+        frame:float=DEFAULT_FRAME,
+        scheduler:Optional[BackgroundScheduler]=None,
+    ):
+        """Constructor
+
+        Args:
+            frame (float, optional): minimum interval of flushes in seconds.
+            scheduler (Optional[BackgroundScheduler], optional): scheduler to run the flushes. Default is `BackgroundScheduler.defaultScheduler()`.
+        """
+        self.frame=frame
+        self.scheduler=scheduler
+
+        self.flush_count=0
+
+        self._lock=threading.Lock()
+        self._moves=[]
+        self._scheduled=False
+        self._target_t=0.0
+        self._next_flush_t=0.0
+
+
+    def move(self,x:float,y:float):
+        """Queue an absolute move of the mouse cursor. This method returns immediately.
+        """
+        with self._lock:
+            self._moves.append((int(x),int(y)))
+            if self._scheduled:
+                return
+            self._scheduled=True
+            t=time.monotonic()
+            self._target_t=max(t,self._next_flush_t)
+        scheduler=self.scheduler or BackgroundScheduler.defaultScheduler()
+        scheduler.callLater(self._target_t-t,self._flushTask,BackgroundScheduler.PRIORITY_HIGH)
+
+
+    def flush(self,late:bool=False):
+        """Send the queued positions as one input sequence.
+
+        Args:
+            late (bool, optional): if `True`, only the latest queued position is sent.
+        """
+        with self._lock:
+            moves=self._moves
+            self._moves=[]
+            self._scheduled=False
+            self._next_flush_t=self._target_t+self.frame
+        if not moves:
+            return
+        if late:
+            moves=moves[-1:]
+        pyauto.Input.send([pyauto.MouseMove(x,y) for x,y in moves])
+        self.flush_count+=1
+
+    def _flushTask(self)->None:
+        self.flush(late=time.monotonic()-self._target_t > self.frame)
+
+
+class MouseMovementState(Enum):
+    """
+    マウスの動きの状態を表す列挙型. 
+    """
+
+    QUIT=0
+
+    NORMAL=1
+    
+    WALK_R=11
+    WALK_L=12
+    WALK_U=13
+    WALK_D=14
+    WALK_RU=21
+    WALK_RD=22
+    WALK_LU=23
+    WALK_LD=24
+
+    DASH_R=31
+    DASH_L=32
+    DASH_U=33
+    DASH_D=34
+    DASH_RU=41
+    DASH_RD=42
+    DASH_LU=43
+    DASH_LD=44
+
+    SNEAK_R=51
+    SNEAK_L=52
+    SNEAK_U=53
+    SNEAK_D=54
+    SNEAK_RU=61
+    SNEAK_RD=62
+    SNEAK_LU=63
+    SNEAK_LD=64
+
+
+class MouseSpeedTier(Enum):
+    """
+    マウスの動きの速さの段階を表す列挙型. 
+    `MouseMovementState` の移動状態は 方向ベクトル と 速さの段階 の組に分解される.
+    """
+
+    WALK=0
+    DASH=1
+    SNEAK=2
+
+
+def _buildMouseMovementVectors()->Dict[MouseMovementState,Tuple[MouseSpeedTier,Tuple[int,int]]]:
+    """移動状態 -> (速さの段階, 方向ベクトル) の表を状態名 `{段階}_{方向}` から作る
+    """
+    vectors={}
+    for state in MouseMovementState:
+        if "_" in state.name:
+            tier_name,direction_name=state.name.split("_")
+            vectors[state]=(
+                MouseSpeedTier[tier_name],
+                (
+                    ("R" in direction_name)-("L" in direction_name),
+                    ("U" in direction_name)-("D" in direction_name),
+                ),
+            )
+    return vectors
+
+# 移動状態 -> (速さの段階, 方向ベクトル) の表
+MOUSE_MOVEMENT_VECTORS:Dict[MouseMovementState,Tuple[MouseSpeedTier,Tuple[int,int]]]=_buildMouseMovementVectors()
+
+# (速さの段階, 方向ベクトル) -> 移動状態 の逆引きの表
+MOUSE_MOVEMENT_STATES:Dict[Tuple[MouseSpeedTier,Tuple[int,int]],MouseMovementState]={
+    vector: state for state,vector in MOUSE_MOVEMENT_VECTORS.items()
+}
+
+def composeMouseMovementState(tier:MouseSpeedTier,ux:int,uy:int)->MouseMovementState:
+    """速さの段階と方向ベクトルから移動状態を返す. 
+    方向ベクトルの各成分は符号だけが使われるので、押されている方向キーのベクトルの和をそのまま渡せば斜め方向になる. 
+    和が `(0,0)` のときは `MouseMovementState.NORMAL` を返す.
+    """
+    direction=((ux>0)-(ux<0),(uy>0)-(uy<0))
+    return MOUSE_MOVEMENT_STATES.get((tier,direction),MouseMovementState.NORMAL)
+
+
+class SimpleMouseMovementConfig(object):
+    """
+    `SimpleMouseMovementWorker` におけるマウスの動きのコンフィグ
+    """
+    
+    DEFAULT_WALK_SPEED=80
+    DEFAULT_DASH_SPEED=320
+    DEFAULT_SNEAK_SPEED=10
+    DEFAULT_KEYBOAD_INTERVAL=1.0/60
+    DEFAULT_TIMEOUT_PERIOD=5.0
+
     
+    def __init__(
+        self,
+        walk_speed:int=DEFAULT_WALK_SPEED,
+        dash_speed:int=DEFAULT_DASH_SPEED,
+        sneak_speed:int=DEFAULT_SNEAK_SPEED,
+        keyboard_interval:float=DEFAULT_KEYBOAD_INTERVAL,
+        timeout_period:float=DEFAULT_TIMEOUT_PERIOD,
+        profile:Optional[MotionProfile]=None,
+    ):
+        """コンストラクタ
+
+        Args:
+            walk_speed (int, optional): WALK の速さ. `keyboard_interval` あたりのピクセル数
+            dash_speed (int, optional): DASH の速さ
+            sneak_speed (int, optional): SNEAK の速さ
+            keyboard_interval (float, optional): ティックの周期 [sec]
+            timeout_period (float, optional): 移動中に `updateState(...)` が呼ばれないまま通常状態に戻るまでの時間 [sec]
+            profile (Optional[MotionProfile], optional): 移動開始からの経過時間に応じて速さに掛ける係数. `None` のときは一定の速さ
+        """
+        self.walk_speed=walk_speed
+        self.dash_speed=dash_speed
+        self.sneak_speed=sneak_speed
+        self.keyboard_interval=keyboard_interval
+        self.timeout_period=timeout_period
+        self.profile=profile
+    
+    def to_dict(self)->Dict[str,Any]:
+        return {
+            "walk_speed": self.walk_speed,
+            "dash_speed": self.dash_speed,
+            "sneak_speed": self.sneak_speed,
+            "keyboard_interval": self.keyboard_interval,
+            "timeout_period": self.timeout_period,
+            "profile": self.profile,
+        }
+
+    def from_dict(cls,obj:Dict[str,Any])->"SimpleMouseMovementConfig":
+        return SimpleMouseMovementConfig(
+            walk_speed=obj["walk_speed"],
+            dash_speed=obj["dash_speed"],
+            sneak_speed=obj["sneak_speed"],
+            keyboard_interval=obj["keyboard_interval"],
+            timeout_period=obj["timeout_period"],
+            profile=obj.get("profile"),
+        )
+
+
+class SimpleMouseMovementWorker:
+    """
+    マウスカーソルを動かすワーカー. 
+    専用のスレッドは持たず、`BackgroundScheduler` のタスクとして `tick()` が呼ばれる.
+
+    - 単調増加する時計 `clock` 上で `keyboard_interval` ごとの目標時刻 (deadline) を計算してティックを進める.
+      処理時間の分だけ周期が伸びることはない
+    - 1ティックの移動量は実際の経過時間に比例させる. 速度 `walk_speed` などは `keyboard_interval` あたりのピクセル数
+    - 目標時刻に間に合わなかったティックは `missed_frames` に数えて読み飛ばす
+    - `config.profile` があれば、移動開始からの経過時間に応じた係数を移動量に掛ける. ピクセルの端数は次のティックに持ち越す
+    - `updateState(...)` による状態の変更はロックで保護したキューに積まれ、`tick()` で順に適用されるので失われない
+    - 停止中 (NORMAL) はタスクをスケジューラに登録しないので CPU を使わない. 状態の変更が届くとタスクが登録し直される
+    - 移動中に `config.timeout_period` 秒間 `updateState(...)` が呼ばれなければ NORMAL に戻る
+    """
+
+    # 一時停止などで経過時間が長くなったときに、移動量として考慮するティック数の上限
+    MAX_CATCHUP_FRAMES=4
+
+
+    @classmethod
+    def generate_auto_drift_mouse_pos(
+        cls,
+        get_mouse_pos:Callable[[],Tuple[int,int]],
+        set_mouse_pos:Callable[[Tuple[int,int]],None],
+    )->Callable[[Tuple[int,int]],None]:
+        """
+        マウス動作で利用する関数 `drift_mouse_pos` を `get_mouse_pos` と `set_mouse_pos` から生成する関数. 
+        コンストラクタで使われる
+
+        Args:
+            get_mouse_pos (Callable[[],Tuple[int,int]]): マウスカーソル位置を取得する関数
+            set_mouse_pos (Callable[[Tuple[int,int]],None]): マウスカーソル位置を設定する関数
+
+        Returns:
+            Callable[[Tuple[int,int]],None]: マウスカーソル位置を相対値で移動する関数
+        """
+
+        def drift_mouse_pos(dx:int,dy:int):
+            x,y=get_mouse_pos()
+            x2,y2=x+dx,y+dy
+            set_mouse_pos(x2,y2)
+        return drift_mouse_pos
+
+
+    def __init__(
+        self,
+        config:SimpleMouseMovementConfig,
+        get_mouse_pos:Callable[[],Tuple[int,int]],
+        set_mouse_pos:Callable[[Tuple[int,int]],None],
+        drift_mouse_pos:Optional[Callable[[int,int],None]]=None,
+        verbose:bool=False,
+        clock:Callable[[],float]=time.monotonic,
+        scheduler:Optional[BackgroundScheduler]=None,
+    ):
+        """コンストラクタ
+
+        Args:
+            config (SimpleMouseMovementConfig): マウスの動作に関する設定.
+            get_mouse_pos (Callable[[],Tuple[int,int]]): マウス位置を取得する関数.
+            set_mouse_pos (Callable[[Tuple[int,int]],None]): マウス位置を設定する関数
+            drift_mouse_pos (Optional[Callable[[int,int],None]], optional): マウス位置を相対位置で移動する関数. デフォルトは `None` であり、この場合は `get_mouse_pos` と `set_mouse_pos` をもとに適当に設定される.
+            verbose (bool, optional): `True` のときマウス位置とマウスの動作状態を出力する. デフォルトは `False`.
+            clock (Callable[[],float], optional): 単調増加する時計. デフォルトは `time.monotonic`.
+            scheduler (Optional[BackgroundScheduler], optional): `tick()` を呼ぶスケジューラ. デフォルトは `BackgroundScheduler.defaultScheduler()`.
+        """
+        self.config=config
+        self.clock=clock
+        self.scheduler=scheduler
+        self.get_mouse_pos=get_mouse_pos
+        self.set_mouse_pos=set_mouse_pos
+        self.drift_mouse_pos=(
+            drift_mouse_pos if drift_mouse_pos is not None
+            else self.generate_auto_drift_mouse_pos(get_mouse_pos,set_mouse_pos)
+        )
+
+        
+        self.verbose=verbose
+                
+        self.state = MouseMovementState.NORMAL
+        self.missed_frames=0
+
+        # 状態の変更のキュー. `_lock` で保護する
+        self._lock = threading.Lock()
+        self._queue = deque()
+        self._scheduled = False
+        self._task = None
+        self._pending_reconfigure = None
+        self._finished = threading.Event()
+        self._last_update_t=self.clock()
+
+        # ティックの時間軸
+        self._next_t=0.0
+        self._prev_t=0.0
+        self._remainder=(0.0,0.0)
+
+        # 移動状態 -> 移動ベクトル の表. ティックごとの `getDrift()` はこの表を引いた結果を返すだけにする
+        self._drift_table=self.buildDriftTable(config)
+        self._drift=None
+        self._motion_start_t=0.0
+
+
+    def log_position_if_verbose(self):
+        if self.verbose:
+            print("mouse pos: ",self.get_mouse_pos())        
+    
+    def log_state_if_verbose(self):
+        if self.verbose:
+            print("MouseMovementState: ",self.state)
+
+
+
+    @staticmethod
+    def buildDriftTable(config:SimpleMouseMovementConfig)->Dict[MouseMovementState,Tuple[int,int]]:
+        """移動状態ごとのマウスの相対移動ベクトルの表を作る
+
+        Args:
+            config (SimpleMouseMovementConfig): マウスの動作に関する設定.
+
+        Returns:
+            Dict[MouseMovementState,Tuple[int,int]]: 移動状態 -> `(dx,dy)`
+        """
+        speeds={
+            MouseSpeedTier.WALK: config.walk_speed,
+            MouseSpeedTier.DASH: config.dash_speed,
+            MouseSpeedTier.SNEAK: config.sneak_speed,
+        }
+        return {
+            state: (ux*speeds[tier],uy*speeds[tier])
+            for state,(tier,(ux,uy)) in MOUSE_MOVEMENT_VECTORS.items()
+        }
+
+    def getDrift(self)->Tuple[int,int]:
+        """現在のマウスの動作の状態に応じたマウスの相対移動ベクトルを返す
+        Returns:
+            Tuple[int,int]: `(dx,dy)`
+        """
+        drift=self._drift
+        if drift is None:
+            raise RuntimeError("unexpected state")
+        return drift
+
+
+
+    def _applyState(self,state:MouseMovementState):
+        """状態を変更する. `tick()` からのみ呼ばれる
+        """
+        if self.state != state:
+            drift=self._drift_table.get(state)
+            if self._drift is None and drift is not None:
+                self._motion_start_t=self.clock()
+            self._drift=drift
+            self.state=state
+            self.log_state_if_verbose()
+
+    def _applyQueuedStates(self):
+        """`reconfigure(...)` による設定の変更と、キューに積まれた状態の変更を順に適用する
+        """
+        with self._lock:
+            queue=self._queue
+            self._queue=deque()
+            reconfigure=self._pending_reconfigure
+            self._pending_reconfigure=None
+        if reconfigure is not None:
+            config,drift_table,get_mouse_pos,set_mouse_pos,drift_mouse_pos,verbose=reconfigure
+            self.config=config
+            self._drift_table=drift_table
+            self._drift=drift_table.get(self.state)
+            self.get_mouse_pos=get_mouse_pos
+            self.set_mouse_pos=set_mouse_pos
+            self.drift_mouse_pos=drift_mouse_pos
+            self.verbose=verbose
+        for state in queue:
+            self._applyState(state)
+
+
+    def tick(self)->Optional[float]:
+        """1ティック分の処理を行う. `BackgroundScheduler` のタスクとして呼ばれる
+
+        Returns:
+            Optional[float]: 次のティックまでの時間 [sec]. 停止中 (NORMAL) や終了 (QUIT) のときは `None`
+        """
+        idle=self._drift is None
+        self._applyQueuedStates()
+        interval=self.config.keyboard_interval
+        if idle and self._drift is not None:
+            # 停止中の時間は移動量に含めず、時間軸を現在時刻から始め直す
+            self._next_t=self.clock()
+            self._prev_t=self._next_t-interval
+            self._remainder=(0.0,0.0)
+
+        # 一定時間経過で自動的に通常状態に変化する
+        if self._drift is not None and self.clock()-self._last_update_t >= self.config.timeout_period:
+            self._applyState(MouseMovementState.NORMAL)
+
+        if self.state == MouseMovementState.QUIT:
+            self._finished.set()
+            return None
+        if self._drift is None:
+            # 状態の変更が届いていなければタスクを終える. 届いていればすぐに処理する
+            with self._lock:
+                if not self._queue:
+                    self._scheduled=False
+                    return None
+            return 0.0
+
+        # 実際の経過時間に応じて移動量をスケールし、整数に丸めた残りは次のティックに持ち越す
+        now=self.clock()
+        elapsed=min(now-self._prev_t,self.MAX_CATCHUP_FRAMES*interval)
+        self._prev_t=now
+        dx,dy=self.getDrift()
+        if self.config.profile is not None:
+            f=self.config.profile.factor(now-self._motion_start_t)
+            dx,dy=dx*f,dy*f
+        rx,ry=self._remainder
+        fx=dx*elapsed/interval+rx
+        fy=dy*elapsed/interval+ry
+        ix,iy=int(round(fx)),int(round(fy))
+        self._remainder=(fx-ix,fy-iy)
+        if ix != 0 or iy != 0:
+            self.drift_mouse_pos(ix,iy)
+        self.log_position_if_verbose()
+
+        # 次の目標時刻までの時間を返す. 間に合わなかったティックは読み飛ばす
+        self._next_t+=interval
+        now=self.clock()
+        if now >= self._next_t+interval:
+            missed=int((now-self._next_t)/interval)
+            self.missed_frames+=missed
+            self._next_t+=missed*interval
+            if self.verbose:
+                print("missed frames: ",missed)
+        return max(self._next_t-now,0.0)
+
+    
+    def updateState(self,state:MouseMovementState):
+        """状態の変更を要求する. 変更はキューに積まれ、`tick()` で順に適用される
+        """
+        with self._lock:
+            self._last_update_t=self.clock()
+            self._queue.append(state)
+            self._scheduleLocked()
+
+    def _scheduleLocked(self):
+        # must be called with `self._lock`
+        if self._scheduled or self._finished.is_set():
+            return
+        self._scheduled=True
+        scheduler=self.scheduler or BackgroundScheduler.defaultScheduler()
+        self._task=scheduler.callLater(0.0,self.tick,BackgroundScheduler.PRIORITY_HIGH)
+
+    def reconfigure(
+        self,
+        config:SimpleMouseMovementConfig,
+        get_mouse_pos:Callable[[],Tuple[int,int]],
+        set_mouse_pos:Callable[[Tuple[int,int]],None],
+        drift_mouse_pos:Optional[Callable[[int,int],None]]=None,
+        verbose:bool=False,
+    ):
+        """動作中のワーカーの設定をまとめて差し替える. 差し替えは次の `tick()` の最初に一度に行われる. 
+        引数はコンストラクタと同じ
+        """
+        drift_table=self.buildDriftTable(config)
+        drift_mouse_pos=(
+            drift_mouse_pos if drift_mouse_pos is not None
+            else self.generate_auto_drift_mouse_pos(get_mouse_pos,set_mouse_pos)
+        )
+        with self._lock:
+            self._pending_reconfigure=(config,drift_table,get_mouse_pos,set_mouse_pos,drift_mouse_pos,verbose)
+            self._scheduleLocked()
+
+    def shutdown(self):
+        """ワーカーを直ちに終了する. スケジューラが止まっていても終了できるように、タスクを取り消す
+        """
+        with self._lock:
+            if self._task is not None:
+                self._task.cancel()
+            self._finished.set()
+
+    def is_alive(self)->bool:
+        return not self._finished.is_set()
+
+    def join(self,timeout:Optional[float]=None):
+        """QUIT 状態が適用されるまで待つ
+        """
+        self._finished.wait(timeout)
+
+
+class SimpleMouseMovementController:
+    """
+    マウスカーソルの移動のコントローラー. 
+    `SimpleMouseMovementWorker` をラップしてシンプルなインターフェースにしている.
+    ワーカーは共有の `BackgroundScheduler` 上で動くので、コントローラーごとにスレッドが増えることはない.
+    シングルトン. ワーカーは `WorkerRegistry` に登録され、2回以上インスタンス化すると動作中のワーカーの設定がその場で差し替えられる.
+    keyhac による config.py のリロード時には `WorkerRegistry.shutdownAll()` によりワーカーが終了する.
+    `ConfigReloader` によるリロードではワーカーは終了せず、新しい設定に差し替えられる (変更のないキー割り当てが古いコントローラーを使い続けるため)
+    """
+
+    _WORKER_NAME = "SimpleMouseMovementController"
+
+    _instance = None
+    _lock = threading.Lock()
+
+    def __new__(
+        cls,
+        config:SimpleMouseMovementConfig,
+        get_mouse_pos:Callable[[],Tuple[int,int]],
+        set_mouse_pos:Callable[[Tuple[int,int]],None],
+        drift_mouse_pos:Optional[Callable[[int,int],None]]=None,
+        verbose:bool=False,
+        when_applied:Optional[Callable[[Callable[[],Any]],None]]=None,
+    ):
+        with cls._lock:
+            if cls._instance is None:
+                cls._instance = super().__new__(cls)
+
+        return cls._instance
+
+    def __init__(
+        self,
+        config:SimpleMouseMovementConfig,
+        get_mouse_pos:Callable[[],Tuple[int,int]],
+        set_mouse_pos:Callable[[Tuple[int,int]],None],
+        drift_mouse_pos:Optional[Callable[[int,int],None]]=None,
+        verbose:bool=False,
+        when_applied:Optional[Callable[[Callable[[],Any]],None]]=None,
+    ):
+        # the worker of a previous load is an instance of the previous `SimpleMouseMovementWorker` class, so it is not checked with `isinstance`
+        def attach():
+            worker=WorkerRegistry.get(self._WORKER_NAME)
+            if worker is not None and worker.is_alive():
+                worker.reconfigure(
+                    config=config,
+                    get_mouse_pos=get_mouse_pos,
+                    set_mouse_pos=set_mouse_pos,
+                    drift_mouse_pos=drift_mouse_pos,
+                    verbose=verbose
+                )
+            else:
+                worker=SimpleMouseMovementWorker(
+                    config=config,
+                    get_mouse_pos=get_mouse_pos,
+                    set_mouse_pos=set_mouse_pos,
+                    drift_mouse_pos=drift_mouse_pos,
+                    verbose=verbose
+                )
+                WorkerRegistry.register(self._WORKER_NAME,worker)
+            self._worker=worker
+
+        # a dry load of `ConfigReloader` passes `keymap.whenApplied`, so that the running worker is changed only when the load is applied
+        if when_applied is not None:
+            when_applied(attach)
+        else:
+            attach()
+
+    def updateState(self,state:MouseMovementState):
+        self._worker.updateState(state)
+        if state==MouseMovementState.QUIT:
+            self._worker.join()
+
+    def is_alive(self)->bool:
+        return self._worker.is_alive()
+
+
+class HeldKeyMouseMotion:
+    """
+    押されている移動キーの集合からマウスの動作状態を決めて `SimpleMouseMovementController` を操作するクラス.
+
+    - キーの down / up のたびに押されているキーの集合を更新し、その集合から移動状態を決め直す
+    - 方向キーが同時に押されているときは方向ベクトルの和で斜め方向になる
+    - 速さの段階は最後に押された (キーリピートを含む) キーの修飾キーで決まる
+    - `install(window_keymap)` で任意の WindowKeymap に down / up のキー割り当てを追加できる
+    - keyhac は key-up をその時点で押されている修飾キーで照合するので、修飾キーを先に離しても移動キーの up が届くように、
+      up はすべての修飾キーの組み合わせに割り当てる. プレフィックスの修飾キー (U1 や Alt) を離したときは押されているキーをすべて離したことにする.
+      押されていなかったキーの up は `pass_key_up(name)` でそのまま送る
+    """
+
+    # 方向キー -> 方向ベクトル. 画面座標なので上方向が -y
+    DIRECTION_KEYS:Dict[str,Tuple[int,int]]={
+        "I": (0,-1),
+        "J": (-1,0),
+        "K": (0,+1),
+        "L": (+1,0),
+    }
+
+    # 速さの段階 -> 修飾キーのプレフィックス
+    TIER_MODIFIERS:Dict[MouseSpeedTier,str]={
+        MouseSpeedTier.WALK: "",
+        MouseSpeedTier.DASH: "C-",
+        MouseSpeedTier.SNEAK: "S-",
+    }
+
+    # 修飾キー -> その修飾キーになるキー. "U1" は `configureKeymap` の `keymap.defineModifier(29,"User1")` (無変換) に合わせる
+    MODIFIER_KEYS:Dict[str,Tuple[str,...]]={
+        "A": ("LAlt","RAlt"),
+        "C": ("LCtrl","RCtrl"),
+        "S": ("LShift","RShift"),
+        "W": ("LWin","RWin"),
+        "U1": ("(29)",),
+    }
+
+    def __init__(self,controller:"SimpleMouseMovementController",pass_key_up:Optional[Callable[[str],None]]=None):
+        self.controller=controller
+        self.pass_key_up=pass_key_up if pass_key_up is not None else self.sendKeyUp
+        self.held:Dict[str,Tuple[int,int]]={}
+        self.tier=MouseSpeedTier.WALK
+
+    @staticmethod
+    def sendKeyUp(name:str):
+        """キー `name` の key-up を送る
+        """
+        vk=int(name[1:-1]) if name.startswith("(") else KeyCondition.strToVk(name)
+        pyauto.Input.send([pyauto.KeyUp(vk)])
+
+
+    def press(self,key:str,tier:MouseSpeedTier=MouseSpeedTier.WALK):
+        """移動キー `key` が押された (キーリピートを含む)
+        """
+        self.held[key]=self.DIRECTION_KEYS[key]
+        self.tier=tier
+        self.update()
+
+    def release(self,key:str)->bool:
+        """移動キー `key` が離された. `key` が押されていなかったときは何もせずに `False` を返す
+        """
+        if self.held.pop(key,None) is None:
+            return False
+        self.update()
+        return True
+
+    def clear(self):
+        """押されているキーをすべて離したことにする
+        """
+        self.held.clear()
+        self.update()
+
+    def update(self):
+        """押されているキーの集合から移動状態を決めて `controller` に渡す
+        """
+        ux=sum(v[0] for v in self.held.values())
+        uy=sum(v[1] for v in self.held.values())
+        self.controller.updateState(composeMouseMovementState(self.tier,ux,uy))
+
+
+    def install(self,window_keymap,prefix:str="U1-A-"):
+        """`window_keymap` に `D-{修飾キー}{prefix}{方向キー}` を割り当て、方向キーとプレフィックスの修飾キーの `U-` を
+        修飾キーのすべての組み合わせ (修飾キーなしを含む) に割り当てる
+
+        Args:
+            window_keymap: `keymap.defineWindowKeymap(...)` の返り値.
+            prefix (str, optional): 方向キーの前につける修飾キー. デフォルトは `"U1-A-"`.
+        """
+        prefix_modifiers=[token for token in prefix.split("-") if token]
+        modifiers=[m.rstrip("-") for m in self.TIER_MODIFIERS.values() if m]+prefix_modifiers
+        combinations=[
+            "".join(m+"-" for m in itertools.compress(modifiers,mask))
+            for mask in itertools.product((False,True),repeat=len(modifiers))
+        ]
+
+        for tier,modifier in self.TIER_MODIFIERS.items():
+            for key in self.DIRECTION_KEYS:
+                window_keymap["D-"+modifier+prefix+key]=lambda key=key,tier=tier : self.press(key,tier)
+        for key in self.DIRECTION_KEYS:
+            for combination in combinations:
+                window_keymap["U-"+combination+key]=lambda key=key : self.release(key) or self.pass_key_up(key)
+        for modifier in prefix_modifiers:
+            for name in self.MODIFIER_KEYS[modifier]:
+                for combination in combinations:
+                    window_keymap["U-"+combination+name]=lambda name=name,modifier=modifier : self._releaseModifier(name,modifier)
+
+    def _releaseModifier(self,name:str,modifier:str):
+        if self.held:
+            self.clear()
+        # ユーザー定義の修飾キーは keyhac が OS に送らないので、up も送らない
+        if not modifier.startswith("U"):
+            self.pass_key_up(name)
+
+
+class MacroTimeline:
+    """
+    Macro compiled once into a flat timeline of input events.
+
+    A macro is a sequence of steps:
+    - `str`: key stroke in keyhac notation such as `"a"` or `"C-S-Tab"`
+    - `int` / `float`: delay in seconds
+    - `("text", s)`: text `s`, typed character by character `char_interval` seconds apart
+    The events which share a timestamp are merged into one frame, so `times[i]` and `frames[i]` are
+    the offset in seconds and the tuple of pyauto input events of the i-th submission.
+    """
+
+    # Modifier of keyhac notation -> key name
+    MODIFIER_KEYS:Dict[str,str]={"S":"Shift","C":"Ctrl","A":"Alt","W":"Win"}
+
+    def __init__(self,times:List[float],frames:List[Tuple[Any,...]]):
+        self.times=times
+        self.frames=frames
+
+    @property
+    def duration(self)->float:
+        return self.times[-1] if self.times else 0.0
+
+    @property
+    def eventCount(self)->int:
+        return sum(len(frame) for frame in self.frames)
+
+    def iterFrames(self):
+        """Iterate `(time, frame)` in order.
+        """
+        return zip(self.times,self.frames)
+
+    @classmethod
+    def keyEvents(cls,name:str)->List[Any]:
+        """Return the pyauto input events of the key stroke `name` such as `"C-S-Tab"`.
+        """
+        tokens=name.split("-")
+        key=tokens.pop()
+        modifiers=[KeyCondition.strToVk(cls.MODIFIER_KEYS[token.upper()]) for token in tokens]
+        return (
+            [pyauto.KeyDown(vk) for vk in modifiers]
+            +[pyauto.Key(KeyCondition.strToVk(key))]
+            +[pyauto.KeyUp(vk) for vk in reversed(modifiers)]
+        )
+
+    @classmethod
+    def compile(
+        cls,
+        steps,
+        char_interval:float=0.0,
+        key_events:Optional[Callable[[str],List[Any]]]=None,
+    )->"MacroTimeline":
+        """Compile `steps` into a timeline.
+
+        Args:
+            steps: steps of the macro.
+            char_interval (float, optional): interval of the characters of a text step in seconds.
+            key_events (Optional[Callable[[str],List[Any]]], optional): function to convert a key stroke to input events. Default is `keyEvents`.
+        """
+        key_events=key_events or cls.keyEvents
+        key_cache:Dict[str,List[Any]]={}
+        times:List[float]=[]
+        frames:List[Tuple[Any,...]]=[]
+        pending:List[Any]=[]
+        t=0.0
+
+        def advance(delay:float):
+            nonlocal pending,t
+            if delay>0:
+                if pending:
+                    times.append(t)
+                    frames.append(tuple(pending))
+                    pending=[]
+                t+=delay
+
+        for step in steps:
+            if isinstance(step,str):
+                events=key_cache.get(step)
+                if events is None:
+                    events=key_cache[step]=key_events(step)
+                pending.extend(events)
+            elif isinstance(step,(int,float)):
+                advance(step)
+            elif isinstance(step,tuple) and step[0]=="text":
+                for i,c in enumerate(step[1]):
+                    if i:
+                        advance(char_interval)
+                    pending.append(pyauto.Char(c))
+            else:
+                raise ValueError("invalid macro step: %r" % (step,))
+        advance(float("inf"))
+        return cls(times,frames)
+
+
+class MacroRecording:
+    """
+    Compact form of a key macro recorded by `keymap.command_RecordStart` / `command_RecordStop`.
+
+    The events are kept in three packed arrays: virtual key codes (`vks`), flags (`flags`, `FLAG_UP` for a key-up)
+    and the time from the previous event in milliseconds (`deltas`).
+    keyhac records `keymap.record_seq` as `(vk, up)` without times, so `fromRecordSeq(...)` spaces the events by `interval_ms`.
+
+    - `save(path)` / `load(path)`: binary file of a header and the three arrays
+    - `toText()` / `fromText(text)`: readable form of one `+<delta ms> <D|U> <vk>` line per event
+    - `iterFrames()`: input frames generated while played by `MacroPlayer`, so a long recording is not expanded in advance
+    """
+
+    FLAG_UP=0x01
+
+    MAGIC=b"KHMR"
+    VERSION=1
+    _HEADER=struct.Struct("<4sBI")
+
+    def __init__(self,vks=None,flags=None,deltas=None):
+        self.vks=vks if vks is not None else array.array("B")
+        self.flags=flags if flags is not None else array.array("B")
+        self.deltas=deltas if deltas is not None else array.array("I")
+
+    def __len__(self)->int:
+        return len(self.vks)
+
+    def append(self,vk:int,up:bool,delta_ms:int=0):
+        self.vks.append(vk)
+        self.flags.append(self.FLAG_UP if up else 0)
+        self.deltas.append(delta_ms)
+
+    @classmethod
+    def fromRecordSeq(cls,record_seq,interval_ms:int=0)->"MacroRecording":
+        """Convert `keymap.record_seq`, a list of `(vk, up)`.
+        """
+        recording=cls()
+        for vk,up in record_seq:
+            recording.append(vk,up,interval_ms)
+        return recording
+
+    def toRecordSeq(self)->List[Tuple[int,bool]]:
+        return [(vk,bool(flag&self.FLAG_UP)) for vk,flag in zip(self.vks,self.flags)]
+
+
+    def save(self,path:str):
+        arrays=(self.vks,self.flags,self.deltas)
+        if sys.byteorder!="little":
+            arrays=tuple(array.array(a.typecode,a) for a in arrays)
+            for a in arrays:
+                a.byteswap()
+        with open(path,"wb") as f:
+            f.write(self._HEADER.pack(self.MAGIC,self.VERSION,len(self.vks)))
+            for a in arrays:
+                a.tofile(f)
+
+    @classmethod
+    def load(cls,path:str)->"MacroRecording":
+        with open(path,"rb") as f:
+            magic,version,count=cls._HEADER.unpack(f.read(cls._HEADER.size))
+            if magic!=cls.MAGIC or version!=cls.VERSION:
+                raise ValueError("not a macro recording: %s" % path)
+            arrays=[]
+            for typecode in ("B","B","I"):
+                a=array.array(typecode)
+                a.fromfile(f,count)
+                if sys.byteorder!="little":
+                    a.byteswap()
+                arrays.append(a)
+        return cls(*arrays)
+
+
+    def toText(self)->str:
+        return "".join(
+            "+%d %s %d\n" % (delta,"U" if flag&self.FLAG_UP else "D",vk)
+            for vk,flag,delta in zip(self.vks,self.flags,self.deltas))
+
+    @classmethod
+    def fromText(cls,text:str)->"MacroRecording":
+        recording=cls()
+        for line in text.splitlines():
+            line=line.split("#",1)[0].strip()
+            if not line:
+                continue
+            delta,direction,vk=line.split()
+            recording.append(int(vk,0),direction=="U",int(delta.lstrip("+")))
+        return recording
+
+
+    def iterFrames(self):
+        """Iterate `(time, frame)` in order. Consecutive events without delay form one frame.
+        """
+        t=0
+        frame:List[Any]=[]
+        for vk,flag,delta in zip(self.vks,self.flags,self.deltas):
+            if delta and frame:
+                yield t/1000,tuple(frame)
+                frame=[]
+            t+=delta
+            frame.append(pyauto.KeyUp(vk) if flag&self.FLAG_UP else pyauto.KeyDown(vk))
+        if frame:
+            yield t/1000,tuple(frame)
+
+
+class MacroPlayer:
+    """
+    Player of a `MacroTimeline` or a `MacroRecording` on `BackgroundScheduler`.
+
+    Each frame is sent with one `pyauto.Input.send(...)` at its due time,
+    which is computed from the start time, so delays of the scheduler do not accumulate.
+    The frames are sent from the scheduler thread, so `keymap.input_seq` of the key hook thread is not used.
+    The frames are taken from `timeline.iterFrames()` while playing.
+    `speed` scales the time (2.0 plays twice as fast). The key handler only calls `.play()`, which returns immediately.
+    """
+
+    def __init__(
+        self,
+        timeline,
+        speed:float=1.0,
+        scheduler:Optional[BackgroundScheduler]=None,
+        clock:Callable[[],float]=time.monotonic,
+    ):
+        self.timeline=timeline
+        self.speed=speed
+        self.scheduler=scheduler
+        self.clock=clock
+        self._task:Optional[BackgroundTask]=None
+        self._frames=iter(())
+        self._next:Optional[Tuple[float,Tuple[Any,...]]]=None
+        self._start=0.0
+
+    def play(self):
+        """Start playing from the beginning. A playback in progress is cancelled.
+        """
+        self.cancel()
+        self._frames=iter(self.timeline.iterFrames())
+        self._next=next(self._frames,None)
+        self._start=self.clock()
+        scheduler=self.scheduler or BackgroundScheduler.defaultScheduler()
+        self._task=scheduler.callLater(0.0,self._step,BackgroundScheduler.PRIORITY_HIGH)
+
+    def cancel(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task=None
+
+    def is_playing(self)->bool:
+        return self._task is not None and not self._task.cancelled and self._next is not None
+
+    def shutdown(self):
+        self.cancel()
+
+    def is_alive(self)->bool:
+        return self.is_playing()
+
+    def _step(self)->Optional[float]:
+        now=self.clock()-self._start
+        if self._next is not None and self._next[0]/self.speed<=now:
+            events=[]
+            while self._next is not None and self._next[0]/self.speed<=now:
+                events.extend(self._next[1])
+                self._next=next(self._frames,None)
+            pyauto.Input.send(events)
+        if self._next is None:
+            return None
+        return self._next[0]/self.speed-now
+
+
+class ClipboardTransforms:
+    """
+    Line transforms of clipboard text, such as quoting and indenting, assembled in linear time.
+
+    A line transform is a function of one line (with its line break) to the new line.
+    `apply(text, *line_funcs)` runs several transforms in one pass over the lines and joins the result once,
+    and `iterApply(chunks, *line_funcs)` does the same for text given in chunks.
+    This class is static class.
+    """
+
+    INDENT_WIDTH=4
+
+    @staticmethod
+    def quoteLine(mark:str)->Callable[[str],str]:
+        """Put `mark` at the head of every line."""
+        return lambda line : mark+line
+
+    @staticmethod
+    def indentLine(width:int=INDENT_WIDTH)->Callable[[str],str]:
+        """Indent every non-blank line with `width` spaces."""
+        indent=" "*width
+        return lambda line : indent+line if line.lstrip() else line
+
+    @staticmethod
+    def unindentLine(width:int=INDENT_WIDTH)->Callable[[str],str]:
+        """Remove up to `width` leading spaces, or the leading spaces and one tab, of every line."""
+        def unindent(line:str)->str:
+            for i in range(width+1):
+                if i>=len(line):
+                    break
+                if line[i]=="\t":
+                    i+=1
+                    break
+                if line[i]!=" ":
+                    break
+            return line[i:]
+        return unindent
+
+    @staticmethod
+    def _compose(line_funcs:Tuple[Callable[[str],str],...])->Callable[[str],str]:
+        if len(line_funcs)==1:
+            return line_funcs[0]
+        def composed(line:str)->str:
+            for func in line_funcs:
+                line=func(line)
+            return line
+        return composed
+
+    @classmethod
+    def apply(cls,text:str,*line_funcs:Callable[[str],str])->str:
+        """Apply `line_funcs` in order to every line of `text`.
+        """
+        func=cls._compose(line_funcs)
+        return "".join(map(func,text.splitlines(True)))
+
+    @classmethod
+    def iterApply(cls,chunks,*line_funcs:Callable[[str],str]):
+        """Apply `line_funcs` to text given as an iterable of chunks, and yield the result in chunks.
+        A line split between chunks is transformed when it is complete.
+        """
+        func=cls._compose(line_funcs)
+        rest=""
+        for chunk in chunks:
+            lines=(rest+chunk).splitlines(True)
+            rest=""
+            # the last line may continue in the next chunk, as may "\r" of "\r\n"
+            if lines and (lines[-1]==lines[-1].rstrip("\r\n") or lines[-1].endswith("\r")):
+                rest=lines.pop()
+            if lines:
+                yield "".join(map(func,lines))
+        if rest:
+            yield func(rest)
+
+    @classmethod
+    def transformClipboardText(cls,name:str,*line_funcs:Callable[[str],str])->str:
+        """Return the clipboard text transformed by `line_funcs`. The time it took is printed with `DEBUG_TIMING`.
+        """
+        text=getClipboardText() or ""
+        t0=time.perf_counter()
+        result=cls.apply(text,*line_funcs)
+        if DEBUG_TIMING:
+            print("%s: %d chars in %.1f ms" % (name,len(text),(time.perf_counter()-t0)*1000))
+        return result
+
+
+def _buildWidthTables()->Tuple[Dict[int,str],Dict[int,str],Dict[str,str]]:
+    """Build the tables of `WidthConverter` from the `<wide>` / `<narrow>` decompositions of the Halfwidth and Fullwidth Forms block.
+
+    Returns:
+        Tuple[Dict[int,str],Dict[int,str],Dict[str,str]]: translation table to half width, translation table to full width,
+        and pairs of a halfwidth katakana and a halfwidth (semi-)voiced sound mark to the composed fullwidth katakana.
+    """
+    to_half:Dict[int,str]={}
+    to_full:Dict[int,str]={}
+    for code in range(0xFF00,0xFFF0):
+        decomposition=unicodedata.decomposition(chr(code)).split()
+        if len(decomposition)!=2 or decomposition[0] not in ("<wide>","<narrow>"):
+            continue
+        other=chr(int(decomposition[1],16))
+        if decomposition[0]=="<wide>":
+            to_half[code]=other
+            to_full[ord(other)]=chr(code)
+        else:
+            to_half[ord(other)]=chr(code)
+            to_full[code]=other
+
+    # Halfwidth (semi-)voiced sound marks are combining marks by decomposition, but standalone marks in text
+    to_full[0xFF9E]="\u309B"
+    to_full[0xFF9F]="\u309C"
+    to_half[0x309B]="\uFF9E"
+    to_half[0x309C]="\uFF9F"
+    to_half[0x3099]="\uFF9E"
+    to_half[0x309A]="\uFF9F"
+    # The wide form of the space is the ideographic space outside the block
+    to_full[0x20]="\u3000"
+    to_half[0x3000]=" "
+    # Conventions of Japanese text kept from the original conversion of config.py
+    for half,full in zip("\"'-\\`","\u201D\u2019\u2212\uFFE5\u2018"):
+        to_full[ord(half)]=full
+        to_half[ord(full)]=half
+
+    # Fullwidth katakana with (semi-)voiced sound mark -> halfwidth katakana + halfwidth mark
+    voiced:Dict[str,str]={}
+    for code in range(0x30A0,0x3100):
+        decomposition=unicodedata.decomposition(chr(code)).split()
+        if len(decomposition)!=2 or int(decomposition[1],16) not in (0x3099,0x309A):
+            continue
+        base=to_half.get(int(decomposition[0],16))
+        if base is None:
+            continue
+        pair=base+to_half[int(decomposition[1],16)]
+        to_half[code]=pair
+        voiced[pair]=chr(code)
+    return to_half,to_full,voiced
+
+
+class WidthConverter:
+    """
+    Conversion between halfwidth and fullwidth characters, covering the whole Halfwidth and Fullwidth Forms block
+    (ASCII, katakana and their marks, Hangul and symbols). The tables are built once when config.py is loaded.
+
+    Halfwidth katakana followed by a halfwidth voiced or semi-voiced sound mark is composed into one fullwidth katakana,
+    e.g. `"ｶﾞ"` -> `"ガ"`, and decomposed back by `toHalfWidth`.
+    The streaming versions convert an iterable of chunks; a chunk which ends with a halfwidth katakana waits for the next chunk,
+    which may start with its sound mark.
+    This class is static class.
+    """
+
+    _TO_HALF,_TO_FULL,_VOICED=_buildWidthTables()
+    _VOICED_RE=re.compile("|".join(sorted(_VOICED,key=len,reverse=True)))
+    _VOICED_BASES=frozenset(pair[0] for pair in _VOICED)
+
+    @classmethod
+    def toHalfWidth(cls,text:str)->str:
+        return text.translate(cls._TO_HALF)
+
+    @classmethod
+    def toFullWidth(cls,text:str)->str:
+        voiced=cls._VOICED
+        return cls._VOICED_RE.sub(lambda m : voiced[m.group()],text).translate(cls._TO_FULL)
+
+    @classmethod
+    def iterToHalfWidth(cls,chunks):
+        for chunk in chunks:
+            yield chunk.translate(cls._TO_HALF)
+
+    @classmethod
+    def iterToFullWidth(cls,chunks):
+        rest=""
+        for chunk in chunks:
+            chunk=rest+chunk
+            rest=""
+            if chunk and chunk[-1] in cls._VOICED_BASES:
+                chunk,rest=chunk[:-1],chunk[-1]
+            if chunk:
+                yield cls.toFullWidth(chunk)
+        if rest:
+            yield cls.toFullWidth(rest)
+
+
+class ClipboardHistoryIndex:
+    """
+    Clipboard history with a trigram index for incremental search.
+
+    Entries are kept in LRU order; adding a text which is already in the history moves it to the newest.
+    Every entry is indexed by all trigrams of its lowercased text, and the index is updated on every insertion and eviction.
+    A query of three or more characters intersects the posting sets of its trigrams, smallest first,
+    and the candidates are checked by substring search newest first until `limit` entries match.
+    When even the smallest posting set is so large that the newest entries will match soon, the entries are scanned from the newest
+    with membership tests instead of building the intersection.
+    Shorter queries scan the entries from the newest.
+    The oldest entries are evicted while there are more than `maxnum` entries or more than `quota` bytes of UTF-8 in total,
+    like `keymap.clipboard_history.maxnum` / `quota`.
+    """
+
+    GRAM=3
+
+    def __init__(self,maxnum:int=1000,quota:int=10*1024*1024):
+        self.maxnum=maxnum
+        self.quota=quota
+        self.size=0
+        self._entries:"OrderedDict[int,str]"=OrderedDict()  # id -> text, oldest first
+        self._lowered:Dict[int,str]={}
+        self._sizes:Dict[int,int]={}
+        self._ids:Dict[str,int]={}
+        self._index:Dict[str,set]={}
+        self._next_id=0
+
+    def __len__(self)->int:
+        return len(self._entries)
+
+    def _grams(self,lowered:str)->set:
+        return {lowered[i:i+self.GRAM] for i in range(len(lowered)-self.GRAM+1)}
+
+    def add(self,text:str)->bool:
+        """Add `text` as the newest entry. Returns `False` if `text` is empty or larger than `quota`.
+        """
+        size=len(text.encode("utf-8"))
+        if not text or size>self.quota:
+            return False
+        old_id=self._ids.get(text)
+        if old_id is not None:
+            self._remove(old_id)
+        entry_id=self._next_id
+        self._next_id+=1
+        lowered=text.lower()
+        self._entries[entry_id]=text
+        self._lowered[entry_id]=lowered
+        self._ids[text]=entry_id
+        self._sizes[entry_id]=size
+        self.size+=size
+        for gram in self._grams(lowered):
+            self._index.setdefault(gram,set()).add(entry_id)
+        while len(self._entries)>self.maxnum or self.size>self.quota:
+            self._remove(next(iter(self._entries)))
+        return True
+
+    def _remove(self,entry_id:int):
+        text=self._entries.pop(entry_id)
+        lowered=self._lowered.pop(entry_id)
+        del self._ids[text]
+        self.size-=self._sizes.pop(entry_id)
+        for gram in self._grams(lowered):
+            posting=self._index[gram]
+            posting.discard(entry_id)
+            if not posting:
+                del self._index[gram]
+
+    def search(self,query:str,limit:int=50)->List[str]:
+        """Return up to `limit` entries which contain `query` (case-insensitive), newest first.
+        """
+        query=query.lower()
+        if len(query)<self.GRAM:
+            result=[]
+            for entry_id in reversed(self._entries):
+                if query in self._lowered[entry_id]:
+                    result.append(self._entries[entry_id])
+                    if len(result)>=limit:
+                        break
+            return result
+
+        postings=[self._index.get(gram) for gram in self._grams(query)]
+        if any(posting is None for posting in postings):
+            return []
+        postings.sort(key=len)
+        result=[]
+        if len(postings[0])**2>limit*len(self._entries):
+            # common trigrams: about `limit*len(self)/len(postings[0])` newest entries are enough to find `limit` matches
+            for entry_id in reversed(self._entries):
+                if all(entry_id in posting for posting in postings) and query in self._lowered[entry_id]:
+                    result.append(self._entries[entry_id])
+                    if len(result)>=limit:
+                        break
+            return result
+        candidates=postings[0].intersection(*postings[1:])
+
+        # ids increase with insertion, so the largest id is the newest. Only the popped candidates are ordered
+        heap=[-entry_id for entry_id in candidates]
+        heapq.heapify(heap)
+        while heap and len(result)<limit:
+            entry_id=-heapq.heappop(heap)
+            if query in self._lowered[entry_id]:
+                result.append(self._entries[entry_id])
+        return result
+
+    def recent(self,limit:int=50)->List[str]:
+        """Return up to `limit` entries, newest first.
+        """
+        return [self._entries[entry_id] for entry_id in itertools.islice(reversed(self._entries),limit)]
+
+
+class PersistentClipboardHistory:
+    """
+    Clipboard history stored on disk, which survives restarts of keyhac.
+
+    - Bodies are appended to the bodies file in `directory`, as UTF-8 or zlib-compressed UTF-8 if it is longer than `compress_threshold` bytes.
+    - Entries are identified by the SHA-1 of the text, so a text copied again is not stored again but moved to the newest.
+    - `log.jsonl` records adds, moves and evictions one per line, and is replayed on open.
+      A line cut off by a crash is ignored.
+    - Only `preview` (the head of the text) and the location of the body stay in memory.
+      `get(key)` reads the body through a memory map of the bodies file.
+    - The oldest entries are evicted while there are more than `maxnum` entries or more than `quota` stored bytes.
+      The bodies of evicted entries stay in the bodies file until `compact()`, which runs when they take more than half of the file.
+    - `compact()` writes the live bodies to a bodies file of the next generation (`bodies.<generation>.dat`) and a new log
+      whose first line names that generation, and then replaces `log.jsonl` with the new log.
+      This single `os.replace(...)` switches both files, so a crash during compaction leaves either the old or the new pair.
+      Bodies files of other generations left by a crash are removed on open.
+    - The methods are serialized by a lock, so `addLater(text)` can add on `BackgroundScheduler` while the main thread of keyhac reads.
+    """
+
+    PREVIEW_CHARS=80
+
+    _BODIES_RE=re.compile(r"bodies(\.\d+)?\.dat$")
+
+    class Entry:
+        __slots__=("offset","length","compressed","chars","preview")
+
+        def __init__(self,offset:int,length:int,compressed:bool,chars:int,preview:str):
+            self.offset=offset
+            self.length=length
+            self.compressed=compressed
+            self.chars=chars
+            self.preview=preview
+
+    def __init__(
+        self,
+        directory:str,
+        maxnum:int=1000,
+        quota:int=10*1024*1024,
+        compress_threshold:int=4096,
+        scheduler:Optional[BackgroundScheduler]=None,
+    ):
+        self.directory=directory
+        self.maxnum=maxnum
+        self.quota=quota
+        self.compress_threshold=compress_threshold
+        self.scheduler=scheduler
+        self.entries:"OrderedDict[str,PersistentClipboardHistory.Entry]"=OrderedDict()    # key -> entry, oldest first
+        self.stored_bytes=0
+        self.added=0
+        self.deduplicated=0
+        self._mmap:Optional[mmap.mmap]=None
+        self._lock=threading.RLock()
+        os.makedirs(directory,exist_ok=True)
+        self.generation=0
+        self._log_path=os.path.join(directory,"log.jsonl")
+        self._load()
+        self._bodies=open(self._bodies_path,"ab")
+        self._log=open(self._log_path,"a",encoding="utf-8")
+
+    def __len__(self)->int:
+        return len(self.entries)
+
+    def _bodiesPath(self,generation:int)->str:
+        return os.path.join(self.directory,"bodies.dat" if generation==0 else "bodies.%d.dat" % generation)
+
+    def _load(self):
+        records=[]
+        if os.path.exists(self._log_path):
+            with open(self._log_path,encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        records.append(json.loads(line))
+                    except ValueError:
+                        continue
+        if records and records[0]["op"]=="bodies":
+            self.generation=records.pop(0)["generation"]
+        self._bodies_path=self._bodiesPath(self.generation)
+        for name in os.listdir(self.directory):
+            path=os.path.join(self.directory,name)
+            if (self._BODIES_RE.match(name) and path!=self._bodies_path) or path==self._log_path+".tmp":
+                os.remove(path)     # left by a compaction which crashed
+        size=os.path.getsize(self._bodies_path) if os.path.exists(self._bodies_path) else 0
+        for record in records:
+            key=record["key"]
+            if record["op"]=="add":
+                if record["offset"]+record["length"]>size:
+                    continue
+                self._insert(key,self.Entry(record["offset"],record["length"],record["compressed"],record["chars"],record["preview"]))
+            elif record["op"]=="touch" and key in self.entries:
+                self.entries.move_to_end(key)
+            elif record["op"]=="del" and key in self.entries:
+                self.stored_bytes-=self.entries.pop(key).length
+
+    def _insert(self,key:str,entry:"PersistentClipboardHistory.Entry"):
+        old=self.entries.pop(key,None)
+        if old is not None:
+            self.stored_bytes-=old.length
+        self.entries[key]=entry
+        self.stored_bytes+=entry.length
+
+    def _writeLog(self,**record):
+        self._log.write(json.dumps(record,ensure_ascii=False)+"\n")
+
+    def add(self,text:str)->str:
+        """Add `text` as the newest entry and return its key.
+        """
+        with self._lock:
+            data=text.encode("utf-8")
+            key=hashlib.sha1(data).hexdigest()
+            self.added+=1
+            if key in self.entries:
+                self.deduplicated+=1
+                self.entries.move_to_end(key)
+                self._writeLog(op="touch",key=key)
+            else:
+                compressed=len(data)>self.compress_threshold
+                if compressed:
+                    data=zlib.compress(data,6)
+                offset=self._bodies.seek(0,os.SEEK_END)
+                self._bodies.write(data)
+                entry=self.Entry(offset,len(data),compressed,len(text),text[:self.PREVIEW_CHARS])
+                self._insert(key,entry)
+                self._writeLog(op="add",key=key,offset=offset,length=len(data),compressed=compressed,chars=len(text),preview=entry.preview)
+                while len(self.entries)>self.maxnum or self.stored_bytes>self.quota:
+                    old_key,old=self.entries.popitem(last=False)
+                    self.stored_bytes-=old.length
+                    self._writeLog(op="del",key=old_key)
+            self._bodies.flush()
+            self._log.flush()
+            if self._bodies.tell()>2*max(self.stored_bytes,1<<20):
+                self.compact()
+            return key
+
+    def addLater(self,text:str):
+        """Add `text` on `BackgroundScheduler`, so that hashing, compression, file writes and compaction do not run in the caller.
+        The text is dropped if the history is closed before the task runs.
+        """
+        def task():
+            with self._lock:
+                if not self._log.closed:
+                    self.add(text)
+            return None
+        scheduler=self.scheduler or BackgroundScheduler.defaultScheduler()
+        scheduler.callLater(0.0,task,BackgroundScheduler.PRIORITY_LOW)
+
+    def get(self,key:str)->str:
+        """Return the text of the entry `key`.
+        """
+        with self._lock:
+            entry=self.entries[key]
+            end=entry.offset+entry.length
+            if self._mmap is None or len(self._mmap)<end:
+                self._closeMap()
+                with open(self._bodies_path,"rb") as f:
+                    self._mmap=mmap.mmap(f.fileno(),0,access=mmap.ACCESS_READ)
+            data=self._mmap[entry.offset:end]
+            if entry.compressed:
+                data=zlib.decompress(data)
+            return data.decode("utf-8")
+
+    def recent(self,limit:int=50)->List[Tuple[str,str]]:
+        """Return up to `limit` pairs of key and preview, newest first.
+        """
+        with self._lock:
+            return [(key,entry.preview) for key,entry in itertools.islice(reversed(self.entries.items()),limit)]
+
+    def compact(self):
+        """Rewrite the files with the live entries only.
+        """
+        with self._lock:
+            self._closeMap()
+            self._bodies.close()
+            self._log.close()
+            generation=self.generation+1
+            bodies_path=self._bodiesPath(generation)
+            log_tmp=self._log_path+".tmp"
+            offsets=[]
+            with open(self._bodies_path,"rb") as src, open(bodies_path,"wb") as bodies, open(log_tmp,"w",encoding="utf-8") as log:
+                log.write(json.dumps(dict(op="bodies",generation=generation))+"\n")
+                for key,entry in self.entries.items():
+                    src.seek(entry.offset)
+                    data=src.read(entry.length)
+                    offsets.append(bodies.tell())
+                    bodies.write(data)
+                    log.write(json.dumps(dict(op="add",key=key,offset=offsets[-1],length=entry.length,
+                        compressed=entry.compressed,chars=entry.chars,preview=entry.preview),ensure_ascii=False)+"\n")
+                for f in (bodies,log):
+                    f.flush()
+                    os.fsync(f.fileno())
+            # the commit point: the new log names the new bodies file
+            os.replace(log_tmp,self._log_path)
+            for entry,offset in zip(self.entries.values(),offsets):
+                entry.offset=offset
+            try:
+                os.remove(self._bodies_path)
+            except OSError:
+                pass    # removed on the next open
+            self.generation=generation
+            self._bodies_path=bodies_path
+            self._bodies=open(self._bodies_path,"ab")
+            self._log=open(self._log_path,"a",encoding="utf-8")
+
+    def _closeMap(self):
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap=None
+
+    def close(self):
+        with self._lock:
+            self._closeMap()
+            self._bodies.close()
+            self._log.close()
+
+    def shutdown(self):
+        self.close()
+
+    def is_alive(self)->bool:
+        return not self._log.closed
+
+
+class AsyncTextFileWriter:
+    """
+    Writer of a text file in chunks on `BackgroundScheduler`, so the key handler which starts it returns at once.
+
+    Line breaks are normalized to CR-LF with one regular expression pass over each chunk, and each chunk is encoded and written
+    in one task call, letting the other tasks of the scheduler run between chunks.
+    A chunk never ends between CR and LF. `on_done(path)` is called in the main thread of keyhac by `keymap.delayedCall(...)`.
+    """
+
+    CHUNK_CHARS=1<<20
+    UTF8_BOM=b"\xEF\xBB\xBF"
+    _NEWLINE_RE=re.compile("\r\n|\r|\n")
+
+    def __init__(
+        self,
+        path:str,
+        text:str,
+        on_done:Optional[Callable[[str],Any]]=None,
+        keymap=None,
+        bom:bool=True,
+        chunk_chars:int=CHUNK_CHARS,
+        scheduler:Optional[BackgroundScheduler]=None,
+    ):
+        self.path=path
+        self.text=text
+        self.on_done=on_done
+        self.keymap=keymap
+        self.bom=bom
+        self.chunk_chars=chunk_chars
+        self.scheduler=scheduler
+        self.done=threading.Event()
+        self._file=None
+        self._pos=0
+
+    def start(self)->"AsyncTextFileWriter":
+        scheduler=self.scheduler or BackgroundScheduler.defaultScheduler()
+        scheduler.callLater(0.0,self._step,BackgroundScheduler.PRIORITY_LOW)
+        return self
+
+    def _step(self)->Optional[float]:
+        try:
+            if self._file is None:
+                self._file=open(self.path,"wb")
+                if self.bom:
+                    self._file.write(self.UTF8_BOM)
+            text=self.text
+            end=min(self._pos+self.chunk_chars,len(text))
+            if text[end-1:end]=="\r" and text[end:end+1]=="\n":
+                end+=1
+            self._file.write(self._NEWLINE_RE.sub("\r\n",text[self._pos:end]).encode("utf-8"))
+            self._pos=end
+            if self._pos<len(text):
+                return 0.0
+        except Exception:
+            traceback.print_exc()
+            if self._file is not None:
+                self._file.close()
+            self.done.set()
+            return None
+
+        self._file.close()
+        self.done.set()
+        if self.on_done is not None:
+            if self.keymap is not None:
+                self.keymap.delayedCall(lambda : self.on_done(self.path),0)
+            else:
+                self.on_done(self.path)
+        return None
+
+
+class ClipboardWatcher:
+    """
+    Caller of `on_change(text)` when the clipboard text changes.
+    The clipboard is polled every `interval` seconds with `keymap.delayedCall(...)`, i.e. in the main thread of keyhac.
+    """
+
+    def __init__(self,keymap,on_change:Callable[[str],Any],interval:float=1.0):
+        self.keymap=keymap
+        self.on_change=on_change
+        self.interval=interval
+        self._last:Optional[str]=None
+        self._running=False
+
+    def start(self):
+        if not self._running:
+            self._running=True
+            self.keymap.delayedCall(self._poll,int(self.interval*1000))
+
+    def _poll(self):
+        if not self._running:
+            return
+        text=getClipboardText()
+        if text and text!=self._last:
+            self._last=text
+            self.on_change(text)
+        self.keymap.delayedCall(self._poll,int(self.interval*1000))
+
+    def shutdown(self):
+        self._running=False
+
+    def is_alive(self)->bool:
+        return self._running
+
+
+class WindowAttributeCache:
+    """
+    Cache of the attributes of windows keyed by window handle, for the `check_func`s of WindowKeymaps.
+
+    The class name and the process (exe) name of a window do not change while the window exists, so they are fetched once
+    and kept for the last `maxnum` windows; a handle reused by a new window is taken as the old one until it is evicted
+    or `invalidate(wnd)` is called. The title changes, so it is fetched again when it is older than `title_ttl` seconds.
+    `predicate(...)` compiles the conditions of `keymap.defineWindowKeymap(...)` into a `check_func` using this cache.
+    Basically this class is used through `WindowAttributeCache.defaultCache()`.
+    """
+
+    _instance=None
+
+    class Entry:
+        __slots__=("class_name","process_name","text","text_time","results")
+
+        def __init__(self):
+            self.class_name=None
+            self.process_name=None
+            self.text=None
+            self.text_time=0.0
+            self.results:Dict[int,bool]={}
+
+    @classmethod
+    def defaultCache(cls)->"WindowAttributeCache":
+        if cls._instance is None:
+            cls._instance=cls()
+        return cls._instance
+
+    def __init__(self,maxnum:int=256,title_ttl:float=0.5,clock:Callable[[],float]=time.monotonic):
+        self.maxnum=maxnum
+        self.title_ttl=title_ttl
+        self.clock=clock
+        self.fetch_count=0
+        self._entries:"OrderedDict[int,WindowAttributeCache.Entry]"=OrderedDict()
+        self._predicate_ids=itertools.count()
+
+    def _entry(self,wnd)->"WindowAttributeCache.Entry":
+        hwnd=wnd.getHWND()
+        entry=self._entries.get(hwnd)
+        if entry is None:
+            entry=self._entries[hwnd]=self.Entry()
+            if len(self._entries)>self.maxnum:
+                self._entries.popitem(last=False)
+        else:
+            self._entries.move_to_end(hwnd)
+        return entry
+
+    def getClassName(self,wnd)->str:
+        entry=self._entry(wnd)
+        if entry.class_name is None:
+            self.fetch_count+=1
+            entry.class_name=wnd.getClassName()
+        return entry.class_name
+
+    def getProcessName(self,wnd)->str:
+        entry=self._entry(wnd)
+        if entry.process_name is None:
+            self.fetch_count+=1
+            entry.process_name=wnd.getProcessName()
+        return entry.process_name
+
+    def getText(self,wnd)->str:
+        entry=self._entry(wnd)
+        t=self.clock()
+        if entry.text is None or t-entry.text_time>self.title_ttl:
+            self.fetch_count+=1
+            entry.text=wnd.getText()
+            entry.text_time=t
+        return entry.text
+
+    def invalidate(self,wnd):
+        """Forget the window `wnd`, e.g. when it is destroyed or renamed.
+        """
+        self._entries.pop(wnd.getHWND(),None)
+
+    def clear(self):
+        self._entries.clear()
+
+    @staticmethod
+    def _matcher(patterns)->Optional[Callable[[str],bool]]:
+        # patterns are wildcards of `fnmatch` as in keyhac, case-insensitive
+        if patterns is None:
+            return None
+        if isinstance(patterns,str):
+            patterns=(patterns,)
+        regex=re.compile("|".join("(?:%s)" % fnmatch.translate(pattern) for pattern in patterns),re.IGNORECASE)
+        return lambda value : value is not None and regex.match(value) is not None
+
+    def predicate(
+        self,
+        exe_name=None,
+        class_name=None,
+        window_text=None,
+        check_func:Optional[Callable[[Any],bool]]=None,
+    )->Callable[[Any],bool]:
+        """Compile the conditions into a `check_func` of `keymap.defineWindowKeymap(check_func=...)`.
+
+        `exe_name`, `class_name` and `window_text` are a wildcard or a tuple of wildcards, and all the given conditions must hold.
+        The result of a predicate without `window_text` and `check_func` is kept for each window,
+        so later calls for the same window are one dict lookup.
+        """
+        match_exe=self._matcher(exe_name)
+        match_class=self._matcher(class_name)
+        match_text=self._matcher(window_text)
+        stable=window_text is None and check_func is None
+        predicate_id=next(self._predicate_ids)
+
+        def check(wnd)->bool:
+            entry=self._entry(wnd)
+            if stable:
+                result=entry.results.get(predicate_id)
+                if result is not None:
+                    return result
+            result=(
+                (match_class is None or match_class(self.getClassName(wnd)))
+                and (match_exe is None or match_exe(self.getProcessName(wnd)))
+                and (match_text is None or match_text(self.getText(wnd)))
+                and (check_func is None or bool(check_func(wnd)))
+            )
+            if stable:
+                entry.results[predicate_id]=result
+            return result
+        return check
+
+
+# Path of this file. keyhac loads config.py from the current directory
+CONFIG_FILE_PATH=os.path.abspath(globals().get("__file__") or "config.py")
+
+
+def normalizeKeyCondition(name:str)->str:
+    """Return the canonical form of the key condition `name`.
+
+    keyhac ignores the order of the modifiers and the case of the names, and `"D-"` is implied,
+    so `"A-U1-i"` and `"D-U1-A-I"` are the same condition and the later assignment overrides the earlier one.
+    """
+    tokens=name.upper().split("-")
+    key=tokens.pop()
+    modifiers=sorted(set(tokens)-{"D",""})
+    return "-".join(modifiers+[key])
+
+
+def _codeIdentity(code:types.CodeType)->Tuple[Any,...]:
+    # line numbers are left out, so that inserting lines above a function does not change it
+    return (
+        code.co_code,
+        tuple(_codeIdentity(c) if isinstance(c,types.CodeType) else (type(c),c) for c in code.co_consts),
+        code.co_names,
+        code.co_varnames,
+        code.co_freevars,
+    )
+
+def _valueIdentity(value:Any,seen:set)->Any:
+    if isinstance(value,(str,bytes,int,float,complex,type(None))):
+        return (type(value),value)
+    if isinstance(value,tuple):
+        return tuple(_valueIdentity(v,seen) for v in value)
+    if isinstance(value,Enum):
+        return (type(value).__qualname__,value.name)
+    if isinstance(value,type):
+        return value.__qualname__
+    if isinstance(value,types.MethodType):
+        return (handlerIdentity(value.__func__,seen),_valueIdentity(value.__self__,seen))
+    if isinstance(value,types.FunctionType) or hasattr(value,"__wrapped__"):
+        return handlerIdentity(value,seen)
+    # objects such as `held_key_mouse_motion` are created again by each load, so they are identified by the code of their classes
+    return _classIdentity(type(value))
+
+_CLASS_IDENTITIES:"weakref.WeakKeyDictionary[type,Tuple[Any,...]]"=weakref.WeakKeyDictionary()
+
+def _classIdentity(klass:type)->Tuple[Any,...]:
+    # the methods, nested classes and plain class attributes of the classes of config.py in the MRO
+    try:
+        return _CLASS_IDENTITIES[klass]
+    except KeyError:
+        pass
+    members=[]
+    for base in klass.__mro__:
+        if base.__module__!=klass.__module__:
+            continue
+        for name,member in sorted(vars(base).items()):
+            if isinstance(member,(staticmethod,classmethod)):
+                member=member.__func__
+            elif isinstance(member,property):
+                member=member.fget
+            if isinstance(member,types.FunctionType):
+                members.append((base.__qualname__,name,_codeIdentity(member.__code__)))
+            elif isinstance(member,type) and member.__module__==klass.__module__:
+                members.append((base.__qualname__,name,_classIdentity(member)))
+            elif isinstance(member,(str,bytes,int,float,tuple)) and not name.startswith("__"):
+                members.append((base.__qualname__,name,_valueIdentity(member,set())))
+    identity=(klass.__qualname__,tuple(members))
+    _CLASS_IDENTITIES[klass]=identity
+    return identity
+
+def handlerIdentity(target:Any,seen:Optional[set]=None)->Any:
+    """Return a key of the binding target `target` which is equal for the targets of two loads of config.py that behave the same.
+
+    A function is identified by its qualified name, its code without line numbers, its default arguments and its closure,
+    in which other functions are identified recursively and other objects by the code of their classes.
+    Wrappers by `HandlerLatencyStats` and `KeyHandlerDispatcher` are unwrapped with `__wrapped__`.
+    Other targets, such as key strings, are returned as they are and compared with `==`.
+    """
+    while hasattr(target,"__wrapped__"):
+        target=target.__wrapped__
+    if isinstance(target,types.MethodType):
+        return _valueIdentity(target,seen if seen is not None else set())
+    if not isinstance(target,types.FunctionType):
+        return target
+    if seen is None:
+        seen=set()
+    if id(target) in seen:
+        return target.__qualname__     # recursive closure
+    seen.add(id(target))
+    cells=[]
+    for cell in target.__closure__ or ():
+        try:
+            cells.append(_valueIdentity(cell.cell_contents,seen))
+        except ValueError:
+            cells.append(None)  # empty cell
+    return (
+        target.__qualname__,
+        _codeIdentity(target.__code__),
+        _valueIdentity(target.__defaults__,seen),
+        tuple(sorted((k,_valueIdentity(v,seen)) for k,v in (target.__kwdefaults__ or {}).items())),
+        tuple(cells),
+    )
+
+def diffBindingTables(
+    old:Dict[str,Tuple[str,Any]],
+    new:Dict[str,Tuple[str,Any]],
+)->Tuple[List[str],List[str],List[str]]:
+    """Compare two binding tables recorded by `RecordedWindowKeymap`.
+
+    Targets are compared by `handlerIdentity(...)`, so a function defined again by a new load of config.py is changed
+    only when its code, its default arguments or its closure is edited.
+
+    Returns:
+        Tuple[List[str],List[str],List[str]]: normalized key conditions which are added, removed and changed.
+    """
+    added=[condition for condition in new if condition not in old]
+    removed=[condition for condition in old if condition not in new]
+    changed=[
+        condition for condition,(_,target) in new.items()
+        if condition in old and handlerIdentity(old[condition][1])!=handlerIdentity(target)
+    ]
+    return added,removed,changed
+
+
+def bindingTable(pairs:Tuple[Tuple[str,Any],...])->Dict[str,Tuple[str,Any]]:
+    """Build a binding table `{normalized condition: (key, target)}` from `(key, target)` pairs such as `KeymapConfig.expandBindings(...)`.
+
+    A later pair overrides an earlier pair of the same condition, as assignments to a WindowKeymap do.
+    """
+    return {normalizeKeyCondition(key):(key,target) for key,target in pairs}
+
+
+class BindingDiffReport:
+    """
+    Numbers of the bindings handled by `applyBindingDiff(...)`.
+    Reports of several WindowKeymaps are summed with `+=`.
+    """
+
+    def __init__(self,added:int=0,removed:int=0,changed:int=0,unchanged:int=0):
+        self.added=added
+        self.removed=removed
+        self.changed=changed
+        self.unchanged=unchanged
+
+    @property
+    def applied(self)->int:
+        """Number of the bindings written to or deleted from the WindowKeymap."""
+        return self.added+self.removed+self.changed
+
+    def __iadd__(self,other:"BindingDiffReport")->"BindingDiffReport":
+        self.added+=other.added
+        self.removed+=other.removed
+        self.changed+=other.changed
+        self.unchanged+=other.unchanged
+        return self
+
+    def __str__(self)->str:
+        return "%d added, %d removed, %d changed, %d unchanged" % (self.added,self.removed,self.changed,self.unchanged)
+
+
+def applyBindingDiff(
+    window_keymap,
+    old:Dict[str,Tuple[str,Any]],
+    new:Dict[str,Tuple[str,Any]],
+)->BindingDiffReport:
+    """Update `window_keymap`, whose bindings are `old`, to `new` by touching only the differing bindings.
+
+    Args:
+        window_keymap: WindowKeymap of keyhac, or anything which supports item assignment and deletion.
+        old (Dict[str,Tuple[str,Any]]): current binding table of `window_keymap`, e.g. `RecordedWindowKeymap.table` or `bindingTable(...)`.
+        new (Dict[str,Tuple[str,Any]]): binding table to apply.
+
+    Returns:
+        BindingDiffReport: numbers of the added, removed, changed and unchanged bindings.
+    """
+    added,removed,changed=diffBindingTables(old,new)
+    for condition in removed:
+        del window_keymap[old[condition][0]]
+    for condition in itertools.chain(added,changed):
+        key,target=new[condition]
+        window_keymap[key]=target
+    return BindingDiffReport(len(added),len(removed),len(changed),len(new)-len(added)-len(changed))
+
+
+class HandlerLatency:
+    """
+    Latency samples of one bound handler, kept in a ring buffer of the last `size` calls.
+
+    A handler runs in the hook thread of keyhac, or on a queue of `KeyHandlerDispatcher` when it is deferred,
+    so the samples are recorded under a lock.
+
+    `slow` classifies the handler for `KeyHandlerDispatcher`: after `SLOW_MIN_SAMPLES` calls it is updated on every call
+    from the `SLOW_QUANTILE` quantile of the last `SLOW_WINDOW` samples, so one slow call does not make a handler slow,
+    and a slow handler which has become fast is classified back as not slow.
+    """
+
+    SLOW_MIN_SAMPLES=4
+    SLOW_WINDOW=16
+    SLOW_QUANTILE=0.75
+
+    def __init__(self,name:str,size:int):
+        self.name=name
+        self.samples:List[float]=[0.0]*size
+        self.count=0
+        self.max=0.0
+        self.over_budget=0
+        self.slow=False
+        self._lock=threading.Lock()
+
+    def record(self,dt:float,budget:float)->bool:
+        """Record a call which took `dt` seconds. Returns `True` on the first call over `budget`.
+        """
+        with self._lock:
+            self.samples[self.count%len(self.samples)]=dt
+            self.count+=1
+            if dt>self.max:
+                self.max=dt
+            if self.count>=self.SLOW_MIN_SAMPLES:
+                self.slow=self._percentile(self.SLOW_QUANTILE,self.SLOW_WINDOW)>budget
+            if dt>budget:
+                self.over_budget+=1
+                return self.over_budget==1
+        return False
+
+    def _percentile(self,q:float,last:int)->float:
+        # must be called with `self._lock`
+        size=len(self.samples)
+        n=min(self.count,size,last)
+        samples=sorted(self.samples[(self.count-i-1)%size] for i in range(n))
+        if not samples:
+            return 0.0
+        return samples[min(len(samples)-1,int(q*len(samples)))]
+
+    def percentile(self,q:float,last:Optional[int]=None)->float:
+        """Return the `q` (0 to 1) quantile of the buffered samples, or of the `last` latest samples, by nearest rank.
+        """
+        with self._lock:
+            return self._percentile(q,last if last is not None else len(self.samples))
+
+    def to_dict(self)->Dict[str,Any]:
+        return {
+            "name": self.name,
+            "count": self.count,
+            "p50_ms": self.percentile(0.50)*1000,
+            "p99_ms": self.percentile(0.99)*1000,
+            "max_ms": self.max*1000,
+            "over_budget": self.over_budget,
+            "slow": self.slow,
+        }
+
+
+class HandlerLatencyStats:
+    """
+    Per-binding latency of the handlers called in the keyboard hook.
+
+    `wrap(name, func)` returns `func` timed on every call. A handler which takes longer than `budget` seconds
+    delays the following keys and can cause "Time stamp inversion happened", so it is flagged in `dump()` and `exportJson(...)`,
+    and with `DEBUG_TIMING` it is also printed on its first slow call.
+    `RecordingKeymap(keymap, latency_stats=...)` wraps every callable bound through it.
+    """
+
+    def __init__(self,budget:float=0.01,size:int=256,clock:Callable[[],float]=time.perf_counter):
+        self.budget=budget
+        self.size=size
+        self.clock=clock
+        self.handlers:Dict[str,HandlerLatency]={}
+
+    def wrap(self,name:str,func:Callable)->Callable:
+        latency=self.handlers.get(name)
+        if latency is None:
+            latency=self.handlers[name]=HandlerLatency(name,self.size)
+        clock=self.clock
+
+        def timed(*args,**kwargs):
+            t0=clock()
+            try:
+                return func(*args,**kwargs)
+            finally:
+                dt=clock()-t0
+                if latency.record(dt,self.budget) and DEBUG_TIMING:
+                    print("slow handler: %s took %.1f ms (budget %.1f ms)" % (name,dt*1000,self.budget*1000))
+        timed.__wrapped__=func
+        return timed
+
+    def summary(self)->List[Dict[str,Any]]:
+        """Return the stats of the called handlers, slowest p99 first.
+        """
+        stats=[latency.to_dict() for latency in list(self.handlers.values()) if latency.count]
+        stats.sort(key=lambda d : d["p99_ms"],reverse=True)
+        return stats
+
+    def dump(self)->str:
+        """Return the stats as a text table. Handlers over the budget are marked with `!`.
+        """
+        lines=["%-48s %7s %9s %9s %9s" % ("handler","count","p50 ms","p99 ms","max ms")]
+        for d in self.summary():
+            lines.append("%-48s %7d %9.2f %9.2f %9.2f %s" % (
+                d["name"][:48],d["count"],d["p50_ms"],d["p99_ms"],d["max_ms"],"!" if d["over_budget"] else ""))
+        return "\n".join(lines)
+
+    def exportJson(self,path:str):
+        """Write the stats to `path` as JSON.
+        """
+        with open(path,"w",encoding="utf-8") as f:
+            json.dump({"budget_ms":self.budget*1000,"handlers":self.summary()},f,indent=2)
+
+
+def inlineHandler(func:Callable)->Callable:
+    """Mark `func` as a key handler which always runs in the keyboard hook, e.g. a handler calling `keymap.updateKeymap()`.
+    """
+    func.key_handler_mode="inline"
+    return func
+
+def deferredHandler(func:Callable)->Callable:
+    """Mark `func` as a key handler which always runs on `KeyHandlerDispatcher`. Its return value is dropped.
+    """
+    func.key_handler_mode="deferred"
+    return func
+
+def autoHandler(func:Callable)->Callable:
+    """Mark `func` as a key handler which `KeyHandlerDispatcher` moves out of the keyboard hook while it is slow.
+    Its return value is dropped when it is deferred.
+    """
+    func.key_handler_mode="auto"
+    return func
+
+
+class KeyHandlerDispatcher:
+    """
+    Dispatcher which runs slow key handlers on a bounded pool of keyhac's `JobQueue`s instead of the keyboard hook.
+
+    A handler runs in the hook unless it is marked with `deferredHandler` or `autoHandler`,
+    since many handlers (keyhac's GUI commands, the IME and the window commands) must run in the main thread or return a value.
+    An `"auto"` handler runs in the hook while its `HandlerLatency` is not `slow`, i.e. while the recent calls are mostly within the budget,
+    and is deferred while it is `slow`. Deferred calls are still timed, so a handler which has become fast returns to the hook.
+    - All handlers of one key (its `D-` and `U-` conditions) go to the same queue, which runs them in order.
+      While handlers of a key are pending, the later handlers of the key are queued as well even if they are inline,
+      so a key-up never overtakes its key-down.
+    - At most `max_pending` handlers wait in the queues. Key-down handlers over the bound are dropped,
+      key-up handlers are always queued so that no key is left pressed.
+    `RecordingKeymap(keymap, dispatcher=...)` dispatches every callable bound through it.
+    """
+
+    def __init__(
+        self,
+        num_queues:int=2,
+        max_pending:int=64,
+        queue_factory:Optional[Callable[[],Any]]=None,
+        job_factory:Optional[Callable[[Callable,Callable],Any]]=None,
+    ):
+        self.max_pending=max_pending
+        self.queue_factory=queue_factory
+        self.job_factory=job_factory
+        self.dropped=0
+        self._queues:List[Any]=[None]*num_queues
+        self._pending:Dict[str,int]={}
+        self._pending_total=0
+        self._lock=threading.Lock()
+
+    @staticmethod
+    def orderKey(key:str)->Tuple[str,bool]:
+        """Return the key condition `key` without `"U"` and whether `key` is a key-up.
+        """
+        tokens=normalizeKeyCondition(key).split("-")
+        modifiers=tokens[:-1]
+        return "-".join([m for m in modifiers if m!="U"]+tokens[-1:]),"U" in modifiers
+
+    def wrap(self,key:str,func:Callable,mode:str="inline",latency:Optional[HandlerLatency]=None)->Callable:
+        """Return the handler of `key` which runs `func` inline or on the queues.
+
+        Args:
+            key (str): key condition which `func` is bound to.
+            func (Callable): handler.
+            mode (str, optional): `"inline"` (default), `"deferred"` or `"auto"`.
+            latency (Optional[HandlerLatency], optional): latency of `func` which classifies an `"auto"` handler.
+        """
+        order_key,is_up=self.orderKey(key)
+
+        def dispatched():
+            if mode=="inline" or (mode=="auto" and (latency is None or not latency.slow)):
+                with self._lock:
+                    pending=self._pending.get(order_key)
+                if not pending:
+                    return func()
+            self.enqueue(order_key,func,force=is_up)
+        dispatched.__wrapped__=func
+        return dispatched
+
+    def enqueue(self,order_key:str,func:Callable[[],Any],force:bool=False)->bool:
+        """Queue `func` after the pending handlers of `order_key`. Returns `False` if it is dropped.
+        """
+        with self._lock:
+            if self._pending_total>=self.max_pending and not force:
+                self.dropped+=1
+                print("handler dropped: %d handlers pending" % self._pending_total)
+                return False
+            self._pending[order_key]=self._pending.get(order_key,0)+1
+            self._pending_total+=1
+
+            index=hash(order_key)%len(self._queues)
+            queue=self._queues[index]
+            if queue is None:
+                queue=self._queues[index]=(self.queue_factory or JobQueue)()
+                WorkerRegistry.register("KeyHandlerDispatcher",self)
+
+        def run(job_item):
+            try:
+                func()
+            finally:
+                self._finished(order_key)
+        queue.enqueue((self.job_factory or JobItem)(run,lambda job_item : None))
+        return True
+
+    def _finished(self,order_key:str):
+        with self._lock:
+            count=self._pending[order_key]-1
+            if count:
+                self._pending[order_key]=count
+            else:
+                del self._pending[order_key]
+            self._pending_total-=1
+
+    def pendingCount(self)->int:
+        with self._lock:
+            return self._pending_total
+
+    def shutdown(self):
+        with self._lock:
+            queues=[queue for queue in self._queues if queue is not None]
+            self._queues=[None]*len(self._queues)
+        for queue in queues:
+            queue.cancel()
+            queue.join()
+
+    def is_alive(self)->bool:
+        return any(queue is not None for queue in self._queues)
+
+
+class RecordedWindowKeymap:
+    """
+    WindowKeymap defined through `RecordingKeymap`.
+
+    Assignments are recorded in `table` as `{normalized condition: (key, target)}` and forwarded to `target`,
+    the real WindowKeymap, which is `None` in a dry recording.
+    With `latency_stats` and `dispatcher`, callable targets are recorded and forwarded as wrapped by
+    `HandlerLatencyStats.wrap(...)` and then by `KeyHandlerDispatcher.wrap(...)`.
+    """
+
+    def __init__(
+        self,
+        define_args:Dict[str,Any],
+        target=None,
+        latency_stats:Optional[HandlerLatencyStats]=None,
+        dispatcher:Optional[KeyHandlerDispatcher]=None,
+    ):
+        self.define_args=define_args
+        self.target=target
+        self.latency_stats=latency_stats
+        self.dispatcher=dispatcher
+        self.table:Dict[str,Tuple[str,Any]]={}
+        check_func=define_args.get("check_func")
+        self.name=getattr(check_func,"__name__",None) or define_args.get("exe_name") or define_args.get("class_name") or "global"
+
+    def __setitem__(self,key:str,value):
+        if callable(value):
+            name="%s[%s]" % (self.name,key)
+            mode=getattr(value,"key_handler_mode","inline")
+            if self.latency_stats is not None:
+                value=self.latency_stats.wrap(name,value)
+            if self.dispatcher is not None:
+                latency=self.latency_stats.handlers[name] if self.latency_stats is not None else None
+                value=self.dispatcher.wrap(key,value,mode,latency)
+        self.table[normalizeKeyCondition(key)]=(key,value)
+        if self.target is not None:
+            self.target[key]=value
+
+    def __getitem__(self,key:str):
+        return self.table[normalizeKeyCondition(key)][1]
+
+    def __delitem__(self,key:str):
+        del self.table[normalizeKeyCondition(key)]
+        if self.target is not None:
+            del self.target[key]
+
+    def applyTable(self,table:Dict[str,Tuple[str,Any]])->BindingDiffReport:
+        """Replace the bindings with `table`, touching only the differing bindings.
+        """
+        return applyBindingDiff(self,dict(self.table),table)
+
+    def __getattr__(self,name:str):
+        if self.target is None:
+            raise AttributeError(name)
+        return getattr(self.target,name)
+
+
+class RecordingKeymap:
+    """
+    Proxy of keyhac's `keymap` which records the binding table of every WindowKeymap defined through it.
+
+    Everything other than `defineWindowKeymap(...)` is delegated to `real_keymap`.
+    With `dry=True` the WindowKeymaps are only recorded and `real_keymap` keeps its current WindowKeymaps,
+    which is how `ConfigReloader` loads an edited config.py.
+    A dry recording has no side effect on `real_keymap` until `apply()`: attribute assignments are kept in `attributes`,
+    the calls of `SETUP_METHODS` are only recorded in `setup_calls`, and the functions passed to `whenApplied(...)` wait for `apply()`.
+    With `latency_stats`, every callable bound through it is timed (see `HandlerLatencyStats`),
+    and with `dispatcher`, slow ones are moved out of the keyboard hook (see `KeyHandlerDispatcher`).
+    """
+
+    recording=True
+
+    # Methods of keymap which set up keyhac itself. Their calls are recorded, so `ConfigReloader` can tell whether they are edited
+    SETUP_METHODS=("setFont","setTheme","defineModifier")
+
+    def __init__(
+        self,
+        real_keymap,
+        dry:bool=False,
+        latency_stats:Optional[HandlerLatencyStats]=None,
+        dispatcher:Optional[KeyHandlerDispatcher]=None,
+    ):
+        object.__setattr__(self,"real_keymap",real_keymap)
+        object.__setattr__(self,"dry",dry)
+        object.__setattr__(self,"latency_stats",latency_stats)
+        object.__setattr__(self,"dispatcher",dispatcher)
+        object.__setattr__(self,"window_keymaps",[])
+        object.__setattr__(self,"setup_calls",[])
+        object.__setattr__(self,"attributes",{})
+        object.__setattr__(self,"applied_hooks",[])
+
+    def defineWindowKeymap(self,**define_args)->RecordedWindowKeymap:
+        target=None if self.dry else self.real_keymap.defineWindowKeymap(**define_args)
+        window_keymap=RecordedWindowKeymap(define_args,target,self.latency_stats,self.dispatcher)
+        self.window_keymaps.append(window_keymap)
+        return window_keymap
+
+    def _setup(self,name:str,*args):
+        self.setup_calls.append((name,args))
+        if not self.dry:
+            return getattr(self.real_keymap,name)(*args)
+
+    def whenApplied(self,func:Callable[[],Any]):
+        """Call `func` now, or on `apply()` if this recording is dry.
+        """
+        if self.dry:
+            self.applied_hooks.append(func)
+        else:
+            func()
+
+    def apply(self):
+        """Apply a dry recording to `real_keymap`: set the recorded attributes and call the functions passed to `whenApplied(...)`.
+        After this, the recording delegates to `real_keymap` like a recording which is not dry.
+        The WindowKeymaps are applied by `ConfigReloader`.
+        """
+        object.__setattr__(self,"dry",False)
+        for name,value in self.attributes.items():
+            setattr(self.real_keymap,name,value)
+        self.attributes.clear()
+        hooks=list(self.applied_hooks)
+        self.applied_hooks.clear()
+        for func in hooks:
+            func()
+
+    def __getattr__(self,name:str):
+        if name in self.SETUP_METHODS:
+            return lambda *args : self._setup(name,*args)
+        if name in self.attributes:
+            return self.attributes[name]
+        return getattr(self.real_keymap,name)
+
+    def __setattr__(self,name:str,value):
+        if self.dry:
+            self.attributes[name]=value
+        else:
+            setattr(self.real_keymap,name,value)
+
+
+class ConfigReloader:
+    """
+    Hot reload of config.py which applies only the edited bindings.
+
+    keyhac's `command_ReloadConfig` rebuilds every WindowKeymap and restarts every worker.
+    `reload()` instead executes the edited file into a fresh namespace with a dry `RecordingKeymap`,
+    compares the recorded binding tables with the tables of the previous load, and applies only the added, removed and changed
+    bindings to the live WindowKeymaps followed by a single `keymap.updateKeymap()`.
+    `reload()` runs in the main thread of keyhac, which also runs the keyboard hook, so keys see either the old or the new keymap.
+    When WindowKeymaps are added, removed or defined with other arguments, or `SETUP_METHODS` of `RecordingKeymap` are called differently,
+    it falls back to `command_ReloadConfig`.
+    The dry load does not touch the live keymap nor stop the live workers, so an edited file which raises leaves the previous load working.
+    It shares the `HandlerLatencyStats` and the `KeyHandlerDispatcher` of the previous load.
+    If applying the bindings fails, e.g. keyhac rejects a key name, it falls back to `command_ReloadConfig` as well.
+
+    The file is compiled only when its content hash changes, so touching or saving the file without edits costs one read.
+    `startWatching()` polls the modification time of the file on `BackgroundScheduler`.
+    The state of the previous load is kept in `WorkerRegistry.persistentState(...)` because the classes are defined again on each load.
+    """
+
+    STATE_NAME="ConfigReloader"
+
+    def __init__(
+        self,
+        keymap,
+        path:str=CONFIG_FILE_PATH,
+        poll_interval:float=1.0,
+        scheduler:Optional[BackgroundScheduler]=None,
+    ):
+        self.keymap=getattr(keymap,"real_keymap",keymap)
+        self.path=path
+        self.poll_interval=poll_interval
+        self.scheduler=scheduler
+        self.state=WorkerRegistry.persistentState(self.STATE_NAME)
+        self._task:Optional[BackgroundTask]=None
+
+    @staticmethod
+    def _fingerprint(path:str)->Tuple[int,str]:
+        with open(path,"rb") as f:
+            source=f.read()
+        return os.stat(path).st_mtime_ns,hashlib.sha256(source).hexdigest()
+
+    @classmethod
+    def remember(cls,recording:RecordingKeymap,path:str=CONFIG_FILE_PATH):
+        """Keep the binding tables of a load of config.py by keyhac as the base of the next `reload()`.
+        """
+        state=WorkerRegistry.persistentState(cls.STATE_NAME)
+        state["window_keymaps"]=[(wk.define_args,wk.table,wk.target) for wk in recording.window_keymaps]
+        state["setup_calls"]=list(recording.setup_calls)
+        state["latency_stats"]=recording.latency_stats
+        state["dispatcher"]=recording.dispatcher
+        try:
+            state["mtime"],state["hash"]=cls._fingerprint(path)
+        except OSError:
+            state["mtime"],state["hash"]=None,None
+
+    def _readIfEdited(self)->Optional[bytes]:
+        """Return the content of the file if its content is changed since the last load, otherwise `None`.
+        """
+        mtime=os.stat(self.path).st_mtime_ns
+        if mtime==self.state.get("mtime"):
+            return None
+        self.state["mtime"]=mtime
+        with open(self.path,"rb") as f:
+            source=f.read()
+        digest=hashlib.sha256(source).hexdigest()
+        if digest==self.state.get("hash"):
+            return None
+        self.state["hash"]=digest
+        return source
+
+    @staticmethod
+    def _defineKey(define_args:Dict[str,Any])->Tuple[Tuple[str,Any],...]:
+        # `check_func` of a new load is another function object with the same name
+        return tuple(sorted((k,getattr(v,"__qualname__",v)) for k,v in define_args.items()))
+
+    def reload(self)->Optional[BindingDiffReport]:
+        """Reload config.py if its content is changed. Call this in the main thread of keyhac (e.g. with `keymap.delayedCall`).
+
+        Returns:
+            Optional[BindingDiffReport]: numbers of the applied bindings, or `None` if the bindings are not applied incrementally.
+        """
+        source=self._readIfEdited()
+        if source is None:
+            return None
+
+        t0=time.perf_counter()
+        try:
+            code=compile(source.decode("utf-8-sig"),self.path,"exec")
+            namespace={"__name__":"__keyhac_config__","__file__":self.path}
+            exec(code,namespace)
+            recording=namespace["RecordingKeymap"](
+                self.keymap,
+                dry=True,
+                latency_stats=self.state.get("latency_stats") or namespace["HandlerLatencyStats"](),
+                dispatcher=self.state.get("dispatcher") or namespace["KeyHandlerDispatcher"](),
+            )
+            namespace["configure"](recording)
+        except Exception:
+            print("config reload failed, the previous config is kept:")
+            traceback.print_exc()
+            return None
+
+        old=self.state.get("window_keymaps",[])
+        new=recording.window_keymaps
+        if len(old)!=len(new) or any(self._defineKey(args)!=self._defineKey(wk.define_args) for (args,_,_),wk in zip(old,new)):
+            print("config reload: WindowKeymaps are changed, reloading everything")
+            self.keymap.command_ReloadConfig()
+            return None
+        if recording.setup_calls!=self.state.get("setup_calls",[]):
+            print("config reload: keyhac settings are changed, reloading everything")
+            self.keymap.command_ReloadConfig()
+            return None
+
+        report=BindingDiffReport()
+        window_keymaps=[]
+        try:
+            for (_,_,target),wk in zip(old,new):
+                wk.target=target    # bindings built later by `LazyModePayload` go to the live WindowKeymap
+            recording.apply()
+            for (_,old_table,target),wk in zip(old,new):
+                for name,value in wk.define_args.items():
+                    setattr(target,name,value)
+                report+=applyBindingDiff(target,old_table,wk.table)
+                window_keymaps.append((wk.define_args,wk.table,target))
+        except Exception:
+            print("config reload: applying the bindings failed, reloading everything")
+            traceback.print_exc()
+            self.keymap.command_ReloadConfig()
+            return None
+        self.state["window_keymaps"]=window_keymaps
+        self.state["setup_calls"]=list(recording.setup_calls)
+        self.keymap.updateKeymap()
+
+        print("config reloaded in %.1f ms: %s" % ((time.perf_counter()-t0)*1000,report))
+        return report
+
+
+    @classmethod
+    def watch(cls,keymap,path:str=CONFIG_FILE_PATH)->"ConfigReloader":
+        """Return the watching reloader, starting one if none is watching.
+        The watcher is registered in `WorkerRegistry`, so it survives the loads applied by `reload()`
+        and is stopped only by keyhac's own reload.
+        """
+        reloader=WorkerRegistry.get(cls.STATE_NAME)
+        if reloader is None or not reloader.is_alive():
+            reloader=cls(keymap,path)
+            reloader.startWatching()
+        return reloader
+
+    def startWatching(self):
+        """Poll the modification time of the file and reload on change.
+        """
+        scheduler=self.scheduler or BackgroundScheduler.defaultScheduler()
+        self._task=scheduler.callLater(self.poll_interval,self._poll,BackgroundScheduler.PRIORITY_LOW)
+        WorkerRegistry.register(self.STATE_NAME,self)
+
+    def _poll(self)->Optional[float]:
+        try:
+            mtime=os.stat(self.path).st_mtime_ns
+        except OSError:
+            return self.poll_interval
+        if mtime!=self.state.get("mtime"):
+            self.keymap.delayedCall(self.reload,0)
+        return self.poll_interval
+
+    def shutdown(self):
+        if self._task is not None:
+            self._task.cancel()
+
+    def is_alive(self)->bool:
+        return self._task is not None and not self._task.cancelled
+
+
+class LazyModePayload:
+    """
+    Bindings and workers of a mode which are built on the first activation of the mode
+    and torn down after the mode has been inactive for `idle_timeout` seconds.
+
+    `build(payload)` is called with this object, which is assigned keys like a WindowKeymap.
+    The build is deferred with `keymap.delayedCall(...)`, so the mode change handler in the keyboard hook does not wait for it,
+    and `keymap.updateKeymap()` is called after it.
+    On teardown the keys assigned through it are deleted from `window_keymap`, the workers passed to `own(worker)` are shut down,
+    and the shared `BackgroundScheduler` is stopped if no other task remains.
+    The teardown is timed with `keymap.delayedCall(...)`, so an idle mode needs no background thread.
+    A built payload is registered in `WorkerRegistry`, so a reload of config.py tears it down as well.
+    """
+
+    def __init__(
+        self,
+        keymap,
+        window_keymap,
+        build:Callable[["LazyModePayload"],None],
+        name:str,
+        idle_timeout:float=600.0,
+    ):
+        self.keymap=keymap
+        self.window_keymap=window_keymap
+        self.build=build
+        self.name=name
+        self.idle_timeout=idle_timeout
+        self.keys:Dict[str,None]={}
+        self.workers:List[Any]=[]
+        self.built=False
+        self.active=False
+        self._generation=0  # invalidates the teardowns scheduled before the last activation
+        self._teardowns=0   # invalidates the builds scheduled before the last teardown
+
+    def __setitem__(self,key:str,value):
+        self.keys[key]=None
+        self.window_keymap[key]=value
+
+    def __getitem__(self,key:str):
+        return self.window_keymap[key]
+
+    def own(self,worker):
+        """Shut down `worker` on teardown. Returns `worker`.
+        """
+        self.workers.append(worker)
+        return worker
+
+    def activate(self):
+        """Schedule the build if the payload is not built. Called when the mode is entered.
+        """
+        self.active=True
+        self._generation+=1
+        if not self.built:
+            self.built=True
+            teardowns=self._teardowns
+            self.keymap.delayedCall(lambda : self._build(teardowns),0)
+
+    def _build(self,teardowns:int):
+        if teardowns!=self._teardowns:
+            return  # torn down before the build
+        t0=time.perf_counter()
+        self.build(self)
+        WorkerRegistry.register("LazyModePayload:"+self.name,self)
+        self.keymap.updateKeymap()
+        if DEBUG_TIMING:
+            print("%s: built in %.1f ms" % (self.name,(time.perf_counter()-t0)*1000))
+
+    def deactivate(self):
+        """Schedule the teardown. Called when the mode is left.
+        """
+        self.active=False
+        self._generation+=1
+        generation=self._generation
+        self.keymap.delayedCall(lambda : self._expire(generation),int(self.idle_timeout*1000))
+
+    def _expire(self,generation:int):
+        if generation==self._generation and not self.active:
+            self.teardown()
+
+    def teardown(self):
+        """Shut down the owned workers and delete the assigned keys.
+        """
+        if not self.built:
+            return
+        self.built=False
+        self._teardowns+=1
+        for worker in reversed(self.workers):
+            worker.shutdown()
+        for key in self.keys:
+            try:
+                del self.window_keymap[key]
+            except KeyError:
+                pass    # deleted with another notation of the same key condition
+        self.workers.clear()
+        self.keys.clear()
+        BackgroundScheduler.shutdownIfIdle()
+        print("%s: torn down" % self.name)
+
+    def shutdown(self):
+        self.teardown()
+
+    def is_alive(self)->bool:
+        return self.built
+
+
+class StartupProfiler:
+    """
+    Lap timer of a startup such as `KeymapConfig.configureKeymap(...)`.
+    `lap(name)` closes the section `name`, which began at the previous `lap(...)` or at the construction.
+    `printReport()` prints the report only with `DEBUG_TIMING` or when the total is over `REPORT_THRESHOLD` seconds.
+    """
+
+    REPORT_THRESHOLD=0.2
+
+    def __init__(self,title:str,clock:Callable[[],float]=time.perf_counter):
+        self.title=title
+        self.clock=clock
+        self.laps:List[Tuple[str,float]]=[]
+        self._start=self._last=clock()
+
+    def lap(self,name:str):
+        t=self.clock()
+        self.laps.append((name,t-self._last))
+        self._last=t
+
+    def report(self)->str:
+        """Return the timings of the sections as lines of text.
+        """
+        lines=["%s: %.1f ms" % (self.title,(self._last-self._start)*1000)]
+        lines+=["  %-24s %8.2f ms" % (name,dt*1000) for name,dt in self.laps]
+        return "\n".join(lines)
+
+    def total(self)->float:
+        return self._last-self._start
+
+    def printReport(self):
+        if DEBUG_TIMING or self.total()>self.REPORT_THRESHOLD:
+            print(self.report())
+
+
+class KeymapModeRegistry:
+    """
+    Registry of keymap modes and of the WindowKeymaps active in each mode.
+
+    `define(name, merged=...)` adds a mode and returns its number, and rebuilds `active_table`:
+    `active_table[mode][m]` is `True` when WindowKeymaps of mode `m` are active in `mode`, i.e. `m` is `mode` or in its `merged`.
+    The rows are rebuilt in place when a mode is added, so a holder of `active_table` sees every mode defined.
+    """
+
+    def __init__(self):
+        self.names:List[str]=[]
+        self.merged:List[Tuple[int,...]]=[]
+        self.active_table:Dict[int,Tuple[bool,...]]={}
+
+    def __len__(self)->int:
+        return len(self.names)
+
+    def define(self,name:str,merged:Tuple[int,...]=())->int:
+        """Add the mode `name` whose row also activates the WindowKeymaps of the modes `merged`, and return its number.
+        """
+        mode=len(self.names)
+        self.names.append(name)
+        self.merged.append(tuple(merged))
+        count=len(self.names)
+        for m,merged_modes in enumerate(self.merged):
+            self.active_table[m]=tuple(i==m or i in merged_modes for i in range(count))
+        return mode
+
+
 class KeymapConfig:
     """This class provide the function to set keymap as `configureKeymap(keymap)`. This class is a static class.
     
     Notably, in this class, dynamic keymap is realized by `keymap.defineWindowKeymap(checkfunc = {function to get current mode})`.
     `{function to get current mode}` is provided by KeymapMode class. 
-    Mode changes are fired by "key"s, which call functions `KeymapMode.set_xxx()` and `keymap.updateKeymap()`.
+    Mode changes are fired by "key"s, which call functions `KeymapMode.setMode()` and `keymap.updateKeymap()`.
     """
 
 
@@ -42,33 +3072,87 @@ class KeymapConfig:
         """This class stores the current keymap mode flag. 
         This class does not change status of `keymap` itself. 
         This class is static class. 
+
+        The modes are defined in `_MODES`, a `KeymapModeRegistry`, which precomputes for each mode the row of `_ACTIVE_TABLE`
+        telling the modes whose WindowKeymaps are active in that mode.
+        Changing the mode swaps `"active"` of `_state` to the row of the new mode, and the `check_func`s of WindowKeymaps only index it,
+        so no chain of mode comparisons is evaluated in `keymap.updateKeymap()`.
+        More modes are added with `defineMode(...)`, and `checkFunc(mode)` returns the `check_func` of a mode.
+        `_state` is kept in `WorkerRegistry.persistentState(...)`, so the mode survives reloads of config.py,
+        and the handlers of a previous load left unchanged by `ConfigReloader` switch the same mode as the new ones.
         """
         
-        _LIMITED = 0
-        _CURSOR = 1
-        _CELESTE = 2
-        _TEST = 3
+        _MODES = KeymapModeRegistry()
+        _LIMITED = _MODES.define("limited")
+        _CURSOR = _MODES.define("cursor")
+        _CELESTE = _MODES.define("celeste")
+        _TEST = _MODES.define("test")
 
-        _mode=_LIMITED # keymap mode flag default is _LIMITED
+        # `_ACTIVE_TABLE[mode][m]` is `True` when WindowKeymaps of mode `m` are active in `mode`.
+        # A row can hold several `True`s to merge the WindowKeymaps of several modes.
+        _ACTIVE_TABLE = _MODES.active_table
+
+        # keymap mode flag default is _LIMITED
+        _state=WorkerRegistry.persistentState("KeymapMode")
+        _state.setdefault("mode",_LIMITED)
+        if _state["mode"] not in _ACTIVE_TABLE:
+            _state["mode"]=_LIMITED
+        _state["active"]=_ACTIVE_TABLE[_state["mode"]]
+
+
+        @classmethod
+        def defineMode(cls,name:str,merged:Tuple[int,...]=())->int:
+            """Add a mode and return its number. The WindowKeymaps of the modes `merged` are active in the new mode as well.
+            """
+            mode=cls._MODES.define(name,merged)
+            cls._state["active"]=cls._ACTIVE_TABLE[cls._state["mode"]]
+            return mode
+
+        @classmethod
+        def checkFunc(cls,mode:int)->Callable[[Any],bool]:
+            """Return the `check_func` of `keymap.defineWindowKeymap(...)` which is `True` while WindowKeymaps of `mode` are active.
+            """
+            state=cls._state
+            return lambda dummy_window=None : state["active"][mode]
 
 
         # Methods to set current mode
 
+        @classmethod
+        def setMode(cls,mode:int)->bool:
+            """Set the current mode.
+
+            Args:
+                mode (int): one of `_LIMITED`, `_CURSOR`, `_CELESTE`, `_TEST` and the modes added by `defineMode(...)`.
+
+            Returns:
+                bool: `False` if `mode` is already the current mode, in which case `keymap.updateKeymap()` is not necessary.
+            """
+            if mode == cls._state["mode"]:
+                return False
+            cls._state["active"] = cls._ACTIVE_TABLE[mode]
+            cls._state["mode"] = mode
+            return True
+
+        @classmethod
+        def getMode(cls)->int:
+            return cls._state["mode"]
+
         @classmethod
         def setLimited(cls):
-            cls._mode = cls._LIMITED
+            cls.setMode(cls._LIMITED)
 
         @classmethod
         def setCursor(cls):
-            cls._mode = cls._CURSOR
+            cls.setMode(cls._CURSOR)
 
         @classmethod
         def setCeleste(cls):
-            cls._mode = cls._CELESTE
+            cls.setMode(cls._CELESTE)
 
         @classmethod
         def setTest(cls):
-            cls._mode = cls._TEST
+            cls.setMode(cls._TEST)
         
 
         # The following classmethods are used to get the current mode. 
@@ -76,24 +3160,89 @@ class KeymapConfig:
         
         @classmethod
         def isLimited(cls,dummy_window=None):
-            return cls._mode == cls._LIMITED
+            return cls._state["active"][cls._LIMITED]
         
         @classmethod
         def isCursor(cls,dummy_window=None):
-            return cls._mode == cls._CURSOR
+            return cls._state["active"][cls._CURSOR]
 
         @classmethod
         def isCeleste(cls,dummy_window=None):
-            return cls._mode == cls._CELESTE
+            return cls._state["active"][cls._CELESTE]
 
         @classmethod
         def isTest(cls,dummy_window=None):
-            return cls._mode == cls._TEST
+            return cls._state["active"][cls._TEST]
+
+
+    # State shared by the loads of config.py: `"mode_payloads"` is the `LazyModePayload`s of the live load
+    _state=WorkerRegistry.persistentState("KeymapConfig")
+
+
+    @classmethod
+    def takeOver(cls,mode_payloads:Dict[int,LazyModePayload]):
+        """Replace the live mode payloads with `mode_payloads` of a new load of config.py.
+
+        The payloads of the previous load are torn down, and the payload of the current mode is activated,
+        so a reload does not drop the user out of the current mode.
+        """
+        for payload in cls._state.get("mode_payloads",{}).values():
+            payload.teardown()
+        cls._state["mode_payloads"]=mode_payloads
+        mode=cls.KeymapMode.getMode()
+        if mode in mode_payloads:
+            mode_payloads[mode].activate()
+
+
+    # Modifier prefixes which are combined with the base keys of a binding spec in `expandBindings(...)`
+    MODIFIER_PREFIXES = ("", "S-", "C-", "C-S-", "A-", "A-S-", "A-C-", "A-C-S-", "W-", "W-S-", "W-C-", "W-C-S-", "W-A-", "W-A-S-", "W-A-C-", "W-A-C-S-")
+
+    # Cache of `expandBindings(...)`, keyed by `(spec, modifiers)`
+    _expanded_bindings:Dict[Tuple[Tuple[Tuple[str,str],...],Tuple[str,...]],Tuple[Tuple[str,str],...]] = {}
+
+    @classmethod
+    def expandBindings(
+        cls,
+        spec:Tuple[Tuple[str,str],...],
+        modifiers:Tuple[str,...]=MODIFIER_PREFIXES,
+    )->Tuple[Tuple[str,str],...]:
+        """Expand a declarative binding spec into a flat table of `(key, target)`.
+
+        Every `(base_key, base_target)` of `spec` is expanded to `(modifier+base_key, modifier+base_target)` for each prefix of `modifiers`.
+        The table is built only once for each `(spec, modifiers)`.
+
+        Args:
+            spec (Tuple[Tuple[str,str],...]): pairs of base key and base target such as `("U1-i", "Up")`.
+            modifiers (Tuple[str,...], optional): modifier prefixes. Default is `MODIFIER_PREFIXES`.
+
+        Returns:
+            Tuple[Tuple[str,str],...]: expanded pairs of key and target.
+        """
+        cache_key=(spec,modifiers)
+        table=cls._expanded_bindings.get(cache_key)
+        if table is None:
+            table=tuple((m+key, m+target) for m in modifiers for key, target in spec)
+            cls._expanded_bindings[cache_key]=table
+        return table
+
+    @staticmethod
+    def loadBindings(window_keymap, table:Tuple[Tuple[str,Any],...]):
+        """Assign all `(key, target)` of `table` to `window_keymap` in order."""
+        for key, target in table:
+            window_keymap[key]=target
 
 
     @classmethod
     def configureKeymap(cls,keymap):
 
+        # Time spent in each section of this function is printed at the end if the startup is slow
+        profiler=StartupProfiler("configureKeymap")
+
+        # Stop the background workers left by the previous load of config.py (this function is called again on reload).
+        # A dry load by `ConfigReloader` keeps them, since the bindings it leaves unchanged still use them
+        if not getattr(keymap,"dry",False):
+            WorkerRegistry.shutdownAll()
+
         # Editor
         keymap.editor = "C:\Program Files\Microsoft VS Code\Code.exe"
         
@@ -107,26 +3256,37 @@ class KeymapConfig:
         keymap.defineModifier(29,"User1")       #assign "muhenkan(無変換)" "User1"
         keymap.defineModifier("Slash","User2")  #assign "Slash(/)" "User2"
 
+        profiler.lap("setup")
+
 
         # Functions to change WindowKeymap.
         # In `keymap.updateKeymap()`, `WindowKeymap`s such as `windowKeymapLimited` (which will be defined later in this function) are activated or deactivated
         # through the `check_func` which will be substituted in `keymap.defineWindowKeymap(check_func=...)`.
-        
-        def change_window_keymap_limited():
-            KeymapConfig.KeymapMode.setLimited()
-            keymap.updateKeymap()
+        # The bindings of a mode in `mode_payloads` are built when the mode is entered for the first time.
+        # The handlers look the payloads up in `_state`, where `takeOver()` puts the payloads of the live load.
 
-        def change_window_keymap_cursor():
-            KeymapConfig.KeymapMode.setCursor()
-            keymap.updateKeymap()
-        
-        def change_window_keymap_celeste():
-            KeymapConfig.KeymapMode.setCeleste()
-            keymap.updateKeymap()
+        mode_payloads:Dict[int,LazyModePayload]={}
         
-        def change_window_keymap_test():
-            KeymapConfig.KeymapMode.setTest()
-            keymap.updateKeymap()
+        def change_window_keymap(mode:int)->Callable[[],None]:
+            """Return the function to change the current mode to `mode`.
+            `keymap.updateKeymap()` is called only when the mode is actually changed, so it is kept in the keyboard hook.
+            """
+            @inlineHandler
+            def _change_window_keymap():
+                previous_mode=KeymapConfig.KeymapMode.getMode()
+                if KeymapConfig.KeymapMode.setMode(mode):
+                    live_payloads=KeymapConfig._state.get("mode_payloads",{})
+                    if previous_mode in live_payloads:
+                        live_payloads[previous_mode].deactivate()
+                    if mode in live_payloads:
+                        live_payloads[mode].activate()
+                    keymap.updateKeymap()
+            return _change_window_keymap
+
+        change_window_keymap_limited = change_window_keymap(cls.KeymapMode._LIMITED)
+        change_window_keymap_cursor = change_window_keymap(cls.KeymapMode._CURSOR)
+        change_window_keymap_celeste = change_window_keymap(cls.KeymapMode._CELESTE)
+        change_window_keymap_test = change_window_keymap(cls.KeymapMode._TEST)
 
 
         # Functions for IME-ON/OFF 
@@ -140,46 +3300,57 @@ class KeymapConfig:
 
         # Functions to change WindowKeymap and enable/disable IME coincidently. 
 
+        @inlineHandler
         def change_window_keymap_limited_and_enable_ime():
             change_window_keymap_limited()
             enable_ime()
 
+        @inlineHandler
         def change_window_keymap_limited_and_disable_ime():
             change_window_keymap_limited()
             disable_ime()
 
+        profiler.lap("mode functions")
+
 
         # Functions to move mouse
+        # The cursor position is estimated locally by `cursor_pos` during a motion, so that `pyauto.Input.getCursorPos()` is not called for every move.
+        # All moves are queued to `mouse_input`, which sends the moves queued within a frame as one input sequence.
+
+        cursor_pos=CursorPositionTracker(
+            get_mouse_pos=pyauto.Input.getCursorPos,
+            get_monitor_bounds=lambda : [monitor_info[0] for monitor_info in pyauto.Window.getMonitorInfo()],
+        )
+        mouse_input=BatchedMouseInput()
 
         def mouseMoveRel(dx,dy):
-            x, y = pyauto.Input.getCursorPos()
-            keymap.beginInput()
-            keymap.input_seq.append(pyauto.MouseMove(int(x+dx), int(y+dy)))
-            keymap.endInput()
+            mouse_input.move(*cursor_pos.moveRel(dx, dy))
         
-        def closureMouseRelInterp(dt,num_interp):
-            t=[time.time()]     # クロージャのために要素数1の List とする
-            def mouseRelInterp(dx,dy):
-                current_t=time.time()
-                if current_t <t[0]+dt:
-                    return
-                else:
-                    x, y = pyauto.Input.getCursorPos()
-                    t[0]=time.time()
-                    ddx=dx/num_interp
-                    ddy=dy/num_interp
-                    ddt=dt/num_interp
-                    for _ in range(num_interp):
-                        x+=ddx
-                        y+=ddy
-                        keymap.beginInput()
-                        keymap.input_seq.append(pyauto.MouseMove(int(x), int(y)))
-                        keymap.endInput()
-                        time.sleep(ddt)
-                    t[0]=current_t+dt
-            return mouseRelInterp
+        def mouseMoveAbs(x,y):
+            mouse_input.move(*cursor_pos.setCursorPos(x, y))
+
+        # Continuous mouse motion driven by key down / key up. 
+        # `held_key_mouse_motion` tracks the held motion keys and is installed into several WindowKeymaps.
+
+        mouse_movement_controller=SimpleMouseMovementController(
+            config=SimpleMouseMovementConfig(
+                walk_speed=80,
+                dash_speed=320,
+                sneak_speed=10,
+                keyboard_interval=1.0/60,
+                timeout_period=10.0,
+                profile=LinearRampProfile(ramp_time=0.5,start_factor=0.25,end_factor=1.0),
+            ),
+            get_mouse_pos=cursor_pos.getCursorPos,
+            set_mouse_pos=mouseMoveAbs,
+            drift_mouse_pos=mouseMoveRel,
+            when_applied=getattr(keymap,"whenApplied",None),
+        )
+        held_key_mouse_motion=HeldKeyMouseMotion(mouse_movement_controller)
+
+        profiler.lap("mouse")
+
             
-        
         if 1:   # define `windowKeymapGlobal` 
             
             # set `windowKeymapGlobal` as always-active WindowKeymap
@@ -206,8 +3377,9 @@ class KeymapConfig:
 
 
             # oneshot Slash -> Slash
-            for any in ("", "S-", "C-", "C-S-", "A-", "A-S-", "A-C-", "A-C-S-", "W-", "W-S-", "W-C-", "W-C-S-", "W-A-", "W-A-S-", "W-A-C-", "W-A-C-S-"):
-                windowKeymapGlobal[any+"O-Slash"]=any+"Slash"
+            cls.loadBindings(windowKeymapGlobal, cls.expandBindings((("O-Slash", "Slash"),)))
+
+            profiler.lap("windowKeymapGlobal")
             
         
         if 1:   # define `windowKeymapLimited`
@@ -222,47 +3394,25 @@ class KeymapConfig:
             windowKeymapLimited["RC-h"]="Back"
             windowKeymapLimited["RC-d"]="Delete"
 
-            for any in ("", "S-", "C-", "C-S-", "A-", "A-S-", "A-C-", "A-C-S-", "W-", "W-S-", "W-C-", "W-C-S-", "W-A-", "W-A-S-", "W-A-C-", "W-A-C-S-"):
-                # arrow-like behavior with ijkl and uoh;
-                windowKeymapLimited[any+"U1-i"]=any+"Up"
-                windowKeymapLimited[any+"U1-j"]=any+"Left"
-                windowKeymapLimited[any+"U1-k"]=any+"Down"
-                windowKeymapLimited[any+"U1-l"]=any+"Right"
-                windowKeymapLimited[any+"U1-u"]=any+"PageUp"
-                windowKeymapLimited[any+"U1-h"]=any+"Home"
-                windowKeymapLimited[any+"U1-o"]=any+"PageDown"
-                windowKeymapLimited[any+"U1-Semicolon"]=any+"End"
-                windowKeymapLimited[any+"U1-n"]=any+"Enter"
-                windowKeymapLimited[any+"U1-m"]=any+"Tab"
-
-                # F-N -> FN
-                for i in range(1,12+1):
-                    windowKeymapLimited[any+"U1-"+str(i)]=any+"F"+str(i)
+            # arrow-like behavior with ijkl and uoh; and F-N -> FN
+            cls.loadBindings(windowKeymapLimited, cls.expandBindings((
+                ("U1-i", "Up"),
+                ("U1-j", "Left"),
+                ("U1-k", "Down"),
+                ("U1-l", "Right"),
+                ("U1-u", "PageUp"),
+                ("U1-h", "Home"),
+                ("U1-o", "PageDown"),
+                ("U1-Semicolon", "End"),
+                ("U1-n", "Enter"),
+                ("U1-m", "Tab"),
+            ) + tuple(("U1-"+str(i), "F"+str(i)) for i in range(1,12+1))))
             
-            # override U1-A-(I|J|K|L) to move mouse cursor
+            # override U1-A-(I|J|K|L) to move mouse cursor continuously while the keys are held (U1-C-A- to dash, U1-S-A- to sneak)
             if 1:
-                
-                normal_mouse_speed=80
-                dash_mouse_speed=320
-                sneak_mouse_speed=10
-                num_interp=2
-                dt=1.0/60
-                moveRelInterp=closureMouseRelInterp(dt=dt,num_interp=num_interp)
-
-                windowKeymapLimited["U1-A-I"]=lambda : moveRelInterp(dx=0,dy=-normal_mouse_speed)
-                windowKeymapLimited["U1-A-K"]=lambda : moveRelInterp(dx=0,dy=+normal_mouse_speed)
-                windowKeymapLimited["U1-A-J"]=lambda : moveRelInterp(dx=-normal_mouse_speed,dy=0)
-                windowKeymapLimited["U1-A-L"]=lambda : moveRelInterp(dx=+normal_mouse_speed,dy=0)
-
-                windowKeymapLimited["U1-C-A-I"]=lambda : moveRelInterp(dx=0,dy=-dash_mouse_speed)
-                windowKeymapLimited["U1-C-A-K"]=lambda : moveRelInterp(dx=0,dy=+dash_mouse_speed)
-                windowKeymapLimited["U1-C-A-J"]=lambda : moveRelInterp(dx=-dash_mouse_speed,dy=0)
-                windowKeymapLimited["U1-C-A-L"]=lambda : moveRelInterp(dx=+dash_mouse_speed,dy=0)
-
-                windowKeymapLimited["U1-S-A-I"]=lambda : moveRelInterp(dx=0,dy=-sneak_mouse_speed)
-                windowKeymapLimited["U1-S-A-K"]=lambda : moveRelInterp(dx=0,dy=+sneak_mouse_speed)
-                windowKeymapLimited["U1-S-A-J"]=lambda : moveRelInterp(dx=-sneak_mouse_speed,dy=0)
-                windowKeymapLimited["U1-S-A-L"]=lambda : moveRelInterp(dx=+sneak_mouse_speed,dy=0)
+                held_key_mouse_motion.install(windowKeymapLimited)
+
+            profiler.lap("windowKeymapLimited")
                 
 
         if 1:   # define `windowKeymapCursor`
@@ -285,20 +3435,24 @@ class KeymapConfig:
             windowKeymapCursor["O-f"]="LButton"
             windowKeymapCursor["O-g"]="RButton"
             
-            for any in ("", "S-", "C-", "C-S-", "A-", "A-S-", "A-C-", "A-C-S-", "W-", "W-S-", "W-C-", "W-C-S-", "W-A-", "W-A-S-", "W-A-C-", "W-A-C-S-"):
-                # arrow-like behavior with ijkl and uoh;
-                windowKeymapCursor[any+"i"]=any+"Up"
-                windowKeymapCursor[any+"j"]=any+"Left"
-                windowKeymapCursor[any+"k"]=any+"Down"
-                windowKeymapCursor[any+"l"]=any+"Right"
-                windowKeymapCursor[any+"u"]=any+"PageUp"
-                windowKeymapCursor[any+"h"]=any+"Home"
-                windowKeymapCursor[any+"o"]=any+"PageDown"
-                windowKeymapCursor[any+"Semicolon"]=any+"End"
-                
-                # enter and tab 
-                windowKeymapCursor[any+"n"]=any+"Enter"
-                windowKeymapCursor[any+"m"]=any+"Tab"
+            # arrow-like behavior with ijkl and uoh; and enter and tab
+            cls.loadBindings(windowKeymapCursor, cls.expandBindings((
+                ("i", "Up"),
+                ("j", "Left"),
+                ("k", "Down"),
+                ("l", "Right"),
+                ("u", "PageUp"),
+                ("h", "Home"),
+                ("o", "PageDown"),
+                ("Semicolon", "End"),
+                ("n", "Enter"),
+                ("m", "Tab"),
+            )))
+
+            # move mouse cursor continuously while U1-A-(I|J|K|L) are held (U1-C-A- to dash, U1-S-A- to sneak)
+            held_key_mouse_motion.install(windowKeymapCursor)
+
+            profiler.lap("windowKeymapCursor")
 
 
         if 1:   # define `windowKeymapCeleste`
@@ -309,619 +3463,337 @@ class KeymapConfig:
             # Celeste mode is the mode to play Celeste, where almost all keymaps are in inactive to avoid mistyping
             pass
 
+            profiler.lap("windowKeymapCeleste")
+
 
         if 1:   # define `windowKeymapTest` 実験中のスクリプト
 
             # set `windowKeymapTest` as WindowKeymap which is active when KeymapMode is "test".
             windowKeymapTest = keymap.defineWindowKeymap(check_func=cls.KeymapMode.isTest)
-            
-            
-            # マクロテスト
-            if 0:         
-                
-                """
-                keymap を通して "abcde" と 0.5 sec おきに入力する関数
-                この関数を直接キー入力に割り当てると意図したように動作しない
-
-                現象としては実行中にキー入力が割り込む
-                おそらく本関数のように実行に時間のかかる関数をキーに割り当てた場合、
-                実行の終了以前にキー入力がなされる
-                """
-                def abcde_raw():
-                    keymap.InputKeyCommand("a")()
-                    time.sleep(0.5)
-                    keymap.InputKeyCommand("b")()
-                    time.sleep(0.5)
-                    keymap.InputKeyCommand("c")()
-                    time.sleep(0.5)
-                    keymap.InputKeyCommand("d")()
-                    time.sleep(0.5)
-                    keymap.InputKeyCommand("e")()
-
-
-                """
-                keymap を通して "abcde" と 0.5 sec おきに入力する関数
-                keymap.delayedCall(...) を使って呼ぶ
-                
-                ひとまず意図した動作を行う
-                
-                しかし、
-                Time stamp inversion happened.
-                のメッセージが表示される
-                入力キーの up イベントが関数終了後に行われている
-                
-                """
-                def abcde_delay(self):
-                    keymap.delayedCall(abcde_raw,0)
-
 
-                
-                windowKeymapTest["U1-q"]=abcde_delay  # 意図したとおり動くが time stamp inversion のメッセージが出る
-                # window_keymap["U1-p"]=abcde_raw  # 意図したとおり動かない
-
-            # デフォルト定義されているコマンドの置き換え
-            if 0:
-                # USER0-Up/Down/Left/Right : Move active window by 10 pixel unit
-                windowKeymapTest[ "U1-Left"  ] = keymap.MoveWindowCommand( -10, 0 )
-                windowKeymapTest[ "U1-Right" ] = keymap.MoveWindowCommand( +10, 0 )
-                windowKeymapTest[ "U1-Up"    ] = keymap.MoveWindowCommand( 0, -10 )
-                windowKeymapTest[ "U1-Down"  ] = keymap.MoveWindowCommand( 0, +10 )
-
-                # USER0-Shift-Up/Down/Left/Right : Move active window by 1 pixel unit
-                windowKeymapTest[ "U1-S-Left"  ] = keymap.MoveWindowCommand( -1, 0 )
-                windowKeymapTest[ "U1-S-Right" ] = keymap.MoveWindowCommand( +1, 0 )
-                windowKeymapTest[ "U1-S-Up"    ] = keymap.MoveWindowCommand( 0, -1 )
-                windowKeymapTest[ "U1-S-Down"  ] = keymap.MoveWindowCommand( 0, +1 )
-
-                # USER0-Ctrl-Up/Down/Left/Right : Move active window to screen edges
-                windowKeymapTest[ "U1-C-Left"  ] = keymap.MoveWindowToMonitorEdgeCommand(0)
-                windowKeymapTest[ "U1-C-Right" ] = keymap.MoveWindowToMonitorEdgeCommand(2)
-                windowKeymapTest[ "U1-C-Up"    ] = keymap.MoveWindowToMonitorEdgeCommand(1)
-                windowKeymapTest[ "U1-C-Down"  ] = keymap.MoveWindowToMonitorEdgeCommand(3)
-
-                # Clipboard history related
-                windowKeymapTest[ "C-S-Z"   ] = keymap.command_ClipboardList     # Open the clipboard history list
-                windowKeymapTest[ "C-S-X"   ] = keymap.command_ClipboardRotate   # Move the most recent history to tail
-                windowKeymapTest[ "C-S-A-X" ] = keymap.command_ClipboardRemove   # Remove the most recent history
-                keymap.quote_mark = "> "                                    # Mark for quote pasting
-
-                # Keyboard macro
-                windowKeymapTest[ "U1-0" ] = keymap.command_RecordToggle
-                windowKeymapTest[ "U1-1" ] = keymap.command_RecordStart
-                windowKeymapTest[ "U1-2" ] = keymap.command_RecordStop
-                windowKeymapTest[ "U1-3" ] = keymap.command_RecordPlay
-                windowKeymapTest[ "U1-4" ] = keymap.command_RecordClear
-
-
-            # シンプルなマウスカーソルの移動をやってみる
-            if 0:
-                def mouseMoveRel(dx,dy):
-                    x, y = pyauto.Input.getCursorPos()
-                    keymap.beginInput()
-                    keymap.input_seq.append(pyauto.MouseMove(x+dx, y+dy))
-                    keymap.endInput()
-
-                
-                normal_mouse_speed=20
-                windowKeymapTest["U1-A-I"]=lambda : mouseMoveRel(dx=0,dy=-normal_mouse_speed)
-                windowKeymapTest["U1-A-J"]=lambda : mouseMoveRel(dx=-normal_mouse_speed,dy=0)
-                windowKeymapTest["U1-A-K"]=lambda : mouseMoveRel(dx=0,dy=normal_mouse_speed)
-                windowKeymapTest["U1-A-L"]=lambda : mouseMoveRel(dx=normal_mouse_speed,dy=0)
-
-                dash_mouse_speed=240
-                windowKeymapTest["U1-S-A-I"]=lambda : mouseMoveRel(dx=0,dy=-dash_mouse_speed)
-                windowKeymapTest["U1-S-A-J"]=lambda : mouseMoveRel(dx=-dash_mouse_speed,dy=0)
-                windowKeymapTest["U1-S-A-K"]=lambda : mouseMoveRel(dx=0,dy=dash_mouse_speed)
-                windowKeymapTest["U1-S-A-L"]=lambda : mouseMoveRel(dx=dash_mouse_speed,dy=0)
+            # 実験中のスクリプトのキー割り当てやワーカーは test モードに初めて入ったときに作り、
+            # test モードを抜けて `idle_timeout` 秒たつと破棄する (`LazyModePayload`). 起動時にはスレッドを作らない
+            def build_windowKeymapTest(windowKeymapTest:LazyModePayload):
             
-            # ファイルリロードのテスト. 思ったように動作しない. おそらく一度読み込んだファイルがキャッシュされるので、編集が反映されない
-            if 0:
-                def reloadConfig():
-                    configfilepath=os.path.join(os.path.abspath("."),"config.py")
-                    print("reload config file: "+configfilepath)
-                    ret=ckit.ckit_userconfig.reloadConfigScript(configfilepath)
-                    print("hogehoge")
-
-                windowKeymapTest["U1-A-I"]=reloadConfig
             
-            # マルチスレッドによる非同期処理の実験
-            if 0:
+                # マクロテスト. 下の abcde_raw / abcde_delay は `MacroTimeline` と `MacroPlayer` に置き換えた
+                if 1:
+                    abcde=windowKeymapTest.own(MacroPlayer(MacroTimeline.compile(("a",0.5,"b",0.5,"c",0.5,"d",0.5,"e"))))
+                    windowKeymapTest["U1-q"]=lambda : abcde.play()
+
+                if 0:         
                 
-                class CounterState(Enum):
-                    """カウンターの状態を表す列挙型
                     """
+                    keymap を通して "abcde" と 0.5 sec おきに入力する関数
+                    この関数を直接キー入力に割り当てると意図したように動作しない
 
-                    STOP=0
-                    PAUSE=1
-                    INCREMENT=2
-                    DECREMENT=3
-
-
-                class CounterThread(threading.Thread):
+                    現象としては実行中にキー入力が割り込む
+                    おそらく本関数のように実行に時間のかかる関数をキーに割り当てた場合、
+                    実行の終了以前にキー入力がなされる
                     """
-                    シンプルなカウンターを動作させるスレッド.
-                    基本的に本クラスを直接使わず、シングルトンである `CounterController` を通じて利用する.
-                    スレッドが起動している間は、カウントの仕方を `.updateState(...)` を通じてコントロールできるようにしている
-
-                    - カウンターは `CounterState` の 4状態 [STOP, PAUSE, INCREMENT, DECREMENT] を持つ
-                    - これらの状態は .updateState(...) を通じて切り替わる.
-                    - これらの状態は .updateState(...) のタイミングと実際の動作の切り替わりのタイミングにはカウンター更新分の時間のズレが存在する
-                    - 明示的な切り替えの他に INCREMENT 状態, DECREMENT 状態は一定時間 `updateState()` が呼ばれないと PAUSE 状態に切り替わる
-                    - STOP 状態は特殊な状態であり、STOP状態に切り替わるとカウンター更新のインターバルの後にスレッドが非アクティブになる
-                    """
-                    
-                    DEFAULT_INITIAL_COUNT=0
-                    DEFAULT_TIMEOUT_PERIOD=10
-                    DEFAULT_INTERVAL=1.0
-
-                    def __init__(
-                        self,
-                        initial_count:int=DEFAULT_INITIAL_COUNT,
-                        timeout_period:int=DEFAULT_TIMEOUT_PERIOD,
-                        interval:float=DEFAULT_INTERVAL,
-                    ):
-                        super(self.__class__,self).__init__()
-                        
-                        self.count = initial_count
-                        self.timeout_period = timeout_period
-                        self.interval = interval
-
-                        self.event = threading.Event()
-                        self.state = CounterState.STOP
-                        self.timeout_count=0
-
-                        
-                    def run(self):
-                        print("counter start")
-                        self.state=CounterState.PAUSE
-                        while True:
-                            
-                            if self.timeout_count == self.timeout_period:
-                                self.updateState(CounterState.PAUSE)
-
-                            if self.state==CounterState.STOP:
-                                break
-                            elif self.state == CounterState.PAUSE:
-                                print("pause")
-                                self.event.clear()
-                                self.event.wait()
-                            elif self.state == CounterState.INCREMENT:
-                                self.count+=1
-                                self.timeout_count+=1
-                                time.sleep(self.interval)
-                                print("count: ",self.count)
-                            elif self.state == CounterState.DECREMENT:
-                                self.count-=1
-                                self.timeout_count+=1
-                                time.sleep(self.interval)
-                                print("count: ",self.count)
-                            else:
-                                RuntimeError("unexpected error")
-                        print("counter stop")
+                    def abcde_raw():
+                        keymap.InputKeyCommand("a")()
+                        time.sleep(0.5)
+                        keymap.InputKeyCommand("b")()
+                        time.sleep(0.5)
+                        keymap.InputKeyCommand("c")()
+                        time.sleep(0.5)
+                        keymap.InputKeyCommand("d")()
+                        time.sleep(0.5)
+                        keymap.InputKeyCommand("e")()
 
-                    
-                    def updateState(self,state:CounterState):
-                        self.state=state
-                        self.timeout_count=0
-                        if not self.event.is_set():
-                            self.event.set()
-                    
 
-                class CounterController:
                     """
-                    カウンターのコントローラー. 
-                    `CounterThread` をラップしてシンプルなインターフェースにしている.
-                    シングルトン. 2回以上インスタンス化するとその時点でスレッド及びカウンターの状態が初期化される.
+                    keymap を通して "abcde" と 0.5 sec おきに入力する関数
+                    keymap.delayedCall(...) を使って呼ぶ
+                
+                    ひとまず意図した動作を行う
+                
+                    しかし、
+                    Time stamp inversion happened.
+                    のメッセージが表示される
+                    入力キーの up イベントが関数終了後に行われている
+                
                     """
+                    def abcde_delay(self):
+                        keymap.delayedCall(abcde_raw,0)
 
-                    _instance = None
-                    _lock = threading.Lock()
-
-                    def __new__(cls):
-                        with cls._lock:
-                            if cls._instance is None:
-                                cls._instance = super().__new__(cls)
-
-                        return cls._instance
-
-                    def __init__(self):
-                        self._thread=CounterThread()
-                        self._thread.start()
-                    
-                    def updateState(self,state:CounterState):
-                        self._thread.updateState(state)
-                        if state==CounterState.STOP:
-                            self._thread.join()
-
-                    def is_alive(self)->bool:
-                        return self._thread.is_alive()
 
+                
+                    windowKeymapTest["U1-q"]=abcde_delay  # 意図したとおり動くが time stamp inversion のメッセージが出る
+                    # window_keymap["U1-p"]=abcde_raw  # 意図したとおり動かない
+
+                # デフォルト定義されているコマンドの置き換え
+                if 0:
+                    # USER0-Up/Down/Left/Right : Move active window by 10 pixel unit
+                    windowKeymapTest[ "U1-Left"  ] = keymap.MoveWindowCommand( -10, 0 )
+                    windowKeymapTest[ "U1-Right" ] = keymap.MoveWindowCommand( +10, 0 )
+                    windowKeymapTest[ "U1-Up"    ] = keymap.MoveWindowCommand( 0, -10 )
+                    windowKeymapTest[ "U1-Down"  ] = keymap.MoveWindowCommand( 0, +10 )
+
+                    # USER0-Shift-Up/Down/Left/Right : Move active window by 1 pixel unit
+                    windowKeymapTest[ "U1-S-Left"  ] = keymap.MoveWindowCommand( -1, 0 )
+                    windowKeymapTest[ "U1-S-Right" ] = keymap.MoveWindowCommand( +1, 0 )
+                    windowKeymapTest[ "U1-S-Up"    ] = keymap.MoveWindowCommand( 0, -1 )
+                    windowKeymapTest[ "U1-S-Down"  ] = keymap.MoveWindowCommand( 0, +1 )
+
+                    # USER0-Ctrl-Up/Down/Left/Right : Move active window to screen edges
+                    windowKeymapTest[ "U1-C-Left"  ] = keymap.MoveWindowToMonitorEdgeCommand(0)
+                    windowKeymapTest[ "U1-C-Right" ] = keymap.MoveWindowToMonitorEdgeCommand(2)
+                    windowKeymapTest[ "U1-C-Up"    ] = keymap.MoveWindowToMonitorEdgeCommand(1)
+                    windowKeymapTest[ "U1-C-Down"  ] = keymap.MoveWindowToMonitorEdgeCommand(3)
+
+                    # Clipboard history related
+                    windowKeymapTest[ "C-S-Z"   ] = keymap.command_ClipboardList     # Open the clipboard history list
+                    windowKeymapTest[ "C-S-X"   ] = keymap.command_ClipboardRotate   # Move the most recent history to tail
+                    windowKeymapTest[ "C-S-A-X" ] = keymap.command_ClipboardRemove   # Remove the most recent history
+                    keymap.quote_mark = "> "                                    # Mark for quote pasting
+
+                    # Keyboard macro
+                    windowKeymapTest[ "U1-0" ] = keymap.command_RecordToggle
+                    windowKeymapTest[ "U1-1" ] = keymap.command_RecordStart
+                    windowKeymapTest[ "U1-2" ] = keymap.command_RecordStop
+                    windowKeymapTest[ "U1-3" ] = keymap.command_RecordPlay
+                    windowKeymapTest[ "U1-4" ] = keymap.command_RecordClear
+
+                # キーマクロを記録し、ファイルに保存して再生する. U1-0 から U1-4 で記録と再生, U1-S-2 で保存, U1-S-3 で読み込んで 2 倍速で再生
+                if 1:
+                    windowKeymapTest[ "U1-0" ] = keymap.command_RecordToggle
+                    windowKeymapTest[ "U1-1" ] = keymap.command_RecordStart
+                    windowKeymapTest[ "U1-2" ] = keymap.command_RecordStop
+                    windowKeymapTest[ "U1-3" ] = keymap.command_RecordPlay
+                    windowKeymapTest[ "U1-4" ] = keymap.command_RecordClear
+
+                    macro_path=os.path.join(os.path.dirname(CONFIG_FILE_PATH),"macro.khm")
+                    macro_player=windowKeymapTest.own(MacroPlayer(MacroRecording(),speed=2.0))
+
+                    def saveRecordedMacro():
+                        MacroRecording.fromRecordSeq(getattr(keymap,"record_seq",None) or [],interval_ms=20).save(macro_path)
+
+                    def playSavedMacro():
+                        macro_player.timeline=MacroRecording.load(macro_path)
+                        macro_player.play()
+
+                    windowKeymapTest[ "U1-S-2" ] = saveRecordedMacro
+                    windowKeymapTest[ "U1-S-3" ] = playSavedMacro
+
+
+                # 検索できるクリップボード履歴. クリップボードの変化を索引とディスク上の履歴に加え、U1-S-F でクリップボードの内容を含む履歴を表示する
+                if 1:
+                    clipboard_index=ClipboardHistoryIndex(maxnum=100000)
+                    # ディスク上の履歴. keyhac を再起動しても残る
+                    clipboard_store=windowKeymapTest.own(PersistentClipboardHistory(os.path.join(os.path.dirname(CONFIG_FILE_PATH),"clipboard_history")))
+
+                    # 索引は `BackgroundScheduler` のスレッドだけが触る. ディスク上の履歴への追加も `addLater` でそのスレッドで行い、
+                    # ハッシュ、圧縮、書き込み、コンパクションで keyhac のメインスレッドを止めない
+                    def inBackground(func):
+                        BackgroundScheduler.defaultScheduler().callLater(0.0,lambda : func() and None,BackgroundScheduler.PRIORITY_LOW)
+
+                    def onClipboardChange(text):
+                        inBackground(lambda : clipboard_index.add(text))
+                        clipboard_store.addLater(text)
+
+                    windowKeymapTest.own(ClipboardWatcher(keymap,onClipboardChange)).start()
+
+                    def printClipboardSearch():
+                        query=getClipboardText() or ""
+                        def search():
+                            for text in clipboard_index.search(query,limit=10):
+                                print(repr(text[:80]))
+                        inBackground(search)
+
+                    windowKeymapTest["U1-S-F"]=printClipboardSearch
+
+                # クリップボードの内容を変換して書き戻す. U1-S-Q で引用、U1-S-I でインデント、U1-S-U でインデント解除, U1-S-H で半角、U1-S-Z で全角に変換
+                if 1:
+                    def transformClipboardCommand(transform):
+                        def command():
+                            setClipboardText(transform())
+                        return command
+
+                    windowKeymapTest["U1-S-Q"]=transformClipboardCommand(lambda : ClipboardTransforms.transformClipboardText("Quote",ClipboardTransforms.quoteLine(keymap.quote_mark)))
+                    windowKeymapTest["U1-S-I"]=transformClipboardCommand(lambda : ClipboardTransforms.transformClipboardText("Indent",ClipboardTransforms.indentLine()))
+                    windowKeymapTest["U1-S-U"]=transformClipboardCommand(lambda : ClipboardTransforms.transformClipboardText("Unindent",ClipboardTransforms.unindentLine()))
+                    windowKeymapTest["U1-S-H"]=transformClipboardCommand(lambda : WidthConverter.toHalfWidth(getClipboardText() or ""))
+                    windowKeymapTest["U1-S-Z"]=transformClipboardCommand(lambda : WidthConverter.toFullWidth(getClipboardText() or ""))
+
+                # クリップボードの内容をデスクトップにファイルとして保存し、書き終わったらテキストエディタで開く. U1-S-W で実行
+                if 1:
+                    def saveClipboardToDesktop():
+                        text=getClipboardText()
+                        if not text:
+                            return
+                        # utf-8 / CR-LF で、バックグラウンドで書き込む
+                        path=os.path.join(getDesktopPath(),time.strftime("clip_%Y%m%d_%H%M%S.txt"))
+                        AsyncTextFileWriter(path,text,on_done=keymap.editTextFile,keymap=keymap).start()
+
+                    windowKeymapTest["U1-S-W"]=saveClipboardToDesktop
+
+                # シンプルなマウスカーソルの移動をやってみる
+                if 0:
+                    def mouseMoveRel(dx,dy):
+                        x, y = pyauto.Input.getCursorPos()
+                        keymap.beginInput()
+                        keymap.input_seq.append(pyauto.MouseMove(x+dx, y+dy))
+                        keymap.endInput()
 
-                counter_controller=CounterController()
-                #windowKeymapTest["U1-A-Q"]=lambda : counter_controller.updateState(CounterState.STOP)
-                windowKeymapTest["U1-A-P"]=lambda : counter_controller.updateState(CounterState.PAUSE)
-                windowKeymapTest["U1-A-I"]=lambda : counter_controller.updateState(CounterState.INCREMENT)
-                windowKeymapTest["U1-A-D"]=lambda : counter_controller.updateState(CounterState.DECREMENT)
+                
+                    normal_mouse_speed=20
+                    windowKeymapTest["U1-A-I"]=lambda : mouseMoveRel(dx=0,dy=-normal_mouse_speed)
+                    windowKeymapTest["U1-A-J"]=lambda : mouseMoveRel(dx=-normal_mouse_speed,dy=0)
+                    windowKeymapTest["U1-A-K"]=lambda : mouseMoveRel(dx=0,dy=normal_mouse_speed)
+                    windowKeymapTest["U1-A-L"]=lambda : mouseMoveRel(dx=normal_mouse_speed,dy=0)
+
+                    dash_mouse_speed=240
+                    windowKeymapTest["U1-S-A-I"]=lambda : mouseMoveRel(dx=0,dy=-dash_mouse_speed)
+                    windowKeymapTest["U1-S-A-J"]=lambda : mouseMoveRel(dx=-dash_mouse_speed,dy=0)
+                    windowKeymapTest["U1-S-A-K"]=lambda : mouseMoveRel(dx=0,dy=dash_mouse_speed)
+                    windowKeymapTest["U1-S-A-L"]=lambda : mouseMoveRel(dx=dash_mouse_speed,dy=0)
             
-
-            # 非同期処理でマウスを動かす実験 速度が遅い 原因不明
-            if 1:
-                class MouseMovementState(Enum):
-                    """
-                    マウスの動きの状態を表す列挙型. 
-                    """
-
-                    QUIT=0
-
-                    NORMAL=1
-                    
-                    WALK_R=11
-                    WALK_L=12
-                    WALK_U=13
-                    WALK_D=14
-                    WALK_RU=21
-                    WALK_RD=22
-                    WALK_LU=23
-                    WALK_LD=24
-
-                    DASH_R=31
-                    DASH_L=32
-                    DASH_U=33
-                    DASH_D=34
-                    DASH_RU=41
-                    DASH_RD=42
-                    DASH_LU=43
-                    DASH_LD=44
-
-                    SNEAK_R=51
-                    SNEAK_L=52
-                    SNEAK_U=53
-                    SNEAK_D=54
-                    SNEAK_RU=61
-                    SNEAK_RD=62
-                    SNEAK_LU=63
-                    SNEAK_LD=64
-
-
-                class SimpleMouseMovementConfig(object):
-                    """
-                    `SimpleMouseMovementThread` におけるマウスの動きのコンフィグ
-                    """
-                    
-                    DEFAULT_WALK_SPEED=80
-                    DEFAULT_DASH_SPEED=320
-                    DEFAULT_SNEAK_SPEED=10
-                    DEFAULT_KEYBOAD_INTERVAL=1.0/60
-                    DEFAULT_TIMEOUT_PERIOD=5*60
-
-                    
-                    def __init__(
-                        self,
-                        walk_speed:int=DEFAULT_WALK_SPEED,
-                        dash_speed:int=DEFAULT_DASH_SPEED,
-                        sneak_speed:int=DEFAULT_SNEAK_SPEED,
-                        keyboard_interval:float=DEFAULT_KEYBOAD_INTERVAL,
-                        timeout_period:int=DEFAULT_TIMEOUT_PERIOD,
-                    ):
-                        self.walk_speed=walk_speed
-                        self.dash_speed=dash_speed
-                        self.sneak_speed=sneak_speed
-                        self.keyboard_interval=keyboard_interval
-                        self.timeout_period=timeout_period
-                    
-                    def to_dict(self)->Dict[str,Any]:
-                        return {
-                            "walk_speed": self.walk_speed,
-                            "dash_speed": self.dash_speed,
-                            "sneak_speed": self.sneak_speed,
-                            "keyboard_interval": self.keyboard_interval,
-                            "timeout_period": self.timeout_period,
-                        }
-
-                    def from_dict(cls,obj:Dict[str,Any])->"SimpleMouseMovementConfig":
-                        return SimpleMouseMovementConfig(
-                            walk_speed=obj["walk_speed"],
-                            dash_speed=obj["dash_speed"],
-                            sneak_speed=obj["sneak_speed"],
-                            keyboard_interval=obj["keyboard_interval"],
-                            timeout_period=obj["timeout_period"],
-                        )
-
-
-                class SimpleMouseMovementThread(threading.Thread):
-                    """
-                    マウスカーソルを動かすスレッド
-                    """
-
-
-                    @classmethod
-                    def generate_auto_drift_mouse_pos(
-                        cls,
-                        get_mouse_pos:Callable[[],Tuple[int,int]],
-                        set_mouse_pos:Callable[[Tuple[int,int]],None],
-                    )->Callable[[Tuple[int,int]],None]:
+                # ファイルリロードのテスト. config.py を保存すると、変更のあったキー割り当てだけが反映される
+                # U1-R ですぐに反映する. 監視はこのペイロードが持たないので、ペイロードの破棄やリロードの後も続く
+                if 1:
+                    config_reloader=ConfigReloader.watch(keymap)
+                    windowKeymapTest["U1-R"]=lambda : keymap.delayedCall(config_reloader.reload,0)
+
+                # キー割り当てされた関数の処理時間. U1-D で表示、U1-S-D で config.py と同じフォルダの latency.json に書き出す
+                if 1:
+                    latency_stats=getattr(keymap,"latency_stats",None)
+                    if latency_stats is not None:
+                        windowKeymapTest["U1-D"]=lambda : print(latency_stats.dump())
+                        windowKeymapTest["U1-S-D"]=lambda : latency_stats.exportJson(os.path.join(os.path.dirname(CONFIG_FILE_PATH),"latency.json"))
+            
+                # 非同期処理の実験. カウンターは共有の `BackgroundScheduler` 上で動く
+                if 0:
+                
+                    class CounterState(Enum):
+                        """カウンターの状態を表す列挙型
                         """
-                        マウス動作で利用する関数 `drift_mouse_pos` を `get_mouse_pos` と `set_mouse_pos` から生成する関数. 
-                        コンストラクタで使われる
 
-                        Args:
-                            get_mouse_pos (Callable[[],Tuple[int,int]]): マウスカーソル位置を取得する関数
-                            set_mouse_pos (Callable[[Tuple[int,int]],None]): マウスカーソル位置を設定する関数
+                        STOP=0
+                        PAUSE=1
+                        INCREMENT=2
+                        DECREMENT=3
 
-                        Returns:
-                            Callable[[Tuple[int,int]],None]: マウスカーソル位置を相対値で移動する関数
-                        """
 
-                        def drift_mouse_pos(dx:int,dy:int):
-                            x,y=get_mouse_pos()
-                            x2,y2=x+dx,y+dy
-                            set_mouse_pos(x2,y2)
-                        return drift_mouse_pos
-
-
-                    def __init__(
-                        self,
-                        config:SimpleMouseMovementConfig,
-                        get_mouse_pos:Callable[[],Tuple[int,int]],
-                        set_mouse_pos:Callable[[Tuple[int,int]],None],
-                        drift_mouse_pos:Optional[Callable[[int,int],None]]=None,
-                        verbose:bool=False,
-                    ):
-                        """コンストラクタ
-
-                        Args:
-                            config (SimpleMouseMovementConfig): マウスの動作に関する設定.
-                            get_mouse_pos (Callable[[],Tuple[int,int]]): マウス位置を取得する関数.
-                            set_mouse_pos (Callable[[Tuple[int,int]],None]): マウス位置を設定する関数
-                            drift_mouse_pos (Optional[Callable[[int,int],None]], optional): マウス位置を相対位置で移動する関数. デフォルトは `None` であり、この場合は `get_mouse_pos` と `set_mouse_pos` をもとに適当に設定される.
-                            verbose (bool, optional): `True` のときマウス位置とマウスの動作状態を出力する. デフォルトは `False`.
+                    class CounterWorker:
+                        """
+                        シンプルなカウンターを動作させるワーカー.
+                        専用のスレッドは持たず、共有の `BackgroundScheduler` のタスクとして `tick()` が呼ばれる.
+                        基本的に本クラスを直接使わず、シングルトンである `CounterController` を通じて利用する.
+                        カウントの仕方を `.updateState(...)` を通じてコントロールできるようにしている
+
+                        - カウンターは `CounterState` の 4状態 [STOP, PAUSE, INCREMENT, DECREMENT] を持つ
+                        - これらの状態は .updateState(...) を通じて切り替わる.
+                        - これらの状態は .updateState(...) のタイミングと実際の動作の切り替わりのタイミングにはカウンター更新分の時間のズレが存在する
+                        - 明示的な切り替えの他に INCREMENT 状態, DECREMENT 状態は一定時間 `updateState()` が呼ばれないと PAUSE 状態に切り替わる
+                        - PAUSE 状態, STOP 状態ではタスクをスケジューラに登録しない
                         """
-                        super(self.__class__,self).__init__()
-
-                        self.config=config
-                        self.get_mouse_pos=get_mouse_pos
-                        self.set_mouse_pos=set_mouse_pos
-                        self.drift_mouse_pos=(
-                            drift_mouse_pos if drift_mouse_pos is not None
-                            else self.generate_auto_drift_mouse_pos(get_mouse_pos,set_mouse_pos)
-                        )
-
-                        
-                        self.verbose=verbose
-                                
-                        self.event = threading.Event()
-                        self.state = MouseMovementState.NORMAL
-                        self.timeout_count=0
-
-
-                    def log_position_if_verbose(self):
-                        if self.verbose:
-                            print("mouse pos: ",self.get_mouse_pos())        
                     
-                    def log_state_if_verbose(self):
-                        if self.verbose:
-                            print("MouseMovementState: ",self.state)
-
-
+                        DEFAULT_INITIAL_COUNT=0
+                        DEFAULT_TIMEOUT_PERIOD=10
+                        DEFAULT_INTERVAL=1.0
+
+                        def __init__(
+                            self,
+                            initial_count:int=DEFAULT_INITIAL_COUNT,
+                            timeout_period:int=DEFAULT_TIMEOUT_PERIOD,
+                            interval:float=DEFAULT_INTERVAL,
+                        ):
+                            self.count = initial_count
+                            self.timeout_period = timeout_period
+                            self.interval = interval
+
+                            self._lock = threading.Lock()
+                            self._scheduled = False
+                            self.state = CounterState.PAUSE
+                            self.timeout_count=0
+                            print("counter start")
 
-                    def getDrift(self)->Tuple[int,int]:
-                        """現在のマウスの動作の状態に応じたマウスの相対移動ベクトルを返す
-                        Returns:
-                            Tuple[int,int]: `(dx,dy)`
-                        """
-                                
-                        s=self.config.walk_speed
-                        if self.state == MouseMovementState.WALK_R:
-                            return +s,0
-                        elif self.state == MouseMovementState.WALK_L:
-                            return -s,0
-                        elif self.state == MouseMovementState.WALK_U:
-                            return 0,+s
-                        elif self.state == MouseMovementState.WALK_D:
-                            return 0,-s
-                        elif self.state == MouseMovementState.WALK_RU:
-                            return +s,+s
-                        elif self.state == MouseMovementState.WALK_RD:
-                            return +s,-s
-                        elif self.state == MouseMovementState.WALK_LU:
-                            return -s,+s
-                        elif self.state == MouseMovementState.WALK_LD:
-                            return -s,-s
-                        
-                        s=self.config.dash_speed
-                        if self.state == MouseMovementState.DASH_R:
-                            return +s,0
-                        elif self.state == MouseMovementState.DASH_L:
-                            return -s,0
-                        elif self.state == MouseMovementState.DASH_U:
-                            return 0,+s
-                        elif self.state == MouseMovementState.DASH_D:
-                            return 0,-s
-                        elif self.state == MouseMovementState.DASH_RU:
-                            return +s,+s
-                        elif self.state == MouseMovementState.DASH_RD:
-                            return +s,-s
-                        elif self.state == MouseMovementState.DASH_LU:
-                            return -s,+s
-                        elif self.state == MouseMovementState.DASH_LD:
-                            return -s,-s
-
-                        s=self.config.sneak_speed
-                        if self.state == MouseMovementState.SNEAK_R:
-                            return +s,0
-                        elif self.state == MouseMovementState.SNEAK_L:
-                            return -s,0
-                        elif self.state == MouseMovementState.SNEAK_U:
-                            return 0,+s
-                        elif self.state == MouseMovementState.SNEAK_D:
-                            return 0,-s
-                        elif self.state == MouseMovementState.SNEAK_RU:
-                            return +s,+s
-                        elif self.state == MouseMovementState.SNEAK_RD:
-                            return +s,-s
-                        elif self.state == MouseMovementState.SNEAK_LU:
-                            return -s,+s
-                        elif self.state == MouseMovementState.SNEAK_LD:
-                            return -s,-s
                         
-                        else:
-                            raise RuntimeError("unexpected state")
-
-
-
-                    def run(self):
-                        self.updateState(MouseMovementState.NORMAL)
-
-                        while True:
-
-                            # 一定時間経過で自動的に通常状態に変化する
-                            if self.timeout_count == self.config.timeout_period:
-                                self.updateState(MouseMovementState.NORMAL)
-
-                            if self.state==MouseMovementState.QUIT:
-                                break
-                            elif self.state == MouseMovementState.NORMAL:
-                                self.event.clear()
-                                self.event.wait()
-                            elif self.state in [
-                                MouseMovementState.WALK_R,
-                                MouseMovementState.WALK_R,
-                                MouseMovementState.WALK_L,
-                                MouseMovementState.WALK_U,
-                                MouseMovementState.WALK_D,
-                                MouseMovementState.WALK_RU,
-                                MouseMovementState.WALK_RD,
-                                MouseMovementState.WALK_LU,
-                                MouseMovementState.WALK_LD,
-
-                                MouseMovementState.DASH_R,
-                                MouseMovementState.DASH_L,
-                                MouseMovementState.DASH_U,
-                                MouseMovementState.DASH_D,
-                                MouseMovementState.DASH_RU,
-                                MouseMovementState.DASH_RD,
-                                MouseMovementState.DASH_LU,
-                                MouseMovementState.DASH_LD,
-
-                                MouseMovementState.SNEAK_R,
-                                MouseMovementState.SNEAK_L,
-                                MouseMovementState.SNEAK_U,
-                                MouseMovementState.SNEAK_D,
-                                MouseMovementState.SNEAK_RU,
-                                MouseMovementState.SNEAK_RD,
-                                MouseMovementState.SNEAK_LU,
-                                MouseMovementState.SNEAK_LD,
-                            ]:
+                        def tick(self)->Optional[float]:
+                            with self._lock:
+                                if self.timeout_count == self.timeout_period:
+                                    self.state=CounterState.PAUSE
+
+                                if self.state == CounterState.INCREMENT:
+                                    self.count+=1
+                                elif self.state == CounterState.DECREMENT:
+                                    self.count-=1
+                                else:
+                                    self._scheduled=False
+                                    print("counter stop" if self.state == CounterState.STOP else "pause")
+                                    return None
                                 self.timeout_count+=1
-                                dx,dy=self.getDrift()
-                                self.drift_mouse_pos(dx,dy)
-                                self.log_position_if_verbose()
-                                time.sleep(self.config.keyboard_interval)
-                            else:
-                                RuntimeError("unexpected error")
-                        
+                            print("count: ",self.count)
+                            return self.interval
 
                     
-                    def updateState(self,state:MouseMovementState):
-                        self.timeout_count=0
-                        if self.state != state:
-                            self.state=state    
-                            if not self.event.is_set():
-                                self.event.set()
-                            self.log_state_if_verbose()
+                        def updateState(self,state:CounterState):
+                            with self._lock:
+                                self.state=state
+                                self.timeout_count=0
+                                if self._scheduled or state in (CounterState.STOP, CounterState.PAUSE):
+                                    return
+                                self._scheduled=True
+                            BackgroundScheduler.defaultScheduler().callLater(self.interval,self.tick)
+
+                        def is_alive(self)->bool:
+                            return self.state != CounterState.STOP
+                    
 
+                    class CounterController:
+                        """
+                        カウンターのコントローラー. 
+                        `CounterWorker` をラップしてシンプルなインターフェースにしている.
+                        シングルトン. 2回以上インスタンス化するとその時点でカウンターの状態が初期化される.
+                        """
 
-                class SimpleMouseMovementController:
-                    """
-                    マウスカーソルの移動のコントローラー. 
-                    `CounterThread` をラップしてシンプルなインターフェースにしている.
-                    シングルトン. 2回以上インスタンス化するとその時点でスレッド及びマウスの動作状態が初期化される.
-                    """
+                        _instance = None
+                        _lock = threading.Lock()
 
-                    _instance = None
-                    _lock = threading.Lock()
-
-                    def __new__(
-                        cls,
-                        config:SimpleMouseMovementConfig,
-                        get_mouse_pos:Callable[[],Tuple[int,int]],
-                        set_mouse_pos:Callable[[Tuple[int,int]],None],
-                        drift_mouse_pos:Optional[Callable[[int,int],None]]=None,
-                        verbose:bool=False,
-                    ):
-                        with cls._lock:
-                            if cls._instance is None:
-                                cls._instance = super().__new__(cls)
-
-                        return cls._instance
-
-                    def __init__(
-                        self,
-                        config:SimpleMouseMovementConfig,
-                        get_mouse_pos:Callable[[],Tuple[int,int]],
-                        set_mouse_pos:Callable[[Tuple[int,int]],None],
-                        drift_mouse_pos:Optional[Callable[[int,int],None]]=None,
-                        verbose:bool=False,
-                    ):
-                        self._thread=SimpleMouseMovementThread(
-                            config=config,
-                            get_mouse_pos=get_mouse_pos,
-                            set_mouse_pos=set_mouse_pos,
-                            drift_mouse_pos=drift_mouse_pos,
-                            verbose=verbose
-                        )
-                        self._thread.start()
-                    
-                    def updateState(self,state:MouseMovementState):
-                        self._thread.updateState(state)
-                        if state==MouseMovementState.QUIT:
-                            self._thread.join()
+                        def __new__(cls):
+                            with cls._lock:
+                                if cls._instance is None:
+                                    cls._instance = super().__new__(cls)
 
-                    def is_alive(self)->bool:
-                        return self._thread.is_alive()
+                            return cls._instance
 
+                        def __init__(self):
+                            self._worker=CounterWorker()
                     
+                        def updateState(self,state:CounterState):
+                            self._worker.updateState(state)
 
-                mouse_movement_controller=SimpleMouseMovementController(
-                    config=SimpleMouseMovementConfig(
-                        walk_speed=80,
-                        dash_speed=320,
-                        sneak_speed=10,
-                        keyboard_interval=1.0/60,
-                        timeout_period=10*60,
-                    ),
-                    get_mouse_pos=pyauto.Input.getCursorPos,
-                    set_mouse_pos=lambda x,y: (
-                        keymap.beginInput(),
-                        keymap.input_seq.append(pyauto.MouseMove(int(x), int(y))),
-                        keymap.endInput(),
-                        None
-                    )[-1],
-                    verbose=True,
-                )
+                        def is_alive(self)->bool:
+                            return self._worker.is_alive()
 
-                windowKeymapTest["D-U1-A-L"]=lambda : mouse_movement_controller.updateState(MouseMovementState.WALK_R)
-                #windowKeymapTest["U-U1-A-L"]=lambda : mouse_movement_controller.updateState(MouseMovementState.NORMAL)
-                windowKeymapTest["D-U1-A-J"]=lambda : mouse_movement_controller.updateState(MouseMovementState.WALK_L)
-                windowKeymapTest["U-U1-A-J"]=lambda : mouse_movement_controller.updateState(MouseMovementState.NORMAL)
-                windowKeymapTest["D-U1-A-I"]=lambda : mouse_movement_controller.updateState(MouseMovementState.WALK_D)
-                windowKeymapTest["U-U1-A-I"]=lambda : mouse_movement_controller.updateState(MouseMovementState.NORMAL)
-                windowKeymapTest["D-U1-A-K"]=lambda : mouse_movement_controller.updateState(MouseMovementState.WALK_U)
-                windowKeymapTest["U-U1-A-K"]=lambda : mouse_movement_controller.updateState(MouseMovementState.NORMAL)
-                
-                windowKeymapTest["U1-A-N"]=lambda : mouse_movement_controller.updateState(MouseMovementState.NORMAL)
 
+                    counter_controller=CounterController()
+                    #windowKeymapTest["U1-A-Q"]=lambda : counter_controller.updateState(CounterState.STOP)
+                    windowKeymapTest["U1-A-P"]=lambda : counter_controller.updateState(CounterState.PAUSE)
+                    windowKeymapTest["U1-A-I"]=lambda : counter_controller.updateState(CounterState.INCREMENT)
+                    windowKeymapTest["U1-A-D"]=lambda : counter_controller.updateState(CounterState.DECREMENT)
+            
 
-                
-                                
-                                
+                # 非同期処理でマウスを動かす実験. クラスはモジュールレベルに移し、`held_key_mouse_motion` はすべてのモードで共有している
+                if 1:
+                    held_key_mouse_motion.install(windowKeymapTest)
 
-                            
+                    windowKeymapTest["U1-A-N"]=lambda : held_key_mouse_motion.clear()
 
+            mode_payloads[cls.KeymapMode._TEST]=LazyModePayload(keymap,windowKeymapTest,build_windowKeymapTest,name="windowKeymapTest",idle_timeout=600.0)
 
+            profiler.lap("windowKeymapTest")
 
-                    
+        # Make the payloads of this load live and rebuild the payload of the current mode, which survives reloads.
+        # A dry load by `ConfigReloader` does it when its bindings are applied
+        if getattr(keymap,"dry",False):
+            keymap.whenApplied(lambda : cls.takeOver(mode_payloads))
+        else:
+            cls.takeOver(mode_payloads)
 
+        profiler.printReport()
 
 
 def configure(keymap):
@@ -931,7 +3803,13 @@ def configure(keymap):
     # My definition
     if 1:   # limited mode and cursor mode (vim-like), move with IJKL
         #KeymapConfig.setKeymap(keymap)
-        KeymapConfig.configureKeymap(keymap)
+        # Record the binding tables for `ConfigReloader`, time the handlers and defer the slow ones, unless this is a reload by `ConfigReloader` which records them itself
+        if getattr(keymap,"recording",False):
+            KeymapConfig.configureKeymap(keymap)
+        else:
+            recording=RecordingKeymap(keymap,latency_stats=HandlerLatencyStats(),dispatcher=KeyHandlerDispatcher())
+            KeymapConfig.configureKeymap(recording)
+            ConfigReloader.remember(recording)
 
 
     # Original definitions (skipped)
@@ -1057,12 +3935,12 @@ def configure(keymap):
         # Ctrl-Tab : Switching between console related windows
         if 0:
 
+            window_cache = WindowAttributeCache.defaultCache()
+
             def isConsoleWindow(wnd):
-                if wnd.getClassName() in ("PuTTY","MinTTY","CkwWindowClass"):
-                    return True
-                return False
+                return window_cache.getClassName(wnd) in ("PuTTY","MinTTY","CkwWindowClass")
 
-            keymap_console = keymap.defineWindowKeymap( check_func=isConsoleWindow )
+            keymap_console = keymap.defineWindowKeymap( check_func=window_cache.predicate( class_name=("PuTTY","MinTTY","CkwWindowClass") ) )
 
             def command_SwitchConsole():
 
@@ -1155,7 +4033,7 @@ def configure(keymap):
 
         # For Edit box, assigning Delete to C-D, etc
         if 0:
-            keymap_edit = keymap.defineWindowKeymap( class_name="Edit" )
+            keymap_edit = keymap.defineWindowKeymap( check_func=WindowAttributeCache.defaultCache().predicate( class_name="Edit" ) )
 
             keymap_edit[ "C-D" ] = "Delete"              # Delete
             keymap_edit[ "C-H" ] = "Back"                # Backspace
@@ -1166,7 +4044,7 @@ def configure(keymap):
         # Because the keymap condition of keymap_edit overlaps with keymap_notepad,
         # both these two keymaps are applied in mixed manner.
         if 0:
-            keymap_notepad = keymap.defineWindowKeymap( exe_name="notepad.exe", class_name="Edit" )
+            keymap_notepad = keymap.defineWindowKeymap( check_func=WindowAttributeCache.defaultCache().predicate( exe_name="notepad.exe", class_name="Edit" ) )
 
             # Define Ctrl-X as the first key of multi-stroke keys
             keymap_notepad[ "C-X" ] = keymap.defineMultiStrokeKeymap("C-X")
@@ -1232,54 +4110,27 @@ def configure(keymap):
 
             # Add quote mark to current clipboard contents
             def quoteClipboardText():
-                s = getClipboardText()
-                lines = s.splitlines(True)
-                s = ""
-                for line in lines:
-                    s += keymap.quote_mark + line
-                return s
+                return ClipboardTransforms.transformClipboardText("Quote", ClipboardTransforms.quoteLine(keymap.quote_mark))
 
             # Indent current clipboard contents
             def indentClipboardText():
-                s = getClipboardText()
-                lines = s.splitlines(True)
-                s = ""
-                for line in lines:
-                    if line.lstrip():
-                        line = " " * 4 + line
-                    s += line
-                return s
+                return ClipboardTransforms.transformClipboardText("Indent", ClipboardTransforms.indentLine())
 
             # Unindent current clipboard contents
             def unindentClipboardText():
-                s = getClipboardText()
-                lines = s.splitlines(True)
-                s = ""
-                for line in lines:
-                    for i in range(4+1):
-                        if i>=len(line) : break
-                        if line[i]=='\t':
-                            i+=1
-                            break
-                        if line[i]!=' ':
-                            break
-                    s += line[i:]
-                return s
+                return ClipboardTransforms.transformClipboardText("Unindent", ClipboardTransforms.unindentLine())
 
-            full_width_chars = "ａｂｃｄｅｆｇｈｉｊｋｌｍｎｏｐｑｒｓｔｕｖｗｘｙｚＡＢＣＤＥＦＧＨＩＪＫＬＭＮＯＰＱＲＳＴＵＶＷＸＹＺ！”＃＄％＆’（）＊＋，−．／：；＜＝＞？＠［￥］＾＿‘｛｜｝～０１２３４５６７８９　"
-            half_width_chars = "abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ!\"#$%&'()*+,-./:;<=>?@[\]^_`{|}～0123456789 "
+            # Indent and quote current clipboard contents in one pass
+            def indentAndQuoteClipboardText():
+                return ClipboardTransforms.transformClipboardText("Indent and quote", ClipboardTransforms.indentLine(), ClipboardTransforms.quoteLine(keymap.quote_mark))
 
             # Convert to half-with characters
             def toHalfWidthClipboardText():
-                s = getClipboardText()
-                s = s.translate(str.maketrans(full_width_chars,half_width_chars))
-                return s
+                return WidthConverter.toHalfWidth(getClipboardText())
 
             # Convert to full-with characters
             def toFullWidthClipboardText():
-                s = getClipboardText()
-                s = s.translate(str.maketrans(half_width_chars,full_width_chars))
-                return s
+                return WidthConverter.toFullWidth(getClipboardText())
 
             # Save the clipboard contents as a file in Desktop directory
             def command_SaveClipboardToDesktop():
@@ -1287,28 +4138,16 @@ def configure(keymap):
                 text = getClipboardText()
                 if not text: return
 
-                # Convert to utf-8 / CR-LF
-                utf8_bom = b"\xEF\xBB\xBF"
-                text = text.replace("\r\n","\n")
-                text = text.replace("\r","\n")
-                text = text.replace("\n","\r\n")
-                text = text.encode( encoding="utf-8" )
-
-                # Save in Desktop directory
+                # Save in Desktop directory as utf-8 / CR-LF in background, and open by the text editor when it is written
                 fullpath = os.path.join( getDesktopPath(), datetime.datetime.now().strftime("clip_%Y%m%d_%H%M%S.txt") )
-                fd = open( fullpath, "wb" )
-                fd.write(utf8_bom)
-                fd.write(text)
-                fd.close()
-
-                # Open by the text editor
-                keymap.editTextFile(fullpath)
+                AsyncTextFileWriter( fullpath, text, on_done=keymap.editTextFile, keymap=keymap ).start()
 
             # Menu item list
             other_items = [
                 ( "Quote clipboard",            quoteClipboardText ),
                 ( "Indent clipboard",           indentClipboardText ),
                 ( "Unindent clipboard",         unindentClipboardText ),
+                ( "Indent and quote clipboard", indentAndQuoteClipboardText ),
                 ( "",                           None ),
                 ( "To Half-Width",              toHalfWidthClipboardText ),
                 ( "To Full-Width",              toFullWidthClipboardText ),
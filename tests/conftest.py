@@ -0,0 +1,256 @@
+"""
+Fixtures of the tests of config.py.
+
+config.py runs inside keyhac, so the tests import it with the stub `pyauto` / `keyhac` / `ckit` modules in `tests/stubs`
+and drive it with `FakeKeymap`. Every test loads a fresh copy of config.py from a temporary directory,
+so files written next to `CONFIG_FILE_PATH` (clipboard history, macros) stay out of the repository.
+"""
+
+import heapq
+import importlib.util
+import itertools
+import os
+import shutil
+import sys
+
+import pytest
+
+TESTS_DIR=os.path.dirname(os.path.abspath(__file__))
+CONFIG_PATH=os.path.join(os.path.dirname(TESTS_DIR),"config.py")
+
+sys.path.insert(0,os.path.join(TESTS_DIR,"stubs"))
+
+import pyauto
+import keyhac
+
+
+def pytest_configure(config):
+    # the Windows paths of config.py such as "C:\Program Files\..." are written as is, as keyhac reads them
+    config.addinivalue_line("filterwarnings","ignore:invalid escape sequence:DeprecationWarning")
+
+
+class FakeClock:
+    """Monotonic clock which moves only by `advance(dt)` or by assigning `t`.
+    """
+
+    def __init__(self,t:float=100.0):
+        self.t=t
+
+    def __call__(self)->float:
+        return self.t
+
+    def advance(self,dt:float):
+        self.t+=dt
+
+
+class FakeTask:
+
+    def __init__(self,func,priority):
+        self.func=func
+        self.priority=priority
+        self.cancelled=False
+
+    def cancel(self):
+        self.cancelled=True
+
+
+class ManualScheduler:
+    """
+    Stand-in for `BackgroundScheduler` on a `FakeClock`. Nothing runs until `runUntil(t)`,
+    which calls the due tasks in order and moves the clock to each due time (plus `lateness()` if given).
+    """
+
+    def __init__(self,clock:FakeClock,lateness=None):
+        self.clock=clock
+        self.lateness=lateness
+        self.calls=0
+        self._heap=[]
+        self._seq=itertools.count()
+
+    def callLater(self,delay,func,priority=10):
+        task=FakeTask(func,priority)
+        heapq.heappush(self._heap,(self.clock()+delay,priority,next(self._seq),task))
+        return task
+
+    def pendingCount(self)->int:
+        return sum(1 for entry in self._heap if not entry[3].cancelled)
+
+    def runUntil(self,t:float):
+        while self._heap and self._heap[0][0]<=t:
+            due,_,_,task=heapq.heappop(self._heap)
+            if task.cancelled:
+                continue
+            self.clock.t=max(self.clock.t,due+(self.lateness() if self.lateness else 0.0))
+            self.calls+=1
+            delay=task.func()
+            if delay is not None and not task.cancelled:
+                heapq.heappush(self._heap,(self.clock()+delay,task.priority,next(self._seq),task))
+        self.clock.t=max(self.clock.t,t)
+
+    def runFor(self,dt:float):
+        self.runUntil(self.clock()+dt)
+
+
+class FakeWindowKeymap:
+    """WindowKeymap which counts the assignments and deletions.
+    """
+
+    def __init__(self,**define_args):
+        self.__dict__.update(define_args)
+        self.define_args=define_args
+        self.bindings={}
+        self.writes=0
+        self.deletes=0
+
+    def __setitem__(self,key,value):
+        self.bindings[key]=value
+        self.writes+=1
+
+    def __getitem__(self,key):
+        return self.bindings[key]
+
+    def __delitem__(self,key):
+        del self.bindings[key]
+        self.deletes+=1
+
+    def __contains__(self,key):
+        return key in self.bindings
+
+
+class FakeWindow:
+
+    def __init__(self):
+        self.ime_status=None
+
+    def setImeStatus(self,status):
+        self.ime_status=status
+
+
+class FakeKeymap:
+    """
+    keymap of keyhac with the methods config.py uses.
+    `keymap.delayedCall(func, ms)` only queues the call; `runDelayed(ms)` advances a fake time and runs the calls due.
+    """
+
+    def __init__(self):
+        self.window_keymaps=[]
+        self.delayed=[]
+        self.now_ms=0
+        self._seq=itertools.count()
+        self.setup_calls=[]
+        self.updates=0
+        self.reloads=0
+        self.wnd=FakeWindow()
+        self.record_seq=[]
+        self.quote_mark="> "
+        self.edited=[]
+
+    def defineWindowKeymap(self,**define_args):
+        window_keymap=FakeWindowKeymap(**define_args)
+        self.window_keymaps.append(window_keymap)
+        return window_keymap
+
+    def setFont(self,*args):
+        self.setup_calls.append(("setFont",args))
+
+    def setTheme(self,*args):
+        self.setup_calls.append(("setTheme",args))
+
+    def defineModifier(self,*args):
+        self.setup_calls.append(("defineModifier",args))
+
+    def updateKeymap(self):
+        self.updates+=1
+
+    def delayedCall(self,func,ms):
+        heapq.heappush(self.delayed,(self.now_ms+ms,next(self._seq),func))
+
+    def runDelayed(self,ms:int=0)->int:
+        """Advance the time of the delayed calls by `ms` and run the calls due, including the calls they queue. Returns the number of calls.
+        """
+        end=self.now_ms+ms
+        count=0
+        while self.delayed and self.delayed[0][0]<=end:
+            self.now_ms,_,func=heapq.heappop(self.delayed)
+            func()
+            count+=1
+        self.now_ms=end
+        return count
+
+    def command_ReloadConfig(self):
+        self.reloads+=1
+
+    def editTextFile(self,path):
+        self.edited.append(path)
+
+    def command_RecordToggle(self): pass
+    def command_RecordStart(self): pass
+    def command_RecordStop(self): pass
+    def command_RecordPlay(self): pass
+    def command_RecordClear(self): pass
+
+
+def editConfig(path:str,old:str,new:str):
+    """Replace the first `old` of the config file with `new`, and move its modification time forward.
+    """
+    with open(path,encoding="utf-8-sig") as f:
+        source=f.read()
+    assert old in source
+    with open(path,"w",encoding="utf-8-sig") as f:
+        f.write(source.replace(old,new,1))
+    st=os.stat(path)
+    os.utime(path,ns=(st.st_atime_ns,st.st_mtime_ns+10**9))
+
+
+def loadConfig(path:str,name:str="config"):
+    spec=importlib.util.spec_from_file_location(name,path)
+    module=importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+@pytest.fixture
+def config_path(tmp_path):
+    """Path of a copy of config.py in a temporary directory.
+    """
+    path=str(tmp_path/"config.py")
+    shutil.copy(CONFIG_PATH,path)
+    return path
+
+
+@pytest.fixture
+def config(config_path):
+    """config.py loaded as a fresh module, with a fresh `WorkerRegistry`. Registered workers are shut down afterwards.
+    """
+    sys.modules.pop("_keyhac_config_workers",None)
+    pyauto.Input.reset()
+    keyhac.setClipboardText("")
+    module=loadConfig(config_path)
+    yield module
+    module.WorkerRegistry.shutdownAll()
+    sys.modules.pop("_keyhac_config_workers",None)
+
+
+@pytest.fixture
+def keymap():
+    return FakeKeymap()
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+@pytest.fixture
+def scheduler(clock):
+    return ManualScheduler(clock)
+
+
+def findWindowKeymap(keymap:FakeKeymap,check_func_name:str)->FakeWindowKeymap:
+    """Return the WindowKeymap of `keymap` defined with the `check_func` named `check_func_name`, or the global one for `None`.
+    """
+    for window_keymap in keymap.window_keymaps:
+        check_func=window_keymap.define_args.get("check_func")
+        if getattr(check_func,"__name__",None)==check_func_name:
+            return window_keymap
+    raise KeyError(check_func_name)
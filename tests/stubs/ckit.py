@@ -0,0 +1,3 @@
+"""
+Stub of `ckit`. config.py only imports it.
+"""
@@ -0,0 +1,51 @@
+"""
+Stub of the names which config.py imports from `keyhac`.
+"""
+
+__all__=["KeyCondition","JobQueue","JobItem","getClipboardText","setClipboardText","getDesktopPath","shellExecute"]
+
+
+class KeyCondition:
+
+    @staticmethod
+    def strToVk(name):
+        if len(name)==1:
+            return ord(name.upper())
+        return sum(map(ord,name))%256
+
+
+class JobItem:
+
+    def __init__(self,func,finished):
+        self.func=func
+        self.finished=finished
+
+
+class JobQueue:
+    """Runs the jobs on `enqueue(...)` in the calling thread.
+    """
+
+    def enqueue(self,job_item):
+        job_item.func(job_item)
+        job_item.finished(job_item)
+
+    def cancel(self):
+        pass
+
+    def join(self):
+        pass
+
+
+_clipboard=[""]
+
+def getClipboardText():
+    return _clipboard[0]
+
+def setClipboardText(text):
+    _clipboard[0]=text
+
+def getDesktopPath():
+    return "."
+
+def shellExecute(*args):
+    pass
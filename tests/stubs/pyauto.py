@@ -0,0 +1,58 @@
+"""
+Stub of keyhac's `pyauto` for the tests. Input events are recorded instead of being sent.
+"""
+
+
+class _InputEvent:
+
+    def __init__(self,*args):
+        self.args=args
+
+    def __eq__(self,other):
+        return type(self) is type(other) and self.args==other.args
+
+    def __hash__(self):
+        return hash((type(self).__name__,self.args))
+
+    def __repr__(self):
+        return "%s%r" % (type(self).__name__,self.args)
+
+
+class MouseMove(_InputEvent): pass
+class Key(_InputEvent): pass
+class KeyDown(_InputEvent): pass
+class KeyUp(_InputEvent): pass
+class Char(_InputEvent): pass
+
+
+class Input:
+    """`send(seq)` appends `seq` to `sent`. `getCursorPos()` returns `cursor_pos` and counts the calls.
+    """
+
+    sent=[]
+    cursor_pos=(100,100)
+    cursor_calls=0
+
+    @classmethod
+    def reset(cls):
+        cls.sent=[]
+        cls.cursor_pos=(100,100)
+        cls.cursor_calls=0
+
+    @classmethod
+    def send(cls,seq):
+        cls.sent.append(list(seq))
+
+    @classmethod
+    def getCursorPos(cls):
+        cls.cursor_calls+=1
+        return cls.cursor_pos
+
+
+class Window:
+
+    monitors=[((0,0,1920,1080),(0,0,1920,1040),1)]
+
+    @classmethod
+    def getMonitorInfo(cls):
+        return cls.monitors
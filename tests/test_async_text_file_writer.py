@@ -0,0 +1,96 @@
+import os
+import threading
+import time
+
+import keyhac
+from conftest import findWindowKeymap
+
+
+def test_start_returns_before_the_file_is_written(config,clock,scheduler,keymap,tmp_path):
+    path=str(tmp_path/"clip.txt")
+    done=[]
+    writer=config.AsyncTextFileWriter(path,"a\nb",on_done=done.append,keymap=keymap,scheduler=scheduler)
+    assert writer.start() is writer
+    assert not (tmp_path/"clip.txt").exists() and not writer.done.is_set()
+
+    scheduler.runFor(0.0)
+    assert writer.done.is_set()
+    assert (tmp_path/"clip.txt").read_bytes()==b"\xEF\xBB\xBFa\r\nb"
+    # on_done runs in the main thread of keyhac
+    assert done==[]
+    keymap.runDelayed()
+    assert done==[path]
+
+
+def test_chunks_keep_crlf_together(config,clock,scheduler,tmp_path):
+    path=str(tmp_path/"clip.txt")
+    text="0123456789"*3+"\r\n"+"x\ry\nz\r\n"*20
+    writer=config.AsyncTextFileWriter(path,text,bom=False,chunk_chars=31,scheduler=scheduler).start()
+    scheduler.runFor(0.0)
+    assert (tmp_path/"clip.txt").read_bytes()==("0123456789"*3+"\r\n"+"x\r\ny\r\nz\r\n"*20).encode("utf-8")
+    # the first chunk takes the LF of its last CR, and each task call writes one chunk
+    assert writer._pos==len(text)
+    assert scheduler.calls==1+(len(text)-32+30)//31
+
+
+def test_other_tasks_run_between_chunks(config,clock,scheduler,tmp_path):
+    scheduler.lateness=lambda : 0.001     # each chunk takes 1 ms
+    path=str(tmp_path/"clip.txt")
+    writer=config.AsyncTextFileWriter(path,"line\n"*100,chunk_chars=50,scheduler=scheduler).start()
+    written=[]
+
+    def other():
+        written.append(writer._pos)
+        return None if writer.done.is_set() else 0.002
+    scheduler.callLater(0.0,other,config.BackgroundScheduler.PRIORITY_HIGH)
+    scheduler.runFor(1.0)
+    assert writer.done.is_set()
+    assert written==sorted(written) and len(set(written))>=4
+    assert 0<written[1]<500
+
+
+def test_failure_sets_done_without_on_done(config,clock,scheduler,tmp_path,capsys):
+    done=[]
+    writer=config.AsyncTextFileWriter(str(tmp_path/"missing"/"clip.txt"),"a",on_done=done.append,scheduler=scheduler).start()
+    scheduler.runFor(0.0)
+    assert writer.done.is_set() and done==[]
+    assert "FileNotFoundError" in capsys.readouterr().err
+
+
+def test_large_text_is_written_on_the_scheduler_thread(config,tmp_path):
+    path=str(tmp_path/"clip.txt")
+    text="some text of the clipboard\n"*(50*1024*1024//27)
+    threads=[]
+    notified=threading.Event()
+
+    def on_done(path):
+        threads.append(threading.current_thread())
+        notified.set()
+
+    t0=time.perf_counter()
+    config.AsyncTextFileWriter(path,text,on_done=on_done).start()
+    started=time.perf_counter()-t0
+    assert notified.wait(30.0)
+    written=time.perf_counter()-t0
+    assert threads[0] is not threading.current_thread()
+    assert (tmp_path/"clip.txt").stat().st_size==3+len(text)+text.count("\n")
+    # the handler only pays for scheduling a task, not for the 50 MB
+    assert started<written/10, (started,written)
+
+
+def test_test_mode_saves_the_clipboard_to_the_desktop(config,keymap,tmp_path,monkeypatch):
+    monkeypatch.setattr(config,"getDesktopPath",lambda : str(tmp_path))
+    config.configure(keymap)
+    findWindowKeymap(keymap,None)["U1-t"]()
+    keymap.runDelayed()
+
+    keyhac.setClipboardText("a\nb")
+    findWindowKeymap(keymap,"isTest")["U1-S-W"]()
+    deadline=time.monotonic()+5.0
+    while not keymap.edited and time.monotonic()<deadline:
+        keymap.runDelayed(10)
+        time.sleep(0.01)
+    [path]=keymap.edited
+    assert os.path.dirname(path)==str(tmp_path) and os.path.basename(path).startswith("clip_")
+    with open(path,"rb") as f:
+        assert f.read()==b"\xEF\xBB\xBFa\r\nb"
@@ -0,0 +1,73 @@
+import threading
+import time
+
+
+def waitFor(predicate,timeout=2.0):
+    deadline=time.monotonic()+timeout
+    while time.monotonic()<deadline and not predicate():
+        time.sleep(0.005)
+    return predicate()
+
+
+def test_one_thread_runs_any_number_of_tasks(config):
+    base=threading.active_count()
+    for num_tasks in (1,10,100):
+        counts=[0]*num_tasks
+
+        def task(i):
+            counts[i]+=1
+            return 0.001 if counts[i]<5 else None
+
+        scheduler=config.BackgroundScheduler.defaultScheduler()
+        for i in range(num_tasks):
+            scheduler.callLater(0.0,lambda i=i : task(i))
+        assert threading.active_count()==base+1
+        assert waitFor(lambda : all(count==5 for count in counts)), num_tasks
+        assert config.BackgroundScheduler.defaultScheduler() is scheduler
+
+
+def test_tasks_due_at_the_same_time_run_by_priority(config):
+    scheduler=config.BackgroundScheduler(clock=lambda : 0.0)
+    order=[]
+    for name,priority in (("low",scheduler.PRIORITY_LOW),("high",scheduler.PRIORITY_HIGH),("normal",scheduler.PRIORITY_NORMAL)):
+        scheduler.callLater(0.0,lambda name=name : order.append(name),priority)
+    scheduler.start()
+    assert waitFor(lambda : len(order)==3)
+    scheduler.shutdown()
+    assert order==["high","normal","low"]
+
+
+def test_cancelled_task_is_not_called(config):
+    scheduler=config.BackgroundScheduler.defaultScheduler()
+    calls=[]
+    task=scheduler.callLater(0.05,lambda : calls.append(1))
+    task.cancel()
+    done=threading.Event()
+    scheduler.callLater(0.1,done.set)
+    assert done.wait(2.0)
+    assert calls==[]
+
+
+def test_idle_scheduler_stops_and_restarts(config):
+    scheduler=config.BackgroundScheduler.defaultScheduler()
+    scheduler.callLater(10.0,lambda : None)
+    assert not config.BackgroundScheduler.shutdownIfIdle()
+    scheduler._heap[0][3].cancel()
+    assert config.BackgroundScheduler.shutdownIfIdle()
+    assert waitFor(lambda : not scheduler.is_alive())
+
+    restarted=config.BackgroundScheduler.defaultScheduler()
+    assert restarted is not scheduler and restarted.is_alive()
+
+
+def test_mouse_workers_share_the_scheduler_thread(config):
+    base=threading.active_count()
+    workers=[
+        config.SimpleMouseMovementWorker(config.SimpleMouseMovementConfig(),lambda : (0,0),None,drift_mouse_pos=lambda dx,dy : None)
+        for _ in range(20)
+    ]
+    for worker in workers:
+        worker.updateState(config.MouseMovementState.WALK_R)
+    assert threading.active_count()==base+1
+    for worker in workers:
+        worker.shutdown()
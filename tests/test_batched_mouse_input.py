@@ -0,0 +1,37 @@
+import pyauto
+
+
+def test_moves_within_a_frame_are_sent_once(config,scheduler):
+    mouse_input=config.BatchedMouseInput(frame=1.0/60,scheduler=scheduler)
+    for x in range(10):
+        mouse_input.move(100+x,200)
+    assert scheduler.pendingCount()==1
+    assert pyauto.Input.sent==[]
+
+    scheduler.runFor(0.0)
+    assert len(pyauto.Input.sent)==1
+    assert pyauto.Input.sent[0]==[pyauto.MouseMove(100+x,200) for x in range(10)]
+    assert mouse_input.flush_count==1
+
+
+def test_flushes_are_at_most_one_per_frame(config,scheduler,clock):
+    frame=1.0/60
+    mouse_input=config.BatchedMouseInput(frame=frame,scheduler=scheduler)
+    mouse_input.move(1,1)
+    scheduler.runFor(0.0)
+
+    mouse_input.move(2,2)
+    due=scheduler._heap[0][0]-clock()
+    assert frame*0.5<due<=frame
+
+
+def test_late_flush_sends_only_the_latest_position(config,scheduler):
+    mouse_input=config.BatchedMouseInput(scheduler=scheduler)
+    for x in range(5):
+        mouse_input.move(x,0)
+    mouse_input.flush(late=True)
+    assert pyauto.Input.sent==[[pyauto.MouseMove(4,0)]]
+
+    mouse_input.flush()
+    assert len(pyauto.Input.sent)==1    # nothing queued, nothing sent
+
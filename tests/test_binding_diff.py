@@ -0,0 +1,63 @@
+import time
+
+from conftest import FakeWindowKeymap
+
+
+def makeTable(config,n,edited=()):
+    pairs=[("U1-(%d)" % i,"F%d" % (i%24+1)) for i in range(n)]
+    for i in edited:
+        pairs[i]=(pairs[i][0],"Enter")
+    return config.bindingTable(tuple(pairs))
+
+
+def test_diff_applies_only_the_differences(config):
+    old=config.bindingTable((("U1-i","Up"),("U1-j","Left"),("U1-k","Down")))
+    new=config.bindingTable((("D-U1-I","Up"),("U1-j","Home"),("U1-l","Right")))
+    window_keymap=FakeWindowKeymap()
+    config.KeymapConfig.loadBindings(window_keymap,tuple(old.values()))
+    window_keymap.writes=0
+
+    report=config.applyBindingDiff(window_keymap,old,new)
+    assert (report.added,report.removed,report.changed,report.unchanged)==(1,1,1,1)
+    assert report.applied==3
+    assert str(report)=="1 added, 1 removed, 1 changed, 1 unchanged"
+    assert window_keymap.writes==2 and window_keymap.deletes==1
+    assert window_keymap.bindings=={"U1-i":"Up","U1-j":"Home","U1-l":"Right"}
+
+
+def test_diff_cost_follows_the_edits(config):
+    elapsed={}
+    for n in (1000,10000):
+        old=makeTable(config,n)
+        new=makeTable(config,n,edited=range(0,n,100))
+        window_keymap=FakeWindowKeymap()
+
+        t0=time.perf_counter()
+        report=config.applyBindingDiff(window_keymap,old,new)
+        elapsed[n]=time.perf_counter()-t0
+
+        assert report.changed==n//100 and report.unchanged==n-n//100
+        assert window_keymap.writes==n//100
+    # ten times the bindings with ten times the edits: linear, with room for noise
+    assert elapsed[10000]<30*elapsed[1000], elapsed
+
+
+def test_functions_are_compared_by_code(config):
+    def make(speed):
+        return lambda : speed
+
+    old=config.bindingTable((("U1-a",make(1)),("U1-b",make(1))))
+    new=config.bindingTable((("U1-a",make(1)),("U1-b",make(2))))
+    added,removed,changed=config.diffBindingTables(old,new)
+    assert (added,removed,changed)==([],[],["U1-B"])
+
+
+def test_recorded_keymap_apply_table(config):
+    target=FakeWindowKeymap()
+    recorded=config.RecordedWindowKeymap({},target)
+    recorded["U1-i"]="Up"
+    recorded["U1-j"]="Left"
+
+    report=recorded.applyTable(config.bindingTable((("U1-i","Up"),)))
+    assert report.removed==1 and report.unchanged==1
+    assert target.bindings=={"U1-i":"Up"}
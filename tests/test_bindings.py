@@ -0,0 +1,85 @@
+import time
+
+from conftest import FakeWindowKeymap, findWindowKeymap
+
+
+def test_expand_bindings_covers_every_prefix_in_order(config):
+    KeymapConfig=config.KeymapConfig
+    spec=(("U1-i","Up"),("U1-j","Left"))
+    table=KeymapConfig.expandBindings(spec)
+
+    assert len(table)==len(KeymapConfig.MODIFIER_PREFIXES)*len(spec)
+    assert table[:4]==(("U1-i","Up"),("U1-j","Left"),("S-U1-i","S-Up"),("S-U1-j","S-Left"))
+    assert table[-1]==("W-A-C-S-U1-j","W-A-C-S-Left")
+    assert KeymapConfig.expandBindings(spec) is table
+
+
+def test_load_bindings_keeps_the_later_overrides(config,keymap):
+    config.KeymapConfig.configureKeymap(keymap)
+    limited=findWindowKeymap(keymap,"isLimited")
+
+    assert limited["U1-i"]=="Up"
+    assert limited["C-S-U1-12"]=="C-S-F12"
+    # the down of U1-A-I, the same key as A-U1-i expanded from ("U1-i","Up"), is assigned after the expanded table by the held-key mouse motion
+    keys=list(limited.bindings)
+    assert keys.index("D-U1-A-I")>keys.index("A-U1-i") and callable(limited["D-U1-A-I"])
+
+
+LIMITED_SPEC=(
+    ("U1-i","Up"),("U1-j","Left"),("U1-k","Down"),("U1-l","Right"),("U1-u","PageUp"),
+    ("U1-h","Home"),("U1-o","PageDown"),("U1-Semicolon","End"),("U1-n","Enter"),("U1-m","Tab"),
+)+tuple(("U1-"+str(i),"F"+str(i)) for i in range(1,12+1))
+
+
+def loadWithLoops(window_keymap):
+    # the loops of windowKeymapLimited before the binding specs
+    for any in ("", "S-", "C-", "C-S-", "A-", "A-S-", "A-C-", "A-C-S-", "W-", "W-S-", "W-C-", "W-C-S-", "W-A-", "W-A-S-", "W-A-C-", "W-A-C-S-"):
+        window_keymap[any+"U1-i"]=any+"Up"
+        window_keymap[any+"U1-j"]=any+"Left"
+        window_keymap[any+"U1-k"]=any+"Down"
+        window_keymap[any+"U1-l"]=any+"Right"
+        window_keymap[any+"U1-u"]=any+"PageUp"
+        window_keymap[any+"U1-h"]=any+"Home"
+        window_keymap[any+"U1-o"]=any+"PageDown"
+        window_keymap[any+"U1-Semicolon"]=any+"End"
+        window_keymap[any+"U1-n"]=any+"Enter"
+        window_keymap[any+"U1-m"]=any+"Tab"
+        for i in range(1,12+1):
+            window_keymap[any+"U1-"+str(i)]=any+"F"+str(i)
+
+
+def bestTime(func,repeat=200):
+    best=None
+    for _ in range(repeat):
+        t0=time.perf_counter()
+        func()
+        elapsed=time.perf_counter()-t0
+        best=elapsed if best is None else min(best,elapsed)
+    return best
+
+
+def test_loader_against_the_old_loops(config):
+    KeymapConfig=config.KeymapConfig
+    old=FakeWindowKeymap()
+    loadWithLoops(old)
+    new=FakeWindowKeymap()
+    KeymapConfig.loadBindings(new,KeymapConfig.expandBindings(LIMITED_SPEC))
+    assert new.bindings==old.bindings
+
+    loops=bestTime(lambda : loadWithLoops(FakeWindowKeymap()))
+    loader=bestTime(lambda : KeymapConfig.loadBindings(FakeWindowKeymap(),KeymapConfig.expandBindings(LIMITED_SPEC)))
+    # the loader only assigns the cached table, so a reload does not build the strings again
+    assert loader<1.5*loops, (loops,loader)
+
+
+def test_expanded_table_is_cached(config):
+    KeymapConfig=config.KeymapConfig
+
+    def expand():
+        KeymapConfig._expanded_bindings.clear()
+        KeymapConfig.expandBindings(LIMITED_SPEC)
+
+    building=bestTime(expand)
+    cached=bestTime(lambda : KeymapConfig.expandBindings(LIMITED_SPEC))
+    assert KeymapConfig.expandBindings(LIMITED_SPEC) is KeymapConfig.expandBindings(LIMITED_SPEC)
+    assert cached<building/5, (building,cached)
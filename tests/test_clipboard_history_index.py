@@ -0,0 +1,109 @@
+import random
+import time
+
+import keyhac
+from conftest import findWindowKeymap
+
+
+WORDS=["alpha","beta","gamma","delta","Keyhac","config","clip","board","日本語","テキスト","abc","xyz"]
+
+
+def randomTexts(count,seed=0):
+    rnd=random.Random(seed)
+    return [" ".join(rnd.choice(WORDS) for _ in range(rnd.randrange(1,8))) for _ in range(count)]
+
+
+def bruteForce(texts,query,limit):
+    newest=list(dict.fromkeys(reversed(texts)))
+    return [text for text in newest if query.lower() in text.lower()][:limit]
+
+
+def test_search_agrees_with_brute_force(config):
+    texts=randomTexts(3000)
+    index=config.ClipboardHistoryIndex(maxnum=10000)
+    for text in texts:
+        index.add(text)
+
+    rnd=random.Random(1)
+    queries=["a","ab","ALPHA","pha bet","日本","本語 テ","config clip","zzz","eta gam","board keyhac"]
+    queries+=[text[i:i+rnd.randrange(1,12)] for text in rnd.sample(texts,50) for i in [rnd.randrange(len(text))]]
+    for query in queries:
+        for limit in (1,10,50,10000):
+            assert index.search(query,limit)==bruteForce(texts,query,limit), (query,limit)
+    assert index.recent(5)==bruteForce(texts,"",5)
+
+
+def test_duplicates_move_to_the_newest(config):
+    index=config.ClipboardHistoryIndex()
+    for text in ("one","two","one"):
+        index.add(text)
+    assert index.recent()==["one","two"]
+    assert index.size==6
+    assert not index.add("")
+
+
+def test_eviction_by_count_and_quota(config):
+    index=config.ClipboardHistoryIndex(maxnum=3,quota=10)
+    for text in ("aaaa","bbbb","cc"):
+        index.add(text)
+    index.add("ddd")
+    assert index.recent()==["ddd","cc","bbbb"] and index.size==9
+    assert index.search("aaa")==[]
+    index.add("e")
+    assert index.recent()==["e","ddd","cc"]
+    assert not index.add("x"*11)
+
+    # evicted entries leave no trigrams behind
+    assert set(index._index)=={"ddd"}
+
+
+def test_quota_counts_utf8_bytes(config):
+    index=config.ClipboardHistoryIndex(quota=12)
+    index.add("日本語")     # 9 bytes
+    assert index.size==9
+    index.add("abcd")
+    assert index.recent()==["abcd"] and index.size==4
+    assert not index.add("日本語テキ")     # 5 characters, 15 bytes
+
+
+def timed(func):
+    t0=time.perf_counter()
+    result=func()
+    return time.perf_counter()-t0,result
+
+
+def test_insert_and_query_scale(config):
+    insert={}
+    for count in (1000,10000,100000):
+        texts=["%s #%d" % (text,i) for i,text in enumerate(randomTexts(count))]
+        index=config.ClipboardHistoryIndex(maxnum=100000)
+        insert[count]=timed(lambda : [index.add(text) for text in texts])[0]/count
+
+    # an insert updates the postings of its own trigrams only
+    assert insert[100000]<5*insert[1000], insert
+    for query in ("gamma delta","#99999","日本語 テキスト","keyhac config","no such text"):
+        indexed,result=timed(lambda : index.search(query,limit=50))
+        scan,expected=timed(lambda : bruteForce(texts,query,50))
+        assert result==expected
+        assert indexed<scan, (query,scan,indexed)
+
+
+def test_test_mode_indexes_the_clipboard_in_the_background(config,keymap,scheduler,capsys,monkeypatch):
+    monkeypatch.setattr(config.BackgroundScheduler,"defaultScheduler",classmethod(lambda cls : scheduler))
+    config.configure(keymap)
+    findWindowKeymap(keymap,None)["U1-t"]()
+    keymap.runDelayed()
+    pending=scheduler.pendingCount()
+    for text in ("first text","second text","third"):
+        keyhac.setClipboardText(text)
+        keymap.runDelayed(1000)
+    # the main thread of keyhac only queued the adds to the index and to the store
+    assert scheduler.pendingCount()==pending+6
+    scheduler.runFor(0.0)
+
+    keyhac.setClipboardText("text")
+    capsys.readouterr()
+    findWindowKeymap(keymap,"isTest")["U1-S-F"]()
+    assert capsys.readouterr().out==""
+    scheduler.runFor(0.0)
+    assert capsys.readouterr().out.splitlines()==["'second text'","'first text'"]
@@ -0,0 +1,85 @@
+import time
+
+import keyhac
+from conftest import findWindowKeymap
+
+
+TEXT="def f():\r\n\treturn 1\r\n\r\n  x = 2\n      y\rlast"
+
+
+def test_line_transforms(config):
+    T=config.ClipboardTransforms
+    assert T.apply("a\n\nb",T.quoteLine("> "))=="> a\n> \n> b"
+    assert T.apply("a\n \nb\r\n",T.indentLine())=="    a\n \n    b\r\n"
+    assert T.apply("      a\n \tb\n\tc\nd",T.unindentLine())=="  a\nb\nc\nd"
+    # the transforms run in order in one pass
+    assert T.apply("a\n\n",T.indentLine(2),T.quoteLine("> "))=="> " "  a\n> \n"
+
+
+def test_chunks_give_the_same_result(config):
+    T=config.ClipboardTransforms
+    line_funcs=(T.unindentLine(),T.indentLine(2),T.quoteLine("> "))
+    expected=T.apply(TEXT,*line_funcs)
+    for i in range(len(TEXT)+1):
+        for j in range(i,len(TEXT)+1):
+            chunks=(TEXT[:i],TEXT[i:j],TEXT[j:])
+            assert "".join(T.iterApply(chunks,*line_funcs))==expected, chunks
+
+
+def quoteWithConcatenation(text,mark):
+    # quoteClipboardText before the transforms
+    lines=text.splitlines(True)
+    s=""
+    for line in lines:
+        s+=mark+line
+    return s
+
+
+def bestTime(func,repeat=3):
+    best=None
+    for _ in range(repeat):
+        t0=time.perf_counter()
+        func()
+        elapsed=time.perf_counter()-t0
+        best=elapsed if best is None else min(best,elapsed)
+    return best
+
+
+def test_cost_is_linear_and_not_above_the_old_function(config):
+    T=config.ClipboardTransforms
+    elapsed={}
+    for mb in (1,10):
+        text="    some line of text\r\n"*(mb*1024*1024//23)
+        assert T.apply(text,T.quoteLine("> "))==quoteWithConcatenation(text,"> ")
+        elapsed[mb]=bestTime(lambda : T.apply(text,T.quoteLine("> ")))
+        old=bestTime(lambda : quoteWithConcatenation(text,"> "))
+        assert elapsed[mb]<2*old, (mb,old,elapsed[mb])
+    assert elapsed[10]<30*elapsed[1], elapsed
+
+
+def test_clipboard_command(config,capsys,monkeypatch):
+    T=config.ClipboardTransforms
+    keyhac.setClipboardText("a\r\nb")
+    assert T.transformClipboardText("Quote",T.quoteLine("> "))=="> a\r\n> b"
+    assert capsys.readouterr().out==""
+
+    monkeypatch.setattr(config,"DEBUG_TIMING",True)
+    T.transformClipboardText("Quote",T.quoteLine("> "))
+    assert capsys.readouterr().out.startswith("Quote: 4 chars in ")
+
+
+def test_test_mode_transforms_the_clipboard(config,keymap):
+    config.configure(keymap)
+    findWindowKeymap(keymap,None)["U1-t"]()
+    keymap.runDelayed()
+    test=findWindowKeymap(keymap,"isTest")
+
+    keyhac.setClipboardText("a\r\n  b")
+    test["U1-S-Q"]()
+    assert keyhac.getClipboardText()=="> a\r\n>   b"
+    keyhac.setClipboardText("a\r\n  b")
+    test["U1-S-I"]()
+    assert keyhac.getClipboardText()=="    a\r\n      b"
+    test["U1-S-U"]()
+    test["U1-S-U"]()
+    assert keyhac.getClipboardText()=="a\r\nb"
@@ -0,0 +1,121 @@
+import os
+import time
+
+import pytest
+
+from conftest import editConfig, findWindowKeymap
+
+
+def touch(path):
+    st=os.stat(path)
+    os.utime(path,ns=(st.st_atime_ns,st.st_mtime_ns+10**9))
+
+
+@pytest.fixture
+def loaded(config,config_path,keymap):
+    config.configure(keymap)
+    for window_keymap in keymap.window_keymaps:
+        window_keymap.writes=0
+    keymap.updates=0
+    return config.ConfigReloader(keymap,config_path)
+
+
+def writes(keymap):
+    return sum(window_keymap.writes+window_keymap.deletes for window_keymap in keymap.window_keymaps)
+
+
+def test_saving_without_edits_does_nothing(loaded,config_path,keymap):
+    touch(config_path)
+    assert loaded.reload() is None
+    assert writes(keymap)==0 and keymap.updates==0 and keymap.reloads==0
+
+
+def test_only_the_edited_binding_is_applied(loaded,config_path,keymap):
+    limited=findWindowKeymap(keymap,"isLimited")
+    editConfig(config_path,'windowKeymapLimited["RC-d"]="Delete"','windowKeymapLimited["RC-d"]="Back"')
+
+    report=loaded.reload()
+    assert (report.added,report.removed,report.changed)==(0,0,1)
+    assert report.unchanged>500
+    assert limited["RC-d"]=="Back"
+    assert writes(keymap)==1
+    assert keymap.updates==1 and keymap.reloads==0
+
+
+def test_edited_function_changes_its_bindings_only(loaded,config_path,keymap):
+    editConfig(config_path,'''        def enable_ime():
+            keymap.wnd.setImeStatus(1)''','''
+
+        def enable_ime():
+            keymap.wnd.setImeStatus(2)''')
+
+    report=loaded.reload()
+    # the three IME-on keys; the blank lines moved every function below without changing it
+    assert report.changed==3
+    assert writes(keymap)==3
+    findWindowKeymap(keymap,None)["S-(241)"]()
+    assert keymap.wnd.ime_status==2
+
+
+def test_edited_method_of_a_captured_object_changes_its_bindings(loaded,config_path,keymap):
+    editConfig(config_path,"composeMouseMovementState(self.tier,ux,uy)","composeMouseMovementState(self.tier,-ux,uy)")
+
+    report=loaded.reload()
+    # the handlers which capture `held_key_mouse_motion`, and nothing else
+    assert report.changed>=4*3
+    assert report.changed==writes(keymap)
+    limited=findWindowKeymap(keymap,"isLimited")
+    motion=limited["D-U1-A-L"]
+    while hasattr(motion,"__wrapped__"):
+        motion=motion.__wrapped__
+    motion=motion.__closure__[0].cell_contents
+    states=[]
+    motion.controller=type("RecordingController",(),{"updateState":lambda self,state : states.append(state.name)})()
+    limited["D-U1-A-L"]()
+    assert states==["WALK_L"]
+
+
+def test_failing_edit_keeps_the_previous_config(loaded,config,config_path,keymap,capsys):
+    limited=findWindowKeymap(keymap,"isLimited")
+    workers=config.WorkerRegistry.liveCount()
+    editConfig(config_path,'        profiler.lap("mode functions")','        profiler.lap("mode functions")\n        raise RuntimeError("boom")')
+
+    assert loaded.reload() is None
+    assert "the previous config is kept" in capsys.readouterr().out
+    assert writes(keymap)==0 and keymap.reloads==0
+    assert keymap.setup_calls.count(("setFont",("MS Gothic",12)))==1     # the dry load did not call keyhac
+    assert limited["RC-d"]=="Delete"
+    assert config.WorkerRegistry.liveCount()==workers
+
+
+def test_failing_edit_does_not_reconfigure_the_mouse_worker(loaded,config,config_path,keymap):
+    worker=config.WorkerRegistry.get("SimpleMouseMovementController")
+    editConfig(config_path,"walk_speed=80,","walk_speed=5,")
+    editConfig(config_path,'        profiler.lap("mode functions")','        profiler.lap("mode functions")\n        raise RuntimeError("boom")')
+
+    assert loaded.reload() is None
+    assert worker._pending_reconfigure is None and worker.config.walk_speed==80
+
+    editConfig(config_path,'        profiler.lap("mode functions")\n        raise RuntimeError("boom")','        profiler.lap("mode functions")')
+    assert loaded.reload() is not None
+    assert config.WorkerRegistry.get("SimpleMouseMovementController") is worker
+    # the worker takes the new config on its next tick
+    deadline=time.monotonic()+5.0
+    while worker.config.walk_speed!=5 and time.monotonic()<deadline:
+        time.sleep(0.01)
+    assert worker.config.walk_speed==5
+
+
+def test_setup_change_falls_back_to_a_full_reload(loaded,config_path,keymap):
+    editConfig(config_path,'keymap.setFont( "MS Gothic", 12 )','keymap.setFont( "MS Gothic", 14 )')
+    assert loaded.reload() is None
+    assert keymap.reloads==1
+    assert writes(keymap)==0
+
+
+def test_new_window_keymap_falls_back_to_a_full_reload(loaded,config_path,keymap):
+    editConfig(config_path,'            windowKeymapCeleste = keymap.defineWindowKeymap(check_func=cls.KeymapMode.isCeleste)',
+        '            windowKeymapCeleste = keymap.defineWindowKeymap(check_func=cls.KeymapMode.isCeleste)\n'
+        '            keymap.defineWindowKeymap(exe_name="notepad.exe")')
+    assert loaded.reload() is None
+    assert keymap.reloads==1
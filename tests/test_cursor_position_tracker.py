@@ -0,0 +1,41 @@
+def makeTracker(config,clock,pos=(500,500),monitors=((0,0,1920,1080),)):
+    calls={"pos":0,"monitors":0}
+
+    def get_mouse_pos():
+        calls["pos"]+=1
+        return pos
+
+    def get_monitor_bounds():
+        calls["monitors"]+=1
+        return list(monitors)
+
+    tracker=config.CursorPositionTracker(get_mouse_pos,get_monitor_bounds,resync_interval=1.0,idle_timeout=0.2,clock=clock)
+    return tracker,calls
+
+
+def test_motion_reads_the_os_once_per_resync_interval(config,clock):
+    tracker,calls=makeTracker(config,clock)
+    for _ in range(60):     # one second of ticks at 60 Hz
+        tracker.moveRel(2,0)
+        clock.advance(1.0/60)
+    assert calls=={"pos":1,"monitors":1}
+    assert tracker.getCursorPos()==(620,500)
+
+    clock.advance(0.01)
+    assert tracker.getCursorPos()==(500,500)    # resynchronized after 1 s, from the fake OS which did not move
+    assert calls=={"pos":2,"monitors":1}
+
+
+def test_motion_start_resynchronizes(config,clock):
+    tracker,calls=makeTracker(config,clock)
+    tracker.moveRel(10,10)
+    clock.advance(0.5)          # longer than idle_timeout: the user may have moved the mouse
+    assert tracker.getCursorPos()==(500,500)
+    assert calls=={"pos":2,"monitors":2}
+
+
+def test_positions_are_clamped_to_the_nearest_monitor(config,clock):
+    tracker,calls=makeTracker(config,clock,pos=(10,10),monitors=((0,0,1920,1080),(1920,0,3840,1080)))
+    assert tracker.moveRel(-50,-50)==(0,0)
+    assert tracker.setCursorPos(5000,500)==(3839,500)
+    assert tracker.setCursorPos(1950,2000)==(1950,1079)
@@ -0,0 +1,79 @@
+import json
+
+import pytest
+
+from conftest import findWindowKeymap
+
+
+def timedHandlers(config,clock,budget=0.01):
+    stats=config.HandlerLatencyStats(budget=budget,clock=clock)
+    fast=stats.wrap("fast",lambda : clock.advance(0.001))
+    slow=stats.wrap("slow",lambda dt : clock.advance(dt))
+    return stats,fast,slow
+
+
+def test_percentiles_and_budget(config,clock,capsys,monkeypatch):
+    monkeypatch.setattr(config,"DEBUG_TIMING",True)
+    stats,fast,slow=timedHandlers(config,clock)
+    for _ in range(100):
+        fast()
+    for dt in [0.002]*98+[0.05,0.03]:
+        slow(dt)
+
+    summary=stats.summary()
+    assert [d["name"] for d in summary]==["slow","fast"]
+    d=summary[0]
+    assert d["count"]==100 and d["over_budget"]==2
+    assert d["p50_ms"]==pytest.approx(2.0)
+    assert d["p99_ms"]==pytest.approx(50.0)
+    assert d["max_ms"]==pytest.approx(50.0)
+    # printed once, on the first call over the budget
+    assert capsys.readouterr().out.count("slow handler: slow")==1
+
+
+def test_ring_buffer_keeps_the_last_samples(config,clock):
+    stats=config.HandlerLatencyStats(size=8,clock=clock)
+    handler=stats.wrap("h",lambda dt : clock.advance(dt))
+    for dt in [1.0]*8+[0.001]*8:
+        handler(dt)
+    latency=stats.handlers["h"]
+    assert latency.percentile(0.99)==pytest.approx(0.001)
+    assert latency.max==pytest.approx(1.0)
+
+
+def test_exceptions_are_timed_and_raised(config,clock):
+    stats=config.HandlerLatencyStats(clock=clock)
+
+    def fail():
+        clock.advance(0.02)
+        raise KeyError("x")
+
+    with pytest.raises(KeyError):
+        stats.wrap("fail",fail)()
+    assert stats.handlers["fail"].over_budget==1
+
+
+def test_dump_and_export(config,clock,tmp_path):
+    stats,fast,slow=timedHandlers(config,clock)
+    fast()
+    slow(0.02)
+    lines=stats.dump().splitlines()
+    assert lines[0].split()==["handler","count","p50","ms","p99","ms","max","ms"]
+    assert lines[1].startswith("slow") and lines[1].endswith("!")
+    assert lines[2].startswith("fast") and not lines[2].endswith("!")
+
+    path=tmp_path/"latency.json"
+    stats.exportJson(str(path))
+    exported=json.loads(path.read_text(encoding="utf-8"))
+    assert exported["budget_ms"]==10.0
+    assert [d["name"] for d in exported["handlers"]]==["slow","fast"]
+
+
+def test_every_bound_handler_is_timed(config,keymap):
+    config.configure(keymap)
+    global_keymap=findWindowKeymap(keymap,None)
+    global_keymap["U1-c"]()
+
+    stats=config.WorkerRegistry.persistentState("ConfigReloader")["latency_stats"]
+    assert stats.handlers["global[U1-c]"].count==1
+    assert "isLimited[D-U1-A-L]" in stats.handlers
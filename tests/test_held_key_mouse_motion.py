@@ -0,0 +1,109 @@
+from conftest import FakeWindowKeymap, findWindowKeymap
+
+
+class RecordingController:
+
+    def __init__(self):
+        self.states=[]
+
+    def updateState(self,state):
+        self.states.append(state)
+
+
+def test_held_keys_compose_the_direction(config):
+    S=config.MouseMovementState
+    controller=RecordingController()
+    motion=config.HeldKeyMouseMotion(controller)
+
+    motion.press("L")
+    motion.press("I")
+    motion.press("I")   # key repeat
+    motion.release("L")
+    motion.press("K")   # I and K cancel out
+    motion.release("I")
+    motion.release("K")
+    # screen up (-y) is the "D" direction of `MouseMovementState`, as the original key bindings used it
+    assert controller.states==[S.WALK_R,S.WALK_RD,S.WALK_RD,S.WALK_D,S.NORMAL,S.WALK_U,S.NORMAL]
+
+
+def test_the_last_pressed_modifier_selects_the_tier(config):
+    S=config.MouseMovementState
+    T=config.MouseSpeedTier
+    controller=RecordingController()
+    motion=config.HeldKeyMouseMotion(controller)
+
+    motion.press("J",T.WALK)
+    motion.press("J",T.DASH)
+    motion.press("J",T.SNEAK)
+    motion.clear()
+    assert controller.states==[S.WALK_L,S.DASH_L,S.SNEAK_L,S.NORMAL]
+
+
+def test_install_binds_down_and_up_of_every_tier(config):
+    controller=RecordingController()
+    motion=config.HeldKeyMouseMotion(controller)
+    window_keymap=FakeWindowKeymap()
+    motion.install(window_keymap)
+
+    # down of 3 tiers, and up under the 16 combinations of U1, A, C and S for the 4 keys and for (29), LAlt and RAlt
+    assert len(window_keymap.bindings)==4*(3+16)+3*16
+    assert "U-L" in window_keymap.bindings and "U-C-S-U1-A-LAlt" in window_keymap.bindings
+    window_keymap["D-C-U1-A-L"]()
+    window_keymap["U-C-U1-A-L"]()
+    assert controller.states==[config.MouseMovementState.DASH_R,config.MouseMovementState.NORMAL]
+
+
+def test_modifier_released_before_the_key(config):
+    S=config.MouseMovementState
+    controller=RecordingController()
+    passed=[]
+    motion=config.HeldKeyMouseMotion(controller,pass_key_up=passed.append)
+    window_keymap=FakeWindowKeymap()
+    motion.install(window_keymap)
+
+    # U1 first, then A, then L
+    window_keymap["D-U1-A-L"]()
+    window_keymap["U-A-(29)"]()
+    window_keymap["U-LAlt"]()
+    window_keymap["U-L"]()
+    assert controller.states==[S.WALK_R,S.NORMAL]
+    assert passed==["LAlt","L"]
+
+    # A first while I and L are held, then the letters under U1 only
+    window_keymap["D-U1-A-I"]()
+    window_keymap["D-S-U1-A-L"]()
+    window_keymap["U-S-U1-RAlt"]()
+    window_keymap["U-S-U1-L"]()
+    window_keymap["U-U1-I"]()
+    assert controller.states[2:]==[S.WALK_D,S.SNEAK_RD,S.NORMAL]
+    assert passed[2:]==["RAlt","L","I"]
+
+    # the letter released first still stops the motion without passing the key
+    window_keymap["D-U1-A-K"]()
+    window_keymap["U-U1-A-K"]()
+    assert controller.states[5:]==[S.WALK_U,S.NORMAL]
+    assert passed[5:]==[]
+
+
+def test_key_up_is_sent_to_the_os(config):
+    import pyauto
+    motion=config.HeldKeyMouseMotion(RecordingController())
+    pyauto.Input.reset()
+    motion.pass_key_up("L")
+    motion.pass_key_up("(29)")
+    assert pyauto.Input.sent==[[pyauto.KeyUp(config.KeyCondition.strToVk("L"))],[pyauto.KeyUp(29)]]
+
+
+def boundMotion(handler):
+    while hasattr(handler,"__wrapped__"):
+        handler=handler.__wrapped__
+    return handler.__closure__[0].cell_contents
+
+
+def test_every_mode_shares_the_held_keys(config,keymap):
+    config.configure(keymap)
+    limited=findWindowKeymap(keymap,"isLimited")
+    cursor=findWindowKeymap(keymap,"isCursor")
+    motion=boundMotion(limited["D-U1-A-L"])
+    assert isinstance(motion,config.HeldKeyMouseMotion)
+    assert boundMotion(cursor["U-U1-A-L"]) is motion
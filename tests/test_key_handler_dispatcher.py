@@ -0,0 +1,150 @@
+import pytest
+
+from conftest import FakeWindowKeymap
+
+
+class ManualQueue:
+    """JobQueue which runs its jobs only on `runAll()`.
+    """
+
+    def __init__(self):
+        self.jobs=[]
+        self.cancelled=False
+
+    def enqueue(self,job_item):
+        self.jobs.append(job_item)
+
+    def runAll(self):
+        jobs,self.jobs=self.jobs,[]
+        for job_item in jobs:
+            job_item.func(job_item)
+            job_item.finished(job_item)
+        return len(jobs)
+
+    def cancel(self):
+        self.cancelled=True
+
+    def join(self):
+        pass
+
+
+@pytest.fixture
+def dispatching(config,clock):
+    queues=[]
+
+    def queue_factory():
+        queues.append(ManualQueue())
+        return queues[-1]
+
+    stats=config.HandlerLatencyStats(budget=0.01,clock=clock)
+    dispatcher=config.KeyHandlerDispatcher(num_queues=1,max_pending=4,queue_factory=queue_factory)
+    target=FakeWindowKeymap()
+    recorded=config.RecordedWindowKeymap({},target,stats,dispatcher)
+
+    def runQueues():
+        return sum(queue.runAll() for queue in queues)
+
+    return recorded,target,dispatcher,runQueues
+
+
+def costly(clock,calls,name,cost):
+    def handler():
+        calls.append(name)
+        clock.advance(cost[0])
+    return handler
+
+
+def test_auto_handler_moves_out_of_the_hook_and_back(config,clock,dispatching):
+    recorded,target,dispatcher,runQueues=dispatching
+    calls=[]
+    cost=[0.02]
+    recorded["U1-x"]=config.autoHandler(costly(clock,calls,"x",cost))
+
+    for _ in range(config.HandlerLatency.SLOW_MIN_SAMPLES):
+        target["U1-x"]()
+    assert len(calls)==4     # inline until there are enough samples
+
+    target["U1-x"]()
+    assert len(calls)==4 and dispatcher.pendingCount()==1
+    runQueues()
+    assert len(calls)==5
+
+    # the deferred calls are still timed, so the handler returns to the hook once it is fast again
+    cost[0]=0.001
+    for _ in range(config.HandlerLatency.SLOW_WINDOW):
+        target["U1-x"]()
+        runQueues()
+    calls.clear()
+    target["U1-x"]()
+    assert calls==["x"] and dispatcher.pendingCount()==0
+
+
+def test_one_slow_call_does_not_defer_a_handler(config,clock,dispatching):
+    recorded,target,dispatcher,runQueues=dispatching
+    calls=[]
+    cost=[0.001]
+    recorded["U1-y"]=config.autoHandler(costly(clock,calls,"y",cost))
+    for i in range(20):
+        cost[0]=0.05 if i==10 else 0.001
+        target["U1-y"]()
+    assert len(calls)==20 and dispatcher.pendingCount()==0
+
+
+def test_key_up_waits_for_its_pending_key_down(config,clock,dispatching):
+    recorded,target,dispatcher,runQueues=dispatching
+    calls=[]
+    recorded["D-U1-z"]=config.deferredHandler(costly(clock,calls,"down",[0.0]))
+    recorded["U-U1-z"]=costly(clock,calls,"up",[0.0])
+
+    target["D-U1-z"]()
+    target["U-U1-z"]()
+    assert calls==[]
+    runQueues()
+    assert calls==["down","up"]
+
+    target["U-U1-z"]()
+    assert calls==["down","up","up"]    # nothing pending: inline
+
+
+def test_pending_bound_drops_downs_but_not_ups(config,clock,dispatching):
+    recorded,target,dispatcher,runQueues=dispatching
+    calls=[]
+    recorded["D-U1-w"]=config.deferredHandler(costly(clock,calls,"down",[0.0]))
+    recorded["U-U1-w"]=config.deferredHandler(costly(clock,calls,"up",[0.0]))
+    for _ in range(6):
+        target["D-U1-w"]()
+    target["U-U1-w"]()
+    assert dispatcher.dropped==2
+    runQueues()
+    assert calls==["down"]*4+["up"]
+
+
+def test_inline_handler_stays_in_the_hook(config,clock,dispatching):
+    recorded,target,dispatcher,runQueues=dispatching
+    calls=[]
+    recorded["U1-v"]=config.inlineHandler(costly(clock,calls,"v",[0.05]))
+    for _ in range(10):
+        target["U1-v"]()
+    assert len(calls)==10 and dispatcher.pendingCount()==0
+    assert dispatcher.orderKey("U-S-U1-v")==("S-U1-V",True)
+
+
+def test_unmarked_slow_handler_stays_in_the_hook(config,clock,dispatching):
+    # e.g. `command_ClipboardList`, which opens a window and must run in the main thread
+    recorded,target,dispatcher,runQueues=dispatching
+    calls=[]
+    handler=costly(clock,calls,"t",[0.05])
+    recorded["U1-t"]=lambda : handler() or "result"
+    for _ in range(10):
+        assert target["U1-t"]()=="result"
+    assert len(calls)==10 and dispatcher.pendingCount()==0
+
+
+def test_shutdown_cancels_the_queues(config,clock,dispatching):
+    recorded,target,dispatcher,runQueues=dispatching
+    recorded["U1-u"]=config.deferredHandler(lambda : None)
+    target["U1-u"]()
+    assert dispatcher.is_alive()
+    assert config.WorkerRegistry.get("KeyHandlerDispatcher") is dispatcher
+    dispatcher.shutdown()
+    assert not dispatcher.is_alive()
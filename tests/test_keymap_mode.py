@@ -0,0 +1,69 @@
+import time
+
+from conftest import FakeKeymap, findWindowKeymap
+
+
+def test_set_mode_swaps_the_active_row(config):
+    mode=config.KeymapConfig.KeymapMode
+    assert mode.getMode()==mode._LIMITED
+    assert mode.isLimited() and not mode.isCursor()
+
+    assert mode.setMode(mode._CURSOR)
+    assert not mode.setMode(mode._CURSOR)
+    assert [mode.isLimited(),mode.isCursor(),mode.isCeleste(),mode.isTest()]==[False,True,False,False]
+
+
+def test_mode_keys_update_the_keymap_only_on_change(config,keymap):
+    config.configure(keymap)
+    global_keymap=findWindowKeymap(keymap,None)
+    cursor=findWindowKeymap(keymap,"isCursor")
+
+    global_keymap["U1-c"]()
+    global_keymap["U1-c"]()
+    assert keymap.updates==1
+    assert cursor.check_func(None)
+    assert not findWindowKeymap(keymap,"isLimited").check_func(None)
+
+    global_keymap["U1-(28)"]()
+    assert keymap.updates==2
+    assert keymap.wnd.ime_status==0
+    assert not cursor.check_func(None)
+
+
+def test_defined_modes_extend_the_table(config):
+    mode=config.KeymapConfig.KeymapMode
+    extra=mode.defineMode("extra",merged=(mode._LIMITED,))
+    assert extra==4 and len(mode._ACTIVE_TABLE)==5
+    assert mode._ACTIVE_TABLE[mode._CURSOR]==(False,True,False,False,False)
+
+    is_extra=mode.checkFunc(extra)
+    assert not is_extra(None)
+    mode.setMode(extra)
+    assert is_extra(None) and mode.isLimited() and not mode.isCursor()
+
+
+def switchCost(config,count,switches=10000):
+    """Time `switches` mode switches, each followed by the `check_func`s of one WindowKeymap per mode
+    as `keymap.updateKeymap()` evaluates them, and return the time per `check_func`.
+    """
+    mode=config.KeymapConfig.KeymapMode
+    while len(mode._MODES)<count:
+        mode.defineMode("extra%d" % len(mode._MODES))
+    keymap=FakeKeymap()
+    window_keymaps=[keymap.defineWindowKeymap(check_func=mode.checkFunc(m)) for m in range(count)]
+    best=None
+    for _ in range(3):
+        t0=time.perf_counter()
+        for i in range(switches):
+            mode.setMode(i%count)
+            active=[window_keymap for window_keymap in window_keymaps if window_keymap.check_func(None)]
+        elapsed=time.perf_counter()-t0
+        best=elapsed if best is None else min(best,elapsed)
+        assert active==[window_keymaps[(switches-1)%count]]
+    return best/(switches*count)
+
+
+def test_check_func_cost_does_not_grow_with_modes(config):
+    costs={count:switchCost(config,count) for count in (4,16,64)}
+    # the cost of one check_func is an index into the active row whatever the number of modes
+    assert costs[64]<3*costs[4], costs
@@ -0,0 +1,119 @@
+import threading
+
+from conftest import FakeKeymap, editConfig, findWindowKeymap, loadConfig
+
+
+def test_startup_creates_no_thread(config,keymap):
+    base=threading.active_count()
+    config.configure(keymap)
+    assert threading.active_count()==base
+    assert config.WorkerRegistry.get("BackgroundScheduler") is None
+    assert len(findWindowKeymap(keymap,"isTest").bindings)==0
+
+
+def test_test_mode_is_built_after_the_mode_key_returns(config,keymap):
+    config.configure(keymap)
+    test=findWindowKeymap(keymap,"isTest")
+
+    findWindowKeymap(keymap,None)["U1-t"]()
+    assert len(test.bindings)==0
+    assert keymap.updates==1
+
+    keymap.runDelayed()
+    assert "U1-S-F" in test and "U1-R" in test and "U1-0" in test
+    assert keymap.updates==2
+    assert config.WorkerRegistry.get("LazyModePayload:windowKeymapTest").is_alive()
+
+
+def test_idle_test_mode_is_torn_down(config,keymap):
+    config.configure(keymap)
+    global_keymap=findWindowKeymap(keymap,None)
+    test=findWindowKeymap(keymap,"isTest")
+    global_keymap["U1-t"]()
+    keymap.runDelayed()
+    payload=config.WorkerRegistry.get("LazyModePayload:windowKeymapTest")
+
+    global_keymap["U1-c"]()
+    keymap.runDelayed(599*1000)
+    assert payload.built
+    keymap.runDelayed(1000)
+    assert not payload.built
+    assert len(test.bindings)==0
+
+
+def test_returning_before_the_timeout_keeps_the_build(config,keymap):
+    config.configure(keymap)
+    global_keymap=findWindowKeymap(keymap,None)
+    test=findWindowKeymap(keymap,"isTest")
+    global_keymap["U1-t"]()
+    keymap.runDelayed()
+    writes=test.writes
+
+    global_keymap["U1-c"]()
+    global_keymap["U1-t"]()
+    keymap.runDelayed(600*1000)
+    assert config.WorkerRegistry.get("LazyModePayload:windowKeymapTest").built
+    assert test.writes==writes
+
+
+def test_hot_reload_keeps_the_mode_and_the_watcher(config,config_path,keymap):
+    config.configure(keymap)
+    findWindowKeymap(keymap,None)["U1-t"]()
+    keymap.runDelayed()
+    watcher=config.WorkerRegistry.get("ConfigReloader")
+
+    for old,new in (('"RC-d"]="Delete"','"RC-d"]="Back"'),('"RC-h"]="Back"','"RC-h"]="Delete"')):
+        editConfig(config_path,'windowKeymapLimited['+old,'windowKeymapLimited['+new)
+        watcher._poll()
+        keymap.runDelayed()
+        assert config.WorkerRegistry.get("ConfigReloader") is watcher and watcher.is_alive()
+        assert config.WorkerRegistry.persistentState("KeymapMode")["mode"]==config.KeymapConfig.KeymapMode._TEST
+
+    test=findWindowKeymap(keymap,"isTest")
+    assert test.check_func(None)
+    assert "U1-S-F" in test
+    limited=findWindowKeymap(keymap,"isLimited")
+    assert (limited["RC-d"],limited["RC-h"])==("Back","Delete")
+
+
+def test_keyhac_reload_rebuilds_the_current_mode(config,config_path,keymap):
+    config.configure(keymap)
+    findWindowKeymap(keymap,None)["U1-t"]()
+    keymap.runDelayed()
+
+    reloaded=loadConfig(config_path)
+    new_keymap=FakeKeymap()
+    reloaded.configure(new_keymap)
+    new_keymap.runDelayed()
+    assert reloaded.KeymapConfig.KeymapMode.isTest()
+    assert "U1-S-F" in findWindowKeymap(new_keymap,"isTest")
+
+
+def test_startup_profiler_report(config,clock):
+    profiler=config.StartupProfiler("startup",clock=clock)
+    clock.advance(0.002)
+    profiler.lap("setup")
+    clock.advance(0.0005)
+    profiler.lap("bindings")
+    lines=profiler.report().splitlines()
+    assert lines[0]=="startup: 2.5 ms"
+    assert lines[1].split()==["setup","2.00","ms"]
+    assert lines[2].split()==["bindings","0.50","ms"]
+
+
+def test_startup_report_is_printed_when_slow_or_on_request(config,clock,capsys,monkeypatch):
+    profiler=config.StartupProfiler("startup",clock=clock)
+    clock.advance(0.05)
+    profiler.lap("setup")
+    profiler.printReport()
+    assert capsys.readouterr().out==""
+
+    monkeypatch.setattr(config,"DEBUG_TIMING",True)
+    profiler.printReport()
+    assert capsys.readouterr().out.startswith("startup: 50.0 ms")
+
+    monkeypatch.setattr(config,"DEBUG_TIMING",False)
+    clock.advance(config.StartupProfiler.REPORT_THRESHOLD)
+    profiler.lap("bindings")
+    profiler.printReport()
+    assert capsys.readouterr().out.startswith("startup: 250.0 ms")
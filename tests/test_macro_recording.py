@@ -0,0 +1,113 @@
+import os
+import random
+import time
+import types
+
+import pytest
+
+import pyauto
+from conftest import findWindowKeymap
+
+
+def randomRecording(config,count,seed=0):
+    rnd=random.Random(seed)
+    recording=config.MacroRecording()
+    for _ in range(count):
+        recording.append(rnd.randrange(1,255),rnd.random()<0.5,rnd.choice((0,0,1,16,250,70000)))
+    return recording
+
+
+def fields(recording):
+    return list(recording.vks),list(recording.flags),list(recording.deltas)
+
+
+def test_save_and_load_round_trip(config,tmp_path):
+    recording=randomRecording(config,100000)
+    path=str(tmp_path/"macro.khm")
+    recording.save(path)
+    # a header and 6 bytes per event
+    assert os.path.getsize(path)==config.MacroRecording._HEADER.size+6*100000
+    assert fields(config.MacroRecording.load(path))==fields(recording)
+
+
+def test_bad_magic_is_rejected(config,tmp_path):
+    path=tmp_path/"macro.khm"
+    path.write_bytes(b"XXXX"+bytes(5))
+    with pytest.raises(ValueError):
+        config.MacroRecording.load(str(path))
+
+
+def test_text_form(config):
+    recording=randomRecording(config,1000,seed=1)
+    assert fields(config.MacroRecording.fromText(recording.toText()))==fields(recording)
+
+    recording=config.MacroRecording.fromText("# comment\n+0 D 0x41\n\n+15 U 65  # a up\n")
+    assert fields(recording)==([65,65],[0,config.MacroRecording.FLAG_UP],[0,15])
+
+
+def test_record_seq(config):
+    record_seq=[(65,False),(65,True),(16,False),(66,False),(66,True),(16,True)]
+    recording=config.MacroRecording.fromRecordSeq(record_seq,interval_ms=20)
+    assert recording.toRecordSeq()==record_seq
+    assert list(recording.deltas)==[20]*6
+
+
+def test_frames_group_events_without_delay(config):
+    recording=config.MacroRecording.fromText("+0 D 16\n+0 D 65\n+30 U 65\n+0 U 16\n+5 D 66\n")
+    assert list(recording.iterFrames())==[
+        (0.0,(pyauto.KeyDown(16),pyauto.KeyDown(65))),
+        (0.03,(pyauto.KeyUp(65),pyauto.KeyUp(16))),
+        (0.035,(pyauto.KeyDown(66),)),
+    ]
+
+
+def test_frames_are_generated_lazily(config):
+    recording=randomRecording(config,100000)
+    frames=recording.iterFrames()
+    assert isinstance(frames,types.GeneratorType)
+    assert next(frames)[1]
+    # the frames are taken from the arrays while iterating, so appending is seen by a running iteration
+    recording.append(65,False,1000000)
+    *_,(t,frame)=frames
+    assert frame==(pyauto.KeyDown(65),)
+
+
+class RealTimeScheduler:
+    """Scheduler which keeps its tasks until `run(func)` runs one with its repeats on the calling thread.
+    """
+
+    def __init__(self):
+        self.tasks=[]
+
+    def callLater(self,delay,func,priority=10):
+        self.tasks.append((delay,func))
+
+    def run(self,func):
+        delay=[delay for delay,f in self.tasks if f==func][-1]
+        while delay is not None:
+            time.sleep(delay)
+            delay=func()
+
+
+def test_test_mode_saves_and_plays_the_recorded_macro(config,config_path,keymap,monkeypatch):
+    scheduler=RealTimeScheduler()
+    monkeypatch.setattr(config.BackgroundScheduler,"defaultScheduler",classmethod(lambda cls : scheduler))
+    config.configure(keymap)
+    findWindowKeymap(keymap,None)["U1-t"]()
+    keymap.runDelayed()
+    test=findWindowKeymap(keymap,"isTest")
+    for name in ("U1-0","U1-1","U1-2","U1-3","U1-4","U1-S-2","U1-S-3"):
+        assert name in test
+
+    keymap.record_seq=[(65,False),(65,True),(66,False),(66,True)]
+    test["U1-S-2"]()
+    macro_path=os.path.join(os.path.dirname(config_path),"macro.khm")
+    assert config.MacroRecording.load(macro_path).toRecordSeq()==keymap.record_seq
+
+    test["U1-S-3"]()
+    assert pyauto.Input.sent==[]
+    player_step=scheduler.tasks[-1][1]
+    assert isinstance(player_step.__self__,config.MacroPlayer)
+    scheduler.run(player_step)
+    events=[event for seq in pyauto.Input.sent for event in seq]
+    assert events==[pyauto.KeyDown(65),pyauto.KeyUp(65),pyauto.KeyDown(66),pyauto.KeyUp(66)]
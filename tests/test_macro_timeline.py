@@ -0,0 +1,88 @@
+import pytest
+
+import pyauto
+from keyhac import KeyCondition
+
+
+def vk(name):
+    return KeyCondition.strToVk(name)
+
+
+def test_compile_merges_events_of_one_time(config):
+    timeline=config.MacroTimeline.compile(("a",0.5,"C-S-Tab","b",0.25,("text","xy")),char_interval=0.1)
+    assert timeline.times==[0.0,0.5,0.75,0.85]
+    assert timeline.frames[0]==(pyauto.Key(vk("a")),)
+    assert timeline.frames[1]==(
+        pyauto.KeyDown(vk("Ctrl")),pyauto.KeyDown(vk("Shift")),pyauto.Key(vk("Tab")),
+        pyauto.KeyUp(vk("Shift")),pyauto.KeyUp(vk("Ctrl")),pyauto.Key(vk("b")),
+    )
+    assert timeline.frames[2:]==[(pyauto.Char("x"),),(pyauto.Char("y"),)]
+    assert timeline.duration==pytest.approx(0.85)
+    assert timeline.eventCount==9
+
+
+def test_invalid_step_is_rejected(config):
+    with pytest.raises(ValueError):
+        config.MacroTimeline.compile(("a",["b"]))
+
+
+def test_player_sends_each_frame_on_time(config,clock,scheduler):
+    timeline=config.MacroTimeline.compile(("a",0.5,"b",0.5,"c"))
+    player=config.MacroPlayer(timeline,scheduler=scheduler,clock=clock)
+    start=clock()
+    sent_at=[]
+    send=pyauto.Input.send
+    pyauto.Input.send=lambda seq : (sent_at.append(clock()-start),send(seq))
+    try:
+        player.play()
+        assert pyauto.Input.sent==[]    # play() only schedules
+        scheduler.runFor(2.0)
+    finally:
+        pyauto.Input.send=send
+
+    assert pyauto.Input.sent==[[pyauto.Key(vk(c))] for c in "abc"]
+    assert sent_at==pytest.approx([0.0,0.5,1.0])
+    assert not player.is_playing()
+
+
+def test_late_frames_are_sent_together_without_drift(config,clock,scheduler):
+    scheduler.lateness=lambda : 0.3
+    timeline=config.MacroTimeline.compile(("a",0.1,"b",0.1,"c",1.0,"d"))
+    player=config.MacroPlayer(timeline,scheduler=scheduler,clock=clock)
+    start=clock()
+    sent_at=[]
+    send=pyauto.Input.send
+    pyauto.Input.send=lambda seq : (sent_at.append(clock()-start),send(seq))
+    try:
+        player.play()
+        scheduler.runFor(5.0)
+    finally:
+        pyauto.Input.send=send
+
+    assert pyauto.Input.sent==[[pyauto.Key(vk(c)) for c in "abc"],[pyauto.Key(vk("d"))]]
+    # "d" is due 1.2 s after the start, not 1.0 s after the late frame
+    assert sent_at==pytest.approx([0.3,1.5])
+
+
+def test_speed_and_cancel(config,clock,scheduler):
+    timeline=config.MacroTimeline.compile(("a",1.0,"b"))
+    player=config.MacroPlayer(timeline,speed=2.0,scheduler=scheduler,clock=clock)
+    player.play()
+    scheduler.runFor(0.6)
+    assert len(pyauto.Input.sent)==2
+
+    player.play()
+    scheduler.runFor(0.0)
+    player.cancel()
+    scheduler.runFor(5.0)
+    assert len(pyauto.Input.sent)==3
+
+
+def test_play_only_schedules_one_task(config,clock,scheduler):
+    timeline=config.MacroTimeline.compile(["a",0.01]*1000)
+    player=config.MacroPlayer(timeline,scheduler=scheduler,clock=clock)
+    player.play()
+    assert pyauto.Input.sent==[]
+    assert scheduler.pendingCount()==1 and scheduler.calls==0
+    player.cancel()
+    assert scheduler.pendingCount()==0
@@ -0,0 +1,65 @@
+import pytest
+
+
+def test_linear_ramp(config):
+    profile=config.LinearRampProfile(ramp_time=0.5,start_factor=0.25,end_factor=1.0)
+    assert profile.factor(0.0)==0.25
+    assert profile.factor(0.25)==pytest.approx(0.625)
+    assert profile.factor(0.5)==1.0
+    assert profile.factor(10.0)==1.0
+
+
+def test_exponential_approaches_the_end_factor(config):
+    profile=config.ExponentialProfile(time_constant=0.3,start_factor=0.25,end_factor=1.0)
+    factors=[profile.factor(t/10) for t in range(30)]
+    assert factors[0]==pytest.approx(0.25)
+    assert factors==sorted(factors)
+    assert factors[-1]==pytest.approx(1.0,abs=1e-3)
+
+
+def test_piecewise_interpolates_and_clamps(config):
+    profile=config.PiecewiseProfile([(1.0,2.0),(0.0,0.5)])
+    assert profile.factor(-1.0)==0.5
+    assert profile.factor(0.5)==pytest.approx(1.25)
+    assert profile.factor(3.0)==2.0
+    with pytest.raises(ValueError):
+        config.PiecewiseProfile([])
+
+
+def test_sub_pixel_moves_are_carried_over(config,clock,scheduler):
+    moved=[0,0]
+
+    def drift(dx,dy):
+        moved[0]+=dx
+        moved[1]+=dy
+
+    interval=1.0/60
+    worker=config.SimpleMouseMovementWorker(
+        config.SimpleMouseMovementConfig(sneak_speed=1,keyboard_interval=interval,profile=config.PiecewiseProfile([(0.0,0.3)])),
+        lambda : (0,0),None,drift_mouse_pos=drift,clock=clock,scheduler=scheduler,
+    )
+    # 0.3 pixel per tick, which is rounded to 0 without the carry
+    worker.updateState(config.MouseMovementState.SNEAK_R)
+    scheduler.runFor(1.0-interval/2)
+    worker.shutdown()
+    assert moved==[18,0]
+
+
+def test_ramp_distance_follows_the_profile(config,clock,scheduler):
+    moved=[0,0]
+
+    def drift(dx,dy):
+        moved[0]+=dx
+        moved[1]+=dy
+
+    interval=1.0/60
+    profile=config.LinearRampProfile(ramp_time=0.5,start_factor=0.0,end_factor=1.0)
+    worker=config.SimpleMouseMovementWorker(
+        config.SimpleMouseMovementConfig(walk_speed=10,keyboard_interval=interval,profile=profile),
+        lambda : (0,0),None,drift_mouse_pos=drift,clock=clock,scheduler=scheduler,
+    )
+    worker.updateState(config.MouseMovementState.WALK_R)
+    scheduler.runFor(1.0)
+    worker.shutdown()
+    # 600 px/s at full speed, 0.25 s of it lost in the ramp
+    assert moved[0]==pytest.approx(600*0.75,rel=0.05)
@@ -0,0 +1,43 @@
+import time
+
+import pyauto
+
+from conftest import findWindowKeymap
+
+
+def test_mouse_motion_handlers_only_queue_the_motion(config,keymap,scheduler,monkeypatch):
+    monkeypatch.setattr(config.BackgroundScheduler,"defaultScheduler",classmethod(lambda cls : scheduler))
+    config.configure(keymap)
+    limited=findWindowKeymap(keymap,"isLimited")
+    press=limited["D-U1-A-L"]
+    release=limited["U-U1-A-L"]
+
+    # the handlers neither move nor read the cursor: the worker does it on the scheduler
+    for _ in range(200):
+        press()
+        release()
+    assert pyauto.Input.sent==[] and pyauto.Input.cursor_calls==0
+    assert scheduler.pendingCount()==1
+
+    press()
+    scheduler.runFor(0.1)
+    assert pyauto.Input.sent
+    release()
+
+
+def test_cursor_glides_after_the_handler_returned(config,keymap):
+    config.configure(keymap)
+    limited=findWindowKeymap(keymap,"isLimited")
+
+    limited["D-U1-A-L"]()
+
+    deadline=time.monotonic()+2.0
+    while time.monotonic()<deadline and len(pyauto.Input.sent)<3:
+        time.sleep(0.01)
+    limited["U-U1-A-L"]()
+
+    moves=[event.args for frame in pyauto.Input.sent for event in frame]
+    assert len(moves)>=3
+    xs=[x for x,_ in moves]
+    assert xs==sorted(xs) and xs[-1]>100
+    assert all(y==100 for _,y in moves)
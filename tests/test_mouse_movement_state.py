@@ -0,0 +1,53 @@
+import time
+
+import pytest
+
+
+# (dx, dy) of the directions in the original if/elif chain of `getDrift()`
+DIRECTIONS={"R":(1,0),"L":(-1,0),"U":(0,1),"D":(0,-1),"RU":(1,1),"RD":(1,-1),"LU":(-1,1),"LD":(-1,-1)}
+
+
+def test_drift_table_matches_the_original_chain(config):
+    movement_config=config.SimpleMouseMovementConfig(walk_speed=7,dash_speed=30,sneak_speed=2)
+    table=config.SimpleMouseMovementWorker.buildDriftTable(movement_config)
+    speeds={"WALK":7,"DASH":30,"SNEAK":2}
+
+    for tier,speed in speeds.items():
+        for direction,(ux,uy) in DIRECTIONS.items():
+            assert table[config.MouseMovementState[tier+"_"+direction]]==(ux*speed,uy*speed)
+    assert config.MouseMovementState.NORMAL not in table
+    assert len(table)==24
+
+
+def test_compose_is_the_inverse_of_the_vectors(config):
+    for state,(tier,(ux,uy)) in config.MOUSE_MOVEMENT_VECTORS.items():
+        assert config.composeMouseMovementState(tier,ux,uy) is state
+        assert config.composeMouseMovementState(tier,3*ux,5*uy) is state
+    assert config.composeMouseMovementState(config.MouseSpeedTier.DASH,0,0) is config.MouseMovementState.NORMAL
+
+
+def test_get_drift_of_an_idle_worker_raises(config):
+    worker=config.SimpleMouseMovementWorker(config.SimpleMouseMovementConfig(),lambda : (0,0),None,drift_mouse_pos=lambda dx,dy : None)
+    with pytest.raises(RuntimeError):
+        worker.getDrift()
+
+
+def driftCost(config,state,n=20000):
+    worker=config.SimpleMouseMovementWorker(config.SimpleMouseMovementConfig(),lambda : (0,0),None,drift_mouse_pos=lambda dx,dy : None)
+    worker._applyState(state)
+    best=None
+    for _ in range(5):
+        t0=time.perf_counter()
+        for _ in range(n):
+            worker.getDrift()
+        elapsed=time.perf_counter()-t0
+        best=elapsed if best is None else min(best,elapsed)
+    return best
+
+
+def test_get_drift_is_a_lookup(config):
+    # WALK_R was the first branch of the original chain and SNEAK_LD the last one; a lookup costs the same for both
+    S=config.MouseMovementState
+    first=driftCost(config,S.WALK_R)
+    last=driftCost(config,S.SNEAK_LD)
+    assert last<2*first, (first,last)
@@ -0,0 +1,72 @@
+import random
+import threading
+import time
+
+
+def test_concurrent_updates_are_not_lost(config):
+    S=config.MouseMovementState
+    scheduler=config.BackgroundScheduler()
+    scheduler.start()
+    applied=[]
+    worker=config.SimpleMouseMovementWorker(
+        config.SimpleMouseMovementConfig(keyboard_interval=0.001),
+        lambda : (0,0),None,drift_mouse_pos=lambda dx,dy : None,scheduler=scheduler,
+    )
+    apply_state=worker._applyState
+    worker._applyState=lambda state : (applied.append(state),apply_state(state))
+
+    moving=[state for state in S if state not in (S.QUIT,S.NORMAL)]
+    num_threads,num_updates=8,500
+    errors=[]
+
+    def hammer(seed):
+        rng=random.Random(seed)
+        try:
+            for _ in range(num_updates):
+                worker.updateState(rng.choice(moving+[S.NORMAL]))
+        except Exception as e:
+            errors.append(e)
+
+    threads=[threading.Thread(target=hammer,args=(i,)) for i in range(num_threads)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    worker.updateState(S.SNEAK_LU)
+
+    deadline=time.monotonic()+5.0
+    while time.monotonic()<deadline and (worker.state!=S.SNEAK_LU or worker._queue):
+        time.sleep(0.005)
+    worker.shutdown()
+    scheduler.shutdown()
+
+    assert errors==[]
+    assert worker.state==S.SNEAK_LU
+    assert len(applied)==num_threads*num_updates+1
+    assert applied[-1]==S.SNEAK_LU
+
+
+def test_idle_timeout_is_measured_in_seconds(config,clock,scheduler):
+    S=config.MouseMovementState
+    worker=config.SimpleMouseMovementWorker(
+        config.SimpleMouseMovementConfig(keyboard_interval=1.0/60,timeout_period=5.0),
+        lambda : (0,0),None,drift_mouse_pos=lambda dx,dy : None,clock=clock,scheduler=scheduler,
+    )
+    worker.updateState(S.WALK_R)
+    scheduler.runFor(4.9)
+    assert worker.state==S.WALK_R
+    scheduler.runFor(0.2)
+    assert worker.state==S.NORMAL
+    assert scheduler.pendingCount()==0
+
+
+def test_quit_finishes_the_worker(config,clock,scheduler):
+    worker=config.SimpleMouseMovementWorker(
+        config.SimpleMouseMovementConfig(),lambda : (0,0),None,drift_mouse_pos=lambda dx,dy : None,clock=clock,scheduler=scheduler,
+    )
+    worker.updateState(config.MouseMovementState.WALK_R)
+    worker.updateState(config.MouseMovementState.QUIT)
+    scheduler.runFor(0.1)
+    assert not worker.is_alive()
+    worker.updateState(config.MouseMovementState.WALK_R)
+    assert scheduler.pendingCount()==0
@@ -0,0 +1,61 @@
+import random
+
+from conftest import ManualScheduler
+
+
+def makeWorker(config,clock,scheduler,**kwargs):
+    moved=[0,0]
+
+    def drift(dx,dy):
+        moved[0]+=dx
+        moved[1]+=dy
+
+    worker=config.SimpleMouseMovementWorker(
+        config.SimpleMouseMovementConfig(**kwargs),
+        get_mouse_pos=lambda : (0,0),
+        set_mouse_pos=None,
+        drift_mouse_pos=drift,
+        clock=clock,
+        scheduler=scheduler,
+    )
+    return worker,moved
+
+
+def test_speed_in_pixels_per_second_does_not_depend_on_jitter(config,clock):
+    random.seed(5)
+    interval=1.0/60
+    for max_lateness in (0.0,0.004,0.012):
+        scheduler=ManualScheduler(clock,lateness=lambda : random.uniform(0,max_lateness))
+        worker,moved=makeWorker(config,clock,scheduler,walk_speed=80,keyboard_interval=interval)
+        worker.updateState(config.MouseMovementState.WALK_R)
+        scheduler.runFor(2.0)
+        worker.shutdown()
+
+        expected=80/interval*2.0
+        assert abs(moved[0]-expected)<expected*0.02, max_lateness
+        assert moved[1]==0
+
+
+def test_late_ticks_are_counted_and_skipped(config,clock):
+    interval=1.0/60
+    scheduler=ManualScheduler(clock,lateness=lambda : 2.5*interval)
+    worker,moved=makeWorker(config,clock,scheduler,walk_speed=10,keyboard_interval=interval)
+    worker.updateState(config.MouseMovementState.WALK_D)
+    scheduler.runFor(1.0)
+    worker.shutdown()
+
+    assert worker.missed_frames>0
+    assert scheduler.calls<1.0/interval/2
+    assert abs(moved[1]+10/interval)<10/interval*0.1    # WALK_D drifts -y, as the original getDrift did
+
+
+def test_idle_worker_has_no_task(config,clock,scheduler):
+    worker,moved=makeWorker(config,clock,scheduler)
+    worker.updateState(config.MouseMovementState.WALK_L)
+    scheduler.runFor(0.1)
+    worker.updateState(config.MouseMovementState.NORMAL)
+    scheduler.runFor(0.1)
+    calls=scheduler.calls
+    scheduler.runFor(10.0)
+    assert scheduler.calls==calls
+    assert scheduler.pendingCount()==0
@@ -0,0 +1,135 @@
+import os
+import random
+
+import pytest
+
+
+@pytest.fixture
+def history_dir(tmp_path):
+    return str(tmp_path/"history")
+
+
+def texts(history):
+    return [history.get(key) for key,preview in history.recent(limit=len(history))]
+
+
+def test_copied_again_is_moved_not_stored(config,history_dir):
+    history=config.PersistentClipboardHistory(history_dir)
+    key=history.add("hello")
+    history.add("world")
+    assert history.add("hello")==key
+    assert texts(history)==["hello","world"]
+    assert (history.added,history.deduplicated)==(3,1)
+    assert history.stored_bytes==10
+    assert os.path.getsize(os.path.join(history_dir,"bodies.dat"))==10
+    history.close()
+
+
+def test_restart_recovers_the_history(config,history_dir):
+    history=config.PersistentClipboardHistory(history_dir,maxnum=3)
+    for text in ("one","two","三","one","four"):
+        history.add(text)
+    history.add("x"*100)     # evicts "two"
+    expected=texts(history)
+    history.close()
+
+    history=config.PersistentClipboardHistory(history_dir,maxnum=3)
+    assert expected==["x"*100,"four","one"]
+    assert texts(history)==expected
+    assert history.recent(1)[0][1]=="x"*80
+    history.add("two")
+    assert texts(history)==["two","x"*100,"four"]
+    history.close()
+
+
+def test_long_text_is_compressed(config,history_dir):
+    history=config.PersistentClipboardHistory(history_dir,compress_threshold=100)
+    text="long line of text\n"*1000
+    key=history.add(text)
+    assert history.entries[key].compressed
+    assert history.stored_bytes<len(text)//10
+    history.close()
+    assert config.PersistentClipboardHistory(history_dir).get(key)==text
+
+
+def test_crash_leftovers_are_ignored(config,history_dir):
+    history=config.PersistentClipboardHistory(history_dir)
+    history.add("kept")
+    history.add("lost")
+    history.close()
+
+    # a torn log line, a body which was not written, and the files of a compaction which did not finish
+    with open(os.path.join(history_dir,"log.jsonl"),"a",encoding="utf-8") as f:
+        f.write('{"op":"add","key":"00","offset":8,"length":100,"compressed":false,"chars":100,"preview":""}\n{"op":"ad')
+    for name in ("bodies.1.dat","log.jsonl.tmp"):
+        with open(os.path.join(history_dir,name),"w") as f:
+            f.write("partial")
+
+    history=config.PersistentClipboardHistory(history_dir)
+    assert texts(history)==["lost","kept"]
+    assert sorted(os.listdir(history_dir))==["bodies.dat","log.jsonl"]
+    history.close()
+
+
+def test_compaction_keeps_the_live_entries(config,history_dir):
+    history=config.PersistentClipboardHistory(history_dir,maxnum=2)
+    for text in ("a"*10,"b"*10,"c"*10,"b"*10,"d"*10):
+        history.add(text)
+    history.compact()
+    assert history.generation==1
+    assert sorted(os.listdir(history_dir))==["bodies.1.dat","log.jsonl"]
+    assert os.path.getsize(os.path.join(history_dir,"bodies.1.dat"))==20
+    assert texts(history)==["d"*10,"b"*10]
+    history.add("e"*10)
+    history.close()
+
+    history=config.PersistentClipboardHistory(history_dir,maxnum=2)
+    assert history.generation==1
+    assert texts(history)==["e"*10,"d"*10]
+    history.close()
+
+
+def test_crash_during_compaction_keeps_the_old_files(config,history_dir,monkeypatch):
+    history=config.PersistentClipboardHistory(history_dir)
+    history.add("one")
+    history.add("two")
+
+    def crash(src,dst):
+        raise OSError("crash")
+    monkeypatch.setattr(config.os,"replace",crash)
+    with pytest.raises(OSError):
+        history.compact()
+    monkeypatch.undo()
+
+    history=config.PersistentClipboardHistory(history_dir)
+    assert history.generation==0
+    assert texts(history)==["two","one"]
+    assert sorted(os.listdir(history_dir))==["bodies.dat","log.jsonl"]
+    history.close()
+
+
+def test_evicted_bodies_are_compacted_automatically(config,history_dir):
+    rnd=random.Random(0)
+    history=config.PersistentClipboardHistory(history_dir,maxnum=10,compress_threshold=1<<20)
+    for _ in range(300):
+        history.add("".join(rnd.choice("0123456789abcdef") for _ in range(10000)))
+    assert history.generation>=1
+    bodies=os.path.join(history_dir,"bodies.%d.dat" % history.generation)
+    assert os.path.getsize(bodies)<=2*(1<<20)
+    assert len(texts(history))==10
+    history.close()
+
+
+def test_add_later_runs_on_the_scheduler(config,scheduler,history_dir):
+    history=config.PersistentClipboardHistory(history_dir,scheduler=scheduler)
+    history.addLater("one")
+    history.addLater("two")
+    assert len(history)==0 and os.path.getsize(os.path.join(history_dir,"bodies.dat"))==0
+    scheduler.runFor(0.0)
+    assert texts(history)==["two","one"]
+
+    # an add queued before close is dropped
+    history.addLater("three")
+    history.close()
+    scheduler.runFor(0.0)
+    assert texts(config.PersistentClipboardHistory(history_dir))==["two","one"]
@@ -0,0 +1,76 @@
+import time
+
+import keyhac
+from conftest import findWindowKeymap
+
+
+def test_ascii(config):
+    W=config.WidthConverter
+    assert W.toFullWidth("Abc 123!")=="Ａｂｃ　１２３！"
+    assert W.toHalfWidth("Ａｂｃ　１２３！")=="Abc 123!"
+    # conventions kept from the original conversion
+    assert W.toFullWidth("\"'-\\`")=="”’−￥‘"
+    assert W.toHalfWidth("”’−￥‘")=="\"'-\\`"
+
+
+def test_katakana_sound_marks_are_composed(config):
+    W=config.WidthConverter
+    assert W.toFullWidth("ｶﾞｷﾞﾊﾟﾎﾟｳﾞｱﾞ")=="ガギパポヴア゛"
+    assert W.toHalfWidth("ガギパポヴ")=="ｶﾞｷﾞﾊﾟﾎﾟｳﾞ"
+    assert W.toFullWidth("ﾃｽﾄ｡")=="テスト。"
+    assert W.toHalfWidth("テスト。")=="ﾃｽﾄ｡"
+    assert W.toHalfWidth("バ")=="ﾊﾞ"
+
+
+def test_round_trip_of_the_block(config):
+    W=config.WidthConverter
+    half="".join(chr(code) for code in range(0x20,0x7F))+"".join(chr(code) for code in range(0xFF61,0xFFA0))+"ｶﾞﾊﾟ"
+    assert W.toHalfWidth(W.toFullWidth(half))==half
+
+
+def test_streaming_keeps_the_sound_mark_with_its_base(config):
+    W=config.WidthConverter
+    text="ｶﾞｷﾞｸﾟ abc ﾊﾟ"
+    expected=W.toFullWidth(text)
+    for i in range(len(text)+1):
+        for j in range(i,len(text)+1):
+            chunks=(text[:i],text[i:j],text[j:])
+            assert "".join(W.iterToFullWidth(chunks))==expected, chunks
+            assert "".join(W.iterToHalfWidth(W.iterToFullWidth(chunks)))==W.toHalfWidth(expected)
+
+
+# tables of the functions before `WidthConverter`, which built them on every call and covered ASCII only
+FULL_WIDTH_CHARS="ａｂｃｄｅｆｇｈｉｊｋｌｍｎｏｐｑｒｓｔｕｖｗｘｙｚＡＢＣＤＥＦＧＨＩＪＫＬＭＮＯＰＱＲＳＴＵＶＷＸＹＺ！”＃＄％＆’（）＊＋，−．／：；＜＝＞？＠［￥］＾＿‘｛｜｝～０１２３４５６７８９　"
+HALF_WIDTH_CHARS="abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ!\"#$%&'()*+,-./:;<=>?@[\\]^_`{|}～0123456789 "
+
+
+def elapsed(func):
+    t0=time.perf_counter()
+    func()
+    return time.perf_counter()-t0
+
+
+def test_throughput_against_the_old_functions(config):
+    W=config.WidthConverter
+    text="ｶﾞｷﾞｸﾞ Hello, World! 123 日本語のテキスト "*30000
+    full=W.toFullWidth(text)
+    old_full=min(elapsed(lambda : text.translate(str.maketrans(HALF_WIDTH_CHARS,FULL_WIDTH_CHARS))) for _ in range(3))
+    old_half=min(elapsed(lambda : full.translate(str.maketrans(FULL_WIDTH_CHARS,HALF_WIDTH_CHARS))) for _ in range(3))
+    new_full=min(elapsed(lambda : W.toFullWidth(text)) for _ in range(3))
+    new_half=min(elapsed(lambda : W.toHalfWidth(full)) for _ in range(3))
+    # the whole block is covered at about the cost of the ASCII-only tables; composing the sound marks takes one more pass
+    assert new_half<2*old_half, (old_half,new_half)
+    assert new_full<4*old_full, (old_full,new_full)
+
+
+def test_test_mode_converts_the_clipboard(config,keymap):
+    config.configure(keymap)
+    findWindowKeymap(keymap,None)["U1-t"]()
+    keymap.runDelayed()
+    test=findWindowKeymap(keymap,"isTest")
+
+    keyhac.setClipboardText("Abc 123!")
+    test["U1-S-Z"]()
+    assert keyhac.getClipboardText()=="Ａｂｃ　１２３！"
+    test["U1-S-H"]()
+    assert keyhac.getClipboardText()=="Abc 123!"
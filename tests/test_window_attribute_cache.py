@@ -0,0 +1,95 @@
+import pytest
+
+
+class FakeWnd:
+    """Window of pyauto which counts the attribute fetches.
+    """
+
+    def __init__(self,hwnd,class_name="Edit",process_name="notepad.exe",text="untitled"):
+        self.hwnd=hwnd
+        self.class_name=class_name
+        self.process_name=process_name
+        self.text=text
+        self.fetches=0
+
+    def getHWND(self):
+        return self.hwnd
+
+    def getClassName(self):
+        self.fetches+=1
+        return self.class_name
+
+    def getProcessName(self):
+        self.fetches+=1
+        return self.process_name
+
+    def getText(self):
+        self.fetches+=1
+        return self.text
+
+
+@pytest.fixture
+def cache(config,clock):
+    return config.WindowAttributeCache(maxnum=3,title_ttl=0.5,clock=clock)
+
+
+def test_stable_predicate_is_evaluated_once_per_window(cache):
+    wnd=FakeWnd(1)
+    is_notepad=cache.predicate(exe_name="NOTEPAD.EXE",class_name=("Edit","RichEdit*"))
+    is_other=cache.predicate(exe_name="other.exe")
+    for _ in range(100):
+        assert is_notepad(wnd) and not is_other(wnd)
+    assert wnd.fetches==2 and cache.fetch_count==2
+
+    assert cache.predicate(class_name="RichEdit*")(FakeWnd(2,class_name="RichEdit20W"))
+
+
+def test_title_is_fetched_again_after_the_ttl(cache,clock):
+    wnd=FakeWnd(1,text="a.txt - Notepad")
+    in_notepad=cache.predicate(window_text="*Notepad")
+    assert in_notepad(wnd)
+    wnd.text="Save As"
+    assert in_notepad(wnd)      # within the ttl
+    assert wnd.fetches==1
+    clock.advance(0.6)
+    assert not in_notepad(wnd)
+    assert wnd.fetches==2
+
+
+def test_check_func_is_called_every_time(cache):
+    calls=[]
+    predicate=cache.predicate(class_name="Edit",check_func=lambda wnd : calls.append(wnd) or True)
+    wnd=FakeWnd(1)
+    for _ in range(3):
+        assert predicate(wnd)
+    assert len(calls)==3 and wnd.fetches==1
+    # the other conditions are checked first
+    assert not predicate(FakeWnd(2,class_name="Button"))
+    assert len(calls)==3
+
+
+def test_invalidate_forgets_a_reused_handle(cache):
+    is_edit=cache.predicate(class_name="Edit")
+    assert is_edit(FakeWnd(1))
+    assert is_edit(FakeWnd(1,class_name="Button"))  # same handle: taken as the old window
+    cache.invalidate(FakeWnd(1))
+    assert not is_edit(FakeWnd(1,class_name="Button"))
+
+
+def test_least_recently_used_window_is_evicted(cache):
+    windows=[FakeWnd(hwnd) for hwnd in range(4)]
+    is_edit=cache.predicate(class_name="Edit")
+    for wnd in windows[:3]:
+        is_edit(wnd)
+    is_edit(windows[0])
+    is_edit(windows[3])     # evicts window 1
+    assert cache.fetch_count==4
+    is_edit(windows[0])
+    is_edit(windows[2])
+    assert cache.fetch_count==4
+    is_edit(windows[1])
+    assert cache.fetch_count==5 and windows[1].fetches==2
+
+
+def test_default_cache_is_shared(config):
+    assert config.WindowAttributeCache.defaultCache() is config.WindowAttributeCache.defaultCache()
@@ -0,0 +1,61 @@
+import threading
+import time
+
+from conftest import FakeKeymap, findWindowKeymap, loadConfig
+
+
+def test_threads_stay_constant_over_100_reloads(config,config_path):
+    base=threading.active_count()
+    workers=[]
+    module=config
+    for i in range(100):
+        if i:
+            module=loadConfig(config_path)     # keyhac executes config.py again on reload
+        keymap=FakeKeymap()
+        module.configure(keymap)
+        limited=findWindowKeymap(keymap,"isLimited")
+        limited["D-U1-A-L"]()
+        limited["U-U1-A-L"]()
+        workers.append(module.WorkerRegistry.get("SimpleMouseMovementController"))
+        assert threading.active_count()<=base+1
+
+    time.sleep(0.05)
+    assert threading.active_count()<=base+1
+    assert [worker.is_alive() for worker in workers].count(True)==1
+    assert workers[-1].is_alive()
+    assert module.WorkerRegistry.liveCount()<=3
+
+
+def test_register_replaces_and_shuts_down_the_old_worker(config):
+    class Worker:
+        def __init__(self):
+            self.alive=True
+        def shutdown(self):
+            self.alive=False
+        def is_alive(self):
+            return self.alive
+
+    old,new=Worker(),Worker()
+    config.WorkerRegistry.register("worker",old)
+    config.WorkerRegistry.register("worker",new)
+    assert not old.alive and new.alive
+    assert config.WorkerRegistry.get("worker") is new
+
+    config.WorkerRegistry.unregister("worker",old)
+    assert config.WorkerRegistry.get("worker") is new
+    config.WorkerRegistry.shutdownAll()
+    assert not new.alive and config.WorkerRegistry.get("worker") is None
+
+
+def test_controller_reconfigures_the_live_worker(config):
+    S=config.MouseMovementState
+    first=config.SimpleMouseMovementController(config.SimpleMouseMovementConfig(walk_speed=1),lambda : (0,0),None,drift_mouse_pos=lambda dx,dy : None)
+    worker=first._worker
+    second=config.SimpleMouseMovementController(config.SimpleMouseMovementConfig(walk_speed=9),lambda : (0,0),None,drift_mouse_pos=lambda dx,dy : None)
+    assert second is first and second._worker is worker
+
+    worker.updateState(S.WALK_R)
+    deadline=time.monotonic()+2.0
+    while time.monotonic()<deadline and worker._drift!=(9,0):
+        time.sleep(0.005)
+    assert worker.getDrift()==(9,0)